@@ -0,0 +1,101 @@
+"""
+This module benchmarks the throughput of every vault cipher (see source.data_cryptography.CIPHERS).
+
+For every vault size a random payload is encrypted into memory and decrypted again with each cipher,
+through the same chunked code paths the vault files use, with an already derived key. The benchmark
+prints the median encrypt and decrypt throughput in MB/s and whether the CPU reports AES instructions
+(AES-NI), which decide between AES-256-GCM and ChaCha20-Poly1305.
+
+Usage: python -m benchmarks.bench_ciphers [--sizes 1 10 100] [--repeat 5]
+"""
+import argparse
+import io
+import os
+import statistics
+import time
+from typing import Callable, Iterator
+from source.data_cryptography import CIPHERS, LEGACY_CIPHER, CHUNK_SIZE, encrypt_chunks, decrypt_chunks
+from source.authenticated_encryption import encrypt_segments, decrypt_segments
+
+def has_aes_instructions() -> str:
+    """
+    Reports whether the CPU advertises AES instructions, as far as /proc/cpuinfo tells.
+
+    :return: "yes", "no" or "unknown".
+    """
+    try:
+        with open("/proc/cpuinfo", 'r', encoding='utf-8') as file:
+            flags = file.read()
+    except OSError:
+        return "unknown"
+    return "yes" if " aes " in flags.replace("\n", " ") else "no"
+
+def median_seconds(function: Callable[[], object], repeat: int) -> float:
+    """
+    Runs a function several times and returns the median wall time.
+
+    :param function: The function to time.
+    :param repeat: The number of runs.
+    :return: The median time in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def measure(cipher: str, payload: bytes, repeat: int) -> tuple[float, float]:
+    """
+    Measures the encrypt and decrypt time of a payload with one cipher.
+
+    :param cipher: The name of the cipher.
+    :param payload: The plaintext.
+    :param repeat: The number of runs per measurement.
+    :return: The tuple (median encrypt seconds, median decrypt seconds).
+    """
+    key = os.urandom(32)
+    iv = os.urandom(16)
+    associated_data = os.urandom(64)
+    view = memoryview(payload)
+
+    def chunks() -> Iterator[memoryview]:
+        return (view[start:start + CHUNK_SIZE] for start in range(0, len(view), CHUNK_SIZE))
+
+    def encrypt() -> bytes:
+        destination = io.BytesIO()
+        if cipher == LEGACY_CIPHER:
+            encrypt_chunks(chunks(), destination, key, iv)
+        else:
+            encrypt_segments((bytes(chunk) for chunk in chunks()), destination, key, iv, cipher=cipher, associated_data=associated_data)
+        return destination.getvalue()
+
+    ciphertext = encrypt()
+
+    def decrypt() -> int:
+        pieces = [ciphertext[start:start + CHUNK_SIZE] for start in range(0, len(ciphertext), CHUNK_SIZE)]
+        if cipher == LEGACY_CIPHER:
+            return sum(len(chunk) for chunk in decrypt_chunks(pieces, key, iv))
+        return sum(len(chunk) for chunk in decrypt_segments(pieces, key, iv, cipher, associated_data))
+
+    return median_seconds(encrypt, repeat), median_seconds(decrypt, repeat)
+
+def main() -> None:
+    """
+    Parses the command line and prints one result line per vault size and cipher.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 10, 100], help="vault sizes in MB")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions per measurement")
+    arguments = parser.parse_args()
+    print(f"AES instructions: {has_aes_instructions()}")
+    print(f"{'size':>8} {'cipher':<20} {'encrypt MB/s':>13} {'decrypt MB/s':>13}")
+    for size_mb in arguments.sizes:
+        payload = os.urandom(int(size_mb * 1024 * 1024))
+        for cipher in CIPHERS:
+            encrypt_seconds, decrypt_seconds = measure(cipher, payload, arguments.repeat)
+            megabytes = len(payload) / 1e6
+            print(f"{megabytes:>6.1f}MB {cipher:<20} {megabytes / encrypt_seconds:>13.1f} {megabytes / decrypt_seconds:>13.1f}")
+
+if __name__ == "__main__":
+    main()
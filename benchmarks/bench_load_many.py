@@ -0,0 +1,48 @@
+"""
+This module benchmarks load_many against loading the same vault files one after another.
+
+A number of small vault files, each with its own password, is written once; every file is then loaded
+serially with load_encrypted_dict_from_file and concurrently with load_many, with a cold key cache
+before every run, so each file costs one key derivation. The benchmark prints the wall time of both
+and the per-file timings of the concurrent run.
+
+Usage: python -m benchmarks.bench_load_many [--files 4] [--workers 4]
+"""
+import argparse
+import os
+import tempfile
+import time
+from source.data_cryptography import save_encrypted_dict_to_file, load_encrypted_dict_from_file, load_many
+from source.key_derivation import wipe_key_cache
+from source.vault_schema import empty_vault
+
+def main() -> None:
+    """
+    Parses the command line and prints the serial and concurrent load times.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=4, help="number of vault files")
+    parser.add_argument("--workers", type=int, default=None, help="maximum number of threads for load_many")
+    arguments = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        passwords = {os.path.join(directory, f"vault{number}.json"): f"password{number}" for number in range(arguments.files)}
+        for filename, password in passwords.items():
+            save_encrypted_dict_to_file(empty_vault(), filename, password)
+        wipe_key_cache()
+        start = time.perf_counter()
+        for filename, password in passwords.items():
+            load_encrypted_dict_from_file(filename, password)
+        serial_seconds = time.perf_counter() - start
+        wipe_key_cache()
+        timings: dict = {}
+        start = time.perf_counter()
+        load_many(passwords, max_workers=arguments.workers, timings=timings)
+        concurrent_seconds = time.perf_counter() - start
+    print(f"serial:     {serial_seconds:.3f} s")
+    print(f"load_many:  {concurrent_seconds:.3f} s")
+    print(f"{'file':<14} {'kdf s':>8} {'cipher s':>9} {'total s':>8}")
+    for filename, file_timings in timings.items():
+        print(f"{os.path.basename(filename):<14} {file_timings['kdf_seconds']:>8.3f} {file_timings['cipher_seconds']:>9.3f} {file_timings['total_seconds']:>8.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+This module benchmarks load_encrypted_dict_mmap against load_encrypted_dict_from_file.
+As a reference it also runs a loader that reads the whole file and decrypts it with decrypt_data in one piece.
+
+For every vault size a synthetic vault is written once; each load function is then run several times
+on it. The benchmark reports the median wall time, the peak traced memory of a single load and the
+transient part of it, i.e. the peak minus the memory of the returned dictionary. The transient memory
+is also given as a multiple of the vault size: it counts the vault-sized buffer copies (file contents,
+ciphertext, plaintext, decoded string) that are alive at the same time during the load. Finally it
+reports the number of allocated blocks of a load that are still alive when it returns (the count of
+the tracemalloc snapshot statistics), i.e. the allocations of the returned dictionary plus any leftovers.
+
+Usage: python -m benchmarks.bench_mmap_load [--sizes 1 10 100] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable
+from source.data_cryptography import save_encrypted_dict_to_file, load_encrypted_dict_from_file, load_encrypted_dict_mmap, decrypt_data, authenticated_header, parse_container_header, LEGACY_CIPHER
+from source.authenticated_encryption import decrypt_segments, segment_key, unlock_container
+
+PASSWORD = "benchmark-password"
+
+def synthetic_vault(size_mb: float) -> dict:
+    """
+    Builds a vault dictionary in the layout of data.json whose JSON form is about size_mb megabytes.
+
+    :param size_mb: The approximate size of the serialized vault in megabytes.
+    :return: The vault dictionary.
+    """
+    entry_count = max(1, int(size_mb * 1024 * 1024 / 400))
+    names = [f"entry{number}" for number in range(entry_count)]
+    passwords = {
+        name: {
+            "name": name,
+            "password": f"Pw!{number:08d}",
+            "url": f"https://example.com/{number}",
+            "text": "",
+            "history": [f"{number:032x}"],
+            "dateoffirstaccess": 1704067200,
+            "dateoflastchange": 1704067200
+        } for number, name in enumerate(names)
+    }
+    mail = "benchmark@example.com"
+    return {"schema": 4, "accounts": {mail: {"mail": mail, "master-password": "", "history-salt": "", "passwords": passwords}}}
+
+def load_whole_file(input_filename: str, password: str) -> Any:
+    """
+    Reference loader that reads the whole file with file.read() and decrypts it in one piece.
+    It expects the uncompressed JSON files the benchmark writes.
+
+    :param input_filename: The name of the file containing the encrypted data.
+    :param password: The password used to derive the decryption key.
+    :return: The decrypted dictionary.
+    """
+    with open(input_filename, 'rb') as file:
+        content = file.read()
+    header, offset = parse_container_header(content)
+    salt = content[offset:offset + 16]
+    iv = content[offset + 16:offset + 32]
+    key = unlock_container(header, password, salt)[0]
+    cipher = header.get("cipher", LEGACY_CIPHER)
+    if cipher == LEGACY_CIPHER:
+        plaintext = decrypt_data(content[offset + 32:], key, iv)
+    else:
+        associated_data = authenticated_header(header, content[:offset]) + salt + iv
+        plaintext = b"".join(decrypt_segments([content[offset + 32:]], segment_key(key, iv, header), iv, cipher, associated_data))
+    return json.loads(plaintext.decode('utf-8'))
+
+def measure(load: Callable[[str, str], Any], filename: str, repeat: int) -> tuple[float, int, int, int]:
+    """
+    Runs a load function and measures its wall time, peak memory, transient memory and allocation count.
+
+    :param load: The load function.
+    :param filename: The vault file.
+    :param repeat: How often the wall time is measured.
+    :return: The tuple (median seconds, peak traced bytes, transient traced bytes, allocated blocks).
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        load(filename, PASSWORD)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    result = load(filename, PASSWORD)
+    retained, peak = tracemalloc.get_traced_memory()
+    blocks = sum(statistic.count for statistic in tracemalloc.take_snapshot().statistics("filename"))
+    tracemalloc.stop()
+    del result
+    return statistics.median(timings), peak, peak - retained, blocks
+
+def main() -> None:
+    """
+    Parses the command line and prints one result line per vault size and load function.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 10, 100], help="vault sizes in MB")
+    parser.add_argument("--repeat", type=int, default=3, help="wall-time repetitions per measurement")
+    arguments = parser.parse_args()
+    loaders = [("whole-file read (reference)", load_whole_file), ("load_encrypted_dict_from_file", load_encrypted_dict_from_file), ("load_encrypted_dict_mmap", load_encrypted_dict_mmap)]
+    print(f"{'size':>8} {'function':<30} {'median s':>9} {'peak MB':>9} {'trans. MB':>9} {'trans./size':>11} {'blocks':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "vault.json")
+        for size_mb in arguments.sizes:
+            save_encrypted_dict_to_file(synthetic_vault(size_mb), filename, PASSWORD, compression="none")
+            file_size = os.path.getsize(filename)
+            for name, load in loaders:
+                seconds, peak, transient, blocks = measure(load, filename, arguments.repeat)
+                print(f"{file_size / 1e6:>6.1f}MB {name:<30} {seconds:>9.3f} {peak / 1e6:>9.1f} {transient / 1e6:>9.1f} {transient / file_size:>11.2f} {blocks:>10}")
+
+if __name__ == "__main__":
+    main()
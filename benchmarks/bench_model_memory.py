@@ -0,0 +1,99 @@
+"""
+This module benchmarks the memory of the decoded vault as nested dictionaries against the slotted
+object model of source.vault_model.
+
+A vault is generated with benchmarks.vault_generator (100k entries by default), encoded as JSON and
+decoded again, so every entry is a freshly built dictionary as after loading the vault file. The
+benchmark traces the allocated memory (tracemalloc) of:
+- dicts: the decoded vault
+- lazy: Account objects wrapping the decoded vault, before any entry is built (on top of the vault)
+- slotted: every entry built as a PasswordEntry, with the decoded vault released
+and times reading one field of every entry and serializing the accounts back with to_dict.
+
+Usage: python -m benchmarks.bench_model_memory [--accounts 10] [--entries 10000] [--history 5]
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from typing import Any, Callable
+from source.vault_model import Account
+from benchmarks.vault_generator import generate_vault
+
+def traced(function: Callable[[], Any]) -> tuple[Any, int]:
+    """
+    Runs a function and measures the memory it leaves allocated.
+
+    :param function: The function to measure.
+    :return: The tuple (result of the function, allocated bytes).
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = function()
+    gc.collect()
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, allocated
+
+def seconds(function: Callable[[], Any]) -> float:
+    """
+    Measures the wall time of one run of a function.
+
+    :param function: The function to time.
+    :return: The time in seconds.
+    """
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+def build_accounts(data: dict) -> list[Account]:
+    """
+    Builds every account and entry of a vault.
+
+    :param data: The vault dictionary.
+    :return: The accounts with all entries built.
+    """
+    accounts = [Account.from_vault(data, mail) for mail in data["accounts"]]
+    for account in accounts:
+        for _ in account.entries():
+            pass
+    return accounts
+
+def main() -> None:
+    """
+    Parses the command line and prints the memory and timings of both representations.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=10, help="number of accounts")
+    parser.add_argument("--entries", type=int, default=10000, help="entries per account")
+    parser.add_argument("--history", type=int, default=5, help="maximum passwords in the history of an entry")
+    arguments = parser.parse_args()
+    encoded = json.dumps(generate_vault(arguments.accounts, arguments.entries, arguments.history))
+    total = arguments.accounts * arguments.entries
+
+    data, dict_bytes = traced(lambda: json.loads(encoded))
+    lazy, lazy_bytes = traced(lambda: [Account.from_vault(data, mail) for mail in data["accounts"]])
+    del lazy
+    dict_entries = [entry for account in data["accounts"].values() for entry in account["passwords"].values()]
+    dict_read = seconds(lambda: [entry["url"] for entry in dict_entries])
+    del dict_entries
+    del data
+
+    def decode_and_build() -> list[Account]:
+        return build_accounts(json.loads(encoded))
+
+    accounts, slotted_bytes = traced(decode_and_build)
+    slotted_entries = [entry for account in accounts for entry in account.entries()]
+    slotted_read = seconds(lambda: [entry.url for entry in slotted_entries])
+    serialize = seconds(lambda: [account.to_dict() for account in accounts])
+
+    print(f"{total} entries in {arguments.accounts} accounts")
+    print(f"{'representation':<16} {'MB':>8} {'bytes/entry':>12}")
+    for name, allocated in [("dicts", dict_bytes), ("lazy (extra)", lazy_bytes), ("slotted", slotted_bytes)]:
+        print(f"{name:<16} {allocated / 1e6:>8.1f} {allocated / total:>12.0f}")
+    print(f"read one field of every entry: dicts {dict_read * 1000:.1f} ms, slotted {slotted_read * 1000:.1f} ms")
+    print(f"serialize back with to_dict: {serialize * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
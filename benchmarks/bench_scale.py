@@ -0,0 +1,146 @@
+"""
+This module benchmarks the vault operations at growing vault sizes and writes the results to a JSON report.
+
+For every size (accounts x entries per account) a vault is generated with benchmarks.vault_generator and
+saved encrypted; then the benchmark times:
+- load: load_encrypted_dict_from_file of the vault file
+- save: save_encrypted_dict_to_file of the whole vault
+- add_entry: safe_new_password_data through the file vault store
+- change_entry: safe_changed_data through the file vault store
+- list: the sorted listing of the entry names of one account, as the password list screen builds it
+- search: looking up the entries of one account whose name contains a query, by scanning its names
+- recent_scan: the 10 most recently changed entries of the vault, by sorting every entry
+- recent_index: the same query on a LastChangeIndex (source.vault_index) built once from the vault
+- reuse_scan: whether a password was used in one account, by hashing it and scanning every entry's history
+- reuse_index: the same check on a HistoryIndex (source.vault_index) built once from the vault
+- prefix_scan: the entries of one account whose name starts with a prefix, by scanning its names
+- prefix_index: the same lookup on a PrefixIndex (source.vault_index) built once from the vault
+All times are taken with a warm key cache, so they show the cost that grows with the vault rather than the KDF.
+
+Usage: python -m benchmarks.bench_scale [--sizes 10x10 100x100 1000x100] [--repeat 3] [--report scale_report.json]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from typing import Any, Callable
+from source import password_manager
+from source.data_cryptography import save_encrypted_dict_to_file, load_encrypted_dict_from_file
+from source.vault_storage import invalidate_vault_cache
+from source.vault_store import create_store, configure_store
+from source.vault_index import LastChangeIndex, HistoryIndex, PrefixIndex
+from source.password_history import account_salt, hash_history_password
+from benchmarks.vault_generator import generate_vault
+
+PASSWORD = "benchmark-password"
+
+def parse_size(size: str) -> tuple[int, int]:
+    """
+    Parses a vault size of the form "<accounts>x<entries per account>".
+
+    :param size: The size, e.g. "1000x100".
+    :return: The tuple (accounts, entries per account).
+    """
+    accounts, _, entries = size.partition("x")
+    return int(accounts), int(entries)
+
+def time_runs(function: Callable[[int], Any], repeat: int) -> dict:
+    """
+    Runs a function several times and summarizes the wall times.
+
+    :param function: The function to time; it gets the number of the run.
+    :param repeat: The number of runs.
+    :return: The summary {"runs", "median_seconds", "min_seconds", "max_seconds"}.
+    """
+    timings = []
+    for run in range(repeat):
+        start = time.perf_counter()
+        function(run)
+        timings.append(time.perf_counter() - start)
+    return {"runs": repeat, "median_seconds": statistics.median(timings), "min_seconds": min(timings), "max_seconds": max(timings)}
+
+def benchmark_size(directory: str, accounts: int, entries: int, repeat: int) -> dict:
+    """
+    Generates a vault of one size and times every operation on it.
+
+    :param directory: The directory for the vault files.
+    :param accounts: The number of accounts.
+    :param entries: The number of entries per account.
+    :param repeat: The number of runs per operation.
+    :return: The results of this size for the report.
+    """
+    filename = os.path.join(directory, f"vault-{accounts}x{entries}.json")
+    vault = generate_vault(accounts, entries)
+    save_encrypted_dict_to_file(vault, filename, PASSWORD)
+    mail = list(vault["accounts"])[-1]
+    account = vault["accounts"][mail]
+    name = next(iter(account["passwords"]), "")
+    index = LastChangeIndex.from_vault(vault)
+    history_index = HistoryIndex.from_vault(vault)
+    prefix_index = PrefixIndex.from_vault(vault)
+    operations = {
+        "load": time_runs(lambda run: load_encrypted_dict_from_file(filename, PASSWORD), repeat),
+        "save": time_runs(lambda run: save_encrypted_dict_to_file(vault, filename, PASSWORD), repeat),
+        "list": time_runs(lambda run: sorted(account["passwords"]), repeat),
+        "search": time_runs(lambda run: [entry for entry_name, entry in account["passwords"].items() if "hub" in entry_name.lower()], repeat),
+        "recent_scan": time_runs(lambda run: sorted(((entry["dateoflastchange"], entry_mail, entry_name) for entry_mail, vault_account in vault["accounts"].items()
+                                                     for entry_name, entry in vault_account["passwords"].items()), reverse=True)[:10], repeat),
+        "recent_index": time_runs(lambda run: index.recently_changed(10), repeat),
+        "reuse_scan": time_runs(lambda run: any(hash_history_password(account_salt(account), f"Candidate{run}!") in entry.get("history", ())
+                                                for entry in account["passwords"].values()), repeat),
+        "reuse_index": time_runs(lambda run: history_index.was_used(mail, f"Candidate{run}!"), repeat),
+        "prefix_scan": time_runs(lambda run: sorted(entry_name for entry_name in account["passwords"] if entry_name.casefold().startswith("github1")), repeat),
+        "prefix_index": time_runs(lambda run: prefix_index.names_with_prefix(mail, "github1"), repeat)
+    }
+    invalidate_vault_cache()
+    configure_store(create_store("file", filename, PASSWORD))
+    try:
+        operations["add_entry"] = time_runs(lambda run: password_manager.safe_new_password_data(
+            {f"New{run}": {"name": f"New{run}", "password": "pw", "url": "", "text": "", "history": []}}, mail, f"New{run}"), repeat)
+        if entries:
+            operations["change_entry"] = time_runs(lambda run: password_manager.safe_changed_data(
+                mail, name, "https://example.com", "", f"Changed{run}!", name, False), repeat)
+    finally:
+        configure_store(None)
+        invalidate_vault_cache()
+    return {
+        "accounts": accounts,
+        "entries_per_account": entries,
+        "entries": accounts * entries,
+        "file_bytes": os.path.getsize(filename),
+        "operations": operations
+    }
+
+def main() -> None:
+    """
+    Parses the command line, runs the benchmark for every size, prints a table and writes the JSON report.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=["10x10", "100x100", "1000x100"], help="vault sizes as <accounts>x<entries per account>")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per operation")
+    parser.add_argument("--report", default="scale_report.json", help="the JSON report to write")
+    arguments = parser.parse_args()
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in arguments.sizes:
+            accounts, entries = parse_size(size)
+            result = benchmark_size(directory, accounts, entries, arguments.repeat)
+            results.append(result)
+            timings = "  ".join(f"{operation} {summary['median_seconds'] * 1000:.2f}ms" for operation, summary in result["operations"].items())
+            print(f"{size:>10} ({result['file_bytes'] / 1e6:.1f} MB): {timings}")
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": arguments.repeat,
+        "results": results
+    }
+    with open(arguments.report, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    print(f"report written to {arguments.report}")
+
+if __name__ == "__main__":
+    main()
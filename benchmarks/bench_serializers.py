@@ -0,0 +1,52 @@
+"""
+This module benchmarks the vault serializers registered in source.data_cryptography.SERIALIZERS.
+
+For every vault size a synthetic vault (see benchmarks.bench_mmap_load.synthetic_vault) is encoded
+and decoded with every codec; the benchmark reports the encoded size and the median encode and
+decode wall time.
+
+Usage: python -m benchmarks.bench_serializers [--sizes 0.1 1 10] [--repeat 5]
+"""
+import argparse
+import statistics
+import time
+from typing import Any, Callable
+from source.data_cryptography import SERIALIZERS
+from benchmarks.bench_mmap_load import synthetic_vault
+
+def median_seconds(function: Callable[[], Any], repeat: int) -> float:
+    """
+    Runs a function several times and returns the median wall time.
+
+    :param function: The function to time.
+    :param repeat: The number of runs.
+    :return: The median wall time in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def main() -> None:
+    """
+    Parses the command line and prints one result line per vault size and codec.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[0.1, 1, 10], help="vault sizes in MB (as JSON)")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions per measurement")
+    arguments = parser.parse_args()
+    print(f"{'vault':>8} {'codec':<8} {'size MB':>9} {'ratio':>6} {'encode s':>9} {'decode s':>9}")
+    for size_mb in arguments.sizes:
+        vault = synthetic_vault(size_mb)
+        json_size = len(SERIALIZERS["json"][0](vault))
+        for codec, (encode, decode) in SERIALIZERS.items():
+            encoded = encode(vault)
+            assert decode(bytearray(encoded)) == vault
+            encode_seconds = median_seconds(lambda: encode(vault), arguments.repeat)
+            decode_seconds = median_seconds(lambda: decode(bytearray(encoded)), arguments.repeat)
+            print(f"{size_mb:>6.1f}MB {codec:<8} {len(encoded) / 1e6:>9.2f} {len(encoded) / json_size:>6.2f} {encode_seconds:>9.3f} {decode_seconds:>9.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+This module benchmarks the vault logic of the password manager screens on every vault store backend.
+
+One round registers an account, adds, changes and deletes an entry and reads the vault, through the
+same functions the screens call (safe_register_data, safe_new_password_data, safe_changed_data,
+delete_password, read_data_json). Every backend starts on a fresh vault with a cold key cache, so the
+file-based backends include one key derivation per round, while the memory backend measures the code alone.
+
+Usage: python -m benchmarks.bench_vault_store [--rounds 20]
+"""
+import argparse
+import os
+import tempfile
+import time
+from source import password_manager
+from source.key_derivation import wipe_key_cache
+from source.vault_storage import invalidate_vault_cache
+from source.vault_store import create_store, configure_store
+
+PASSWORD = "benchmark-password"
+
+def run_round(round_number: int) -> None:
+    """
+    Runs one round of the screen operations on the configured store.
+
+    :param round_number: The number of the round, used to make the mail unique.
+    """
+    mail = f"user{round_number}@example.com"
+    password_manager.create_accounts_file()
+    password_manager.safe_register_data(mail, "MasterPassword1!")
+    password_manager.safe_new_password_data({"Site": {"name": "Site", "password": "pw1", "url": "", "text": "", "history": []}}, mail, "Site")
+    password_manager.safe_changed_data(mail, "Site", "https://example.com", "", "pw2", "Site", False)
+    password_manager.delete_password(mail, "Site")
+    password_manager.read_data_json()
+
+def main() -> None:
+    """
+    Parses the command line and prints the mean time of one round per backend.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=20, help="rounds per backend")
+    arguments = parser.parse_args()
+    print(f"{'backend':<10} {'ms/round':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for backend, location in [("memory", None), ("file", "data.json"), ("sharded", "vault"), ("sqlite", "data.db")]:
+            total = 0.0
+            for round_number in range(arguments.rounds):
+                wipe_key_cache()
+                invalidate_vault_cache()
+                path = os.path.join(directory, f"{backend}-{round_number}-{location}") if location else None
+                configure_store(create_store(backend, path, PASSWORD))
+                start = time.perf_counter()
+                run_round(round_number)
+                total += time.perf_counter() - start
+            print(f"{backend:<10} {total / arguments.rounds * 1000:>10.3f}")
+    configure_store(None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+This module generates synthetic vaults in the current schema of data.json, for benchmarks at realistic sizes.
+
+Every account has a mail, a hashed master password, a history salt and its "passwords", and every
+entry has a name, a password, a URL, a note, a "history" of hashed earlier passwords and the dates
+of first access and last change in epoch seconds, to the minute.
+The vault is generated from a seed, so the same arguments always give the same vault.
+
+Usage: python -m benchmarks.vault_generator --accounts 1000 --entries 100 [--history 5] [--seed 0] [--output vault.json] [--password ...]
+"""
+import argparse
+import base64
+import datetime
+import random
+import string
+import time
+from typing import Any
+from source.data_cryptography import save_encrypted_dict_to_file
+from source.password_manager import hash_password
+from source.vault_schema import empty_vault
+from source.password_history import HISTORY_SALT_BYTES, hash_history_password
+
+SITES = ["Amazon", "Paypal", "Steam", "Github", "Google", "Netflix", "Spotify", "Ebay", "Dropbox", "Twitter",
+         "Reddit", "Zoom", "Slack", "Adobe", "Avira", "EA", "Ubisoft", "Discord", "Twitch", "Outlook"]
+PASSWORD_CHARACTERS = string.ascii_letters + string.digits + "!#$%&*+-?@_"
+FIRST_DATE = datetime.datetime(2015, 1, 1)
+
+def _random_password(rng: random.Random) -> str:
+    """
+    Returns a random password of 10 to 20 characters.
+
+    :param rng: The random generator.
+    :return: The password.
+    """
+    return "".join(rng.choices(PASSWORD_CHARACTERS, k=rng.randint(10, 20)))
+
+def _random_date(rng: random.Random, after: datetime.datetime) -> datetime.datetime:
+    """
+    Returns a random date between a given date and about ten years after 2015.
+
+    :param rng: The random generator.
+    :param after: The earliest date.
+    :return: The date, to the minute.
+    """
+    latest = FIRST_DATE + datetime.timedelta(days=3650)
+    span = max(int((latest - after).total_seconds() // 60), 1)
+    return after + datetime.timedelta(minutes=rng.randrange(span))
+
+def generate_entry(rng: random.Random, name: str, history: int, salt: bytes) -> dict:
+    """
+    Generates one password entry.
+
+    :param rng: The random generator.
+    :param name: The name of the entry.
+    :param history: The maximum number of passwords of the entry, the current one included.
+    :param salt: The history salt of the account.
+    :return: The entry dictionary.
+    """
+    old_passwords = [_random_password(rng) for _ in range(rng.randint(1, max(history, 1)))]
+    first_access = _random_date(rng, FIRST_DATE)
+    last_change = _random_date(rng, first_access) if len(old_passwords) > 1 else first_access
+    return {
+        "name": name,
+        "password": old_passwords[-1],
+        "url": f"https://www.{name.lower()}.com/login",
+        "text": rng.choice(["", "", "Firmenkonto", "2FA aktiviert", f"Kundennummer {rng.randrange(10 ** 8)}"]),
+        "history": [hash_history_password(salt, password) for password in old_passwords[:-1]],
+        "dateoffirstaccess": int(first_access.timestamp()),
+        "dateoflastchange": int(last_change.timestamp())
+    }
+
+def generate_vault(accounts: int, entries: int, history: int = 5, seed: int = 0) -> dict:
+    """
+    Generates a vault dictionary in the layout of data.json.
+
+    :param accounts: The number of accounts.
+    :param entries: The number of entries per account.
+    :param history: The maximum number of passwords of an entry, the current one included.
+    :param seed: The seed of the random generator.
+    :return: The vault dictionary.
+    """
+    rng = random.Random(seed)
+    master_password = hash_password("MasterPassword1!")
+    vault: dict[str, Any] = empty_vault()
+    for account_number in range(accounts):
+        mail = f"user{account_number}@example.com"
+        names = [SITES[number % len(SITES)] + (str(number // len(SITES)) if number >= len(SITES) else "") for number in range(entries)]
+        rng.shuffle(names)
+        salt = rng.randbytes(HISTORY_SALT_BYTES)
+        vault["accounts"][mail] = {
+            "mail": mail,
+            "master-password": master_password,
+            "history-salt": base64.b64encode(salt).decode('ascii'),
+            "passwords": {name: generate_entry(rng, name, history, salt) for name in names}
+        }
+    return vault
+
+def main() -> None:
+    """
+    Parses the command line, generates a vault and saves it encrypted.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, required=True, help="number of accounts")
+    parser.add_argument("--entries", type=int, required=True, help="entries per account")
+    parser.add_argument("--history", type=int, default=5, help="maximum passwords in the history of an entry")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random generator")
+    parser.add_argument("--output", default="generated_vault.json", help="the vault file to write")
+    parser.add_argument("--password", default="benchmark-password", help="the password of the vault")
+    arguments = parser.parse_args()
+    start = time.perf_counter()
+    vault = generate_vault(arguments.accounts, arguments.entries, arguments.history, arguments.seed)
+    save_encrypted_dict_to_file(vault, arguments.output, arguments.password)
+    print(f"{arguments.output}: {arguments.accounts} accounts, {arguments.accounts * arguments.entries} entries ({time.perf_counter() - start:.1f} s)")
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,16 @@ This module is main.py
 """
 import curses
 from source.password_manager import password_manager, create_accounts_file, start_screen
+from source.vault_store import warm_up_store
 
 def main(stdscr: curses.window) -> None:
     """
     Main function in which screen options are declared and the passwort manager function gets executed
+
+    The vault is unlocked in the background while the start screen is drawn.
     """
+    create_accounts_file()
+    warm_up_store()
     self_grey = 1
     curses.start_color()
     curses.init_color(self_grey, 400, 400, 400)
@@ -16,7 +21,6 @@ def main(stdscr: curses.window) -> None:
     curses.init_pair(3, curses.COLOR_RED, curses.COLOR_BLACK) #Schriftfarbe: Rot, Hintergrundfarbe: Schwarz
     curses.init_pair(4, curses.COLOR_WHITE, curses.COLOR_BLACK)
     height, width = stdscr.getmaxyx()
-    create_accounts_file()
     mail = start_screen(stdscr, height, width)
     password_manager(stdscr, height, width, mail)
 
@@ -0,0 +1,299 @@
+"""
+This module provides the key slots and the authenticated encryption of vault files.
+
+A vault is encrypted with a random data key that is wrapped (AES key wrap) by one key-encryption key per password;
+the wrapped keys are kept in the key slots of the file header (see source.data_cryptography), so adding, changing or
+removing a password re-wraps the data key instead of re-encrypting the vault (the vault file is still copied once
+to replace it atomically with the new header).
+
+The module includes functions to:
+- Wrap the data key for a password into a key slot and unwrap it with the first key slot a password opens.
+- Return the key that encrypts the payload of a vault file, for files with and without key slots.
+- Tell whether a vault file should be rehashed with the default KDF (see source.key_derivation).
+- Derive the per-file key the segments of a vault file are encrypted with, and other subkeys of a key with HKDF-SHA256.
+- Encrypt and decrypt a single small record (a journal record, an envelope record or a database row) with AES-256-GCM,
+  bound to its position by associated data.
+- Encrypt and decrypt a payload with an authenticated cipher (AES-256-GCM or ChaCha20-Poly1305) in segments of
+  SEGMENT_SIZE plaintext bytes, so a wrong key or a tampered file is rejected at the tag of the first bad segment.
+
+The segments are encrypted STREAM-style: files with the header field "segment-key": "hkdf-sha256" use a subkey derived
+from the data key with HKDF-SHA256 and the 16-byte IV of the file as salt, so every snapshot has its own key and the
+short nonce prefix never has to be unique across files (older files use the data key itself). The nonce of a segment is
+the first 7 bytes of the IV | segment number (4 bytes, big endian) | 1 for the last segment, else 0, so segments cannot
+be reordered, dropped or appended without failing their tag.
+"""
+import base64
+import os
+import struct
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, Optional, Union
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, keywrap
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from cryptography.exceptions import InvalidTag
+from source.key_derivation import derive_key, get_default_kdf, header_kdf
+
+AEAD_CIPHERS: dict[str, Callable[[bytes], Any]] = {
+    "aes-256-gcm": AESGCM,
+    "chacha20-poly1305": ChaCha20Poly1305,
+}
+TAG_SIZE = 16
+SEGMENT_SIZE = 64 * 1024
+SEGMENT_KEY = "hkdf-sha256"
+RECORD_NONCE_SIZE = 12
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+_segment_counter = struct.Struct(">I")
+
+def wrap_key_slot(data_key: bytes, password: str, salt: bytes) -> dict:
+    """
+    Builds a key slot that wraps the data key with a key derived from the password with the default KDF.
+
+    :param data_key: The data key of the vault.
+    :param password: The password of the key slot.
+    :param salt: The salt of the key slot.
+    :return: The key slot.
+    """
+    kdf = get_default_kdf()
+    wrapped_key = keywrap.aes_key_wrap(derive_key(password, salt, kdf=kdf), data_key, default_backend()) # type: ignore
+    return {"salt": base64.b64encode(salt).decode('ascii'), "kdf": kdf, "wrapped-key": base64.b64encode(wrapped_key).decode('ascii')}
+
+def unwrap_key_slot(header: dict, password: str) -> tuple[bytes, int]:
+    """
+    Unwraps the data key with the first key slot of the header that the password opens.
+
+    :param header: The fields of the file header.
+    :param password: The password.
+    :return: The tuple (data key, index of the key slot).
+    :raises ValueError: If the header has no key slot for the password.
+    """
+    for index, slot in enumerate(header.get("keys", [])):
+        key_encryption_key = derive_key(password, base64.b64decode(slot["salt"]), kdf=header_kdf(slot))
+        try:
+            return keywrap.aes_key_unwrap(key_encryption_key, base64.b64decode(slot["wrapped-key"]), default_backend()), index # type: ignore
+        except keywrap.InvalidUnwrap:
+            continue
+    raise ValueError("Wrong password: no key slot of the vault opens with it")
+
+def unwrap_data_key(header: dict, password: str) -> bytes:
+    """
+    Returns the data key of a vault file with key slots.
+
+    :param header: The fields of the file header.
+    :param password: The password.
+    :return: The data key (in bytes).
+    :raises ValueError: If the header has no key slot for the password.
+    """
+    return unwrap_key_slot(header, password)[0]
+
+def unlock_container(header: dict, password: str, salt: bytes) -> tuple[bytes, bytes]:
+    """
+    Returns the key that encrypts the payload of a vault file: the unwrapped data key, or for files
+    without key slots the key derived from the password and the salt of the file.
+
+    :param header: The fields of the file header.
+    :param password: The password.
+    :param salt: The salt of the file.
+    :return: The tuple (key, salt the password was derived with), the salt to be kept as session salt.
+    :raises ValueError: If the header has no key slot for the password.
+    """
+    if "keys" not in header:
+        return derive_key(password, salt, kdf=header_kdf(header)), salt
+    data_key, index = unwrap_key_slot(header, password)
+    return data_key, base64.b64decode(header["keys"][index]["salt"])
+
+def key_slots_for_save(header: Optional[dict], password: str, salt: bytes, keep_salt: bool) -> tuple[bytes, list]:
+    """
+    Returns the data key and key slots for a new snapshot of a vault file. If the password opens the
+    existing file, its data key and key slots are kept (so other passwords keep working), and only the
+    slot of the password is re-wrapped if it does not use the default KDF or a new salt was requested.
+    Otherwise a new data key with a single key slot for the password is created.
+
+    :param header: The fields of the header of the existing file, or None if there is none.
+    :param password: The password.
+    :param salt: The salt for a new key slot.
+    :param keep_salt: Whether the salt of an existing key slot may be kept.
+    :return: The tuple (data key, key slots).
+    """
+    header = header or {}
+    try:
+        data_key, index = unwrap_key_slot(header, password)
+    except ValueError:
+        data_key = os.urandom(32)
+        return data_key, [wrap_key_slot(data_key, password, salt)]
+    key_slots = list(header["keys"])
+    if not keep_salt or header_kdf(key_slots[index]) != get_default_kdf():
+        key_slots[index] = wrap_key_slot(data_key, password, salt)
+    return data_key, key_slots
+
+def needs_rehash(header: dict, password: Optional[str] = None) -> bool:
+    """
+    Tells whether a vault file was written with other KDF parameters than the current default and should be rehashed.
+
+    For a file with key slots only the slot the password opens is checked; without a password, every slot is.
+
+    :param header: The fields of the file header.
+    :param password: The password the vault is unlocked with.
+    :return: True if the KDF of the file (or of the key slot) differs from the default KDF.
+    """
+    default_kdf = get_default_kdf()
+    if "keys" not in header:
+        return header_kdf(header) != default_kdf
+    if password is None:
+        return any(header_kdf(slot) != default_kdf for slot in header["keys"])
+    try:
+        index = unwrap_key_slot(header, password)[1]
+    except ValueError:
+        return False
+    return header_kdf(header["keys"][index]) != default_kdf
+
+def segment_key(key: bytes, iv: bytes, header: dict) -> bytes:
+    """
+    Returns the key the segments of a vault file are encrypted with: for files with the "segment-key" header
+    field a subkey derived from the data key with HKDF-SHA256 and the IV of the file, else the data key itself.
+
+    :param key: The data key (or the key derived from the password, for files without key slots).
+    :param iv: The IV of the file.
+    :param header: The fields of the file header.
+    :return: The segment key (32 bytes).
+    :raises ValueError: If the header names an unknown segment key derivation.
+    """
+    derivation = header.get("segment-key")
+    if derivation is None:
+        return key
+    if derivation != SEGMENT_KEY:
+        raise ValueError(f"Unknown vault segment key: {derivation}")
+    return derive_subkey(key, iv, b"vault segments")
+
+def derive_subkey(key: bytes, salt: bytes, info: bytes) -> bytes:
+    """
+    Derives a subkey from a key with HKDF-SHA256, so one key never encrypts with two ciphers or for two purposes.
+
+    :param key: The key to derive from (32 bytes).
+    :param salt: The salt, e.g. the IV of a file or the id of a snapshot.
+    :param info: The purpose of the subkey.
+    :return: The subkey (32 bytes).
+    """
+    return HKDF(algorithm=hashes.SHA256(), length=32, salt=salt, info=info, backend=default_backend()).derive(key) # type: ignore
+
+def encrypt_record(plaintext: bytes, key: bytes, associated_data: bytes) -> bytes:
+    """
+    Encrypts a single record with AES-256-GCM and a random nonce.
+
+    :param plaintext: The record.
+    :param key: The encryption key (32 bytes).
+    :param associated_data: The data the record is bound to, e.g. its id or its offset in a file.
+    :return: The nonce (12 bytes) followed by the ciphertext and its tag.
+    """
+    nonce = os.urandom(RECORD_NONCE_SIZE)
+    return nonce + AESGCM(key).encrypt(nonce, plaintext, associated_data)
+
+def decrypt_record(payload: bytes, key: bytes, associated_data: bytes) -> bytes:
+    """
+    Decrypts and verifies a record that was encrypted with encrypt_record.
+
+    :param payload: The nonce, ciphertext and tag.
+    :param key: The decryption key (32 bytes).
+    :param associated_data: The data the record was bound to.
+    :return: The record.
+    :raises ValueError: If the key is wrong, or the record was modified or moved.
+    """
+    try:
+        return AESGCM(key).decrypt(payload[:RECORD_NONCE_SIZE], payload[RECORD_NONCE_SIZE:], associated_data)
+    except InvalidTag as error:
+        raise ValueError("The record could not be authenticated: wrong key, modified or moved record") from error
+
+def _segment_nonce(iv: bytes, counter: int, last: bool) -> bytes:
+    """
+    Returns the nonce of a segment: the first 7 bytes of the IV, the segment number and the last-segment flag.
+
+    :param iv: The IV of the file.
+    :param counter: The number of the segment.
+    :param last: Whether the segment is the last one.
+    :return: The 12-byte nonce.
+    """
+    return iv[:7] + _segment_counter.pack(counter) + (b"\x01" if last else b"\x00")
+
+def _exact_chunks(chunks: Iterable[Buffer], chunk_size: int) -> Iterator[tuple[bytes, bool]]:
+    """
+    Regroups a sequence of chunks of any size into chunks of exactly chunk_size bytes (the last one may be shorter)
+    and flags the last one. An empty input yields one empty last chunk.
+
+    :param chunks: The chunks.
+    :param chunk_size: The size of the regrouped chunks.
+    :return: An iterator over the tuples (chunk, is last chunk).
+    """
+    pending = bytearray()
+    for chunk in chunks:
+        pending += chunk
+        while len(pending) > chunk_size:
+            yield bytes(pending[:chunk_size]), False
+            del pending[:chunk_size]
+    yield bytes(pending), True
+
+def encrypt_segments(chunks: Iterable[Buffer], destination: BinaryIO, key: bytes, iv: bytes, *, cipher: str, associated_data: bytes) -> int:
+    """
+    Encrypts a sequence of plaintext chunks with an AEAD cipher into segments of SEGMENT_SIZE plaintext bytes and writes them to a file object.
+
+    :param chunks: The plaintext chunks, of any size.
+    :param destination: The binary file object the segments are written to.
+    :param key: The encryption key (32 bytes).
+    :param iv: The IV of the file; its first 7 bytes prefix every nonce.
+    :param cipher: The name of a cipher in AEAD_CIPHERS.
+    :param associated_data: The data that is authenticated with every segment.
+    :return: The number of bytes written.
+    """
+    aead = AEAD_CIPHERS[cipher](key)
+    written = 0
+    for counter, (chunk, last) in enumerate(_exact_chunks(chunks, SEGMENT_SIZE)):
+        written += destination.write(aead.encrypt(_segment_nonce(iv, counter, last), chunk, associated_data))
+    return written
+
+def decrypt_segments(chunks: Iterable[bytes], key: bytes, iv: bytes, cipher: str, associated_data: bytes) -> Iterator[bytes]:
+    """
+    Decrypts and verifies the segments written by encrypt_segments. Every segment is verified before its plaintext is yielded.
+
+    :param chunks: The ciphertext, in chunks of any size.
+    :param key: The decryption key (32 bytes).
+    :param iv: The IV of the file.
+    :param cipher: The name of a cipher in AEAD_CIPHERS.
+    :param associated_data: The data that was authenticated with every segment.
+    :return: An iterator over the plaintext segments.
+    :raises ValueError: If the key is wrong or the file was modified, truncated or extended.
+    """
+    aead = AEAD_CIPHERS[cipher](key)
+    try:
+        for counter, (segment, last) in enumerate(_exact_chunks(chunks, SEGMENT_SIZE + TAG_SIZE)):
+            yield aead.decrypt(_segment_nonce(iv, counter, last), segment, associated_data)
+    except InvalidTag as error:
+        raise ValueError("The vault could not be authenticated: wrong password or modified file") from error
+
+def decrypt_mapped_segments(ciphertext: memoryview, key: bytes, iv: bytes, cipher: str, associated_data: bytes) -> bytearray:
+    """
+    Decrypts and verifies the segments written by encrypt_segments from a memoryview (e.g. of a memory-mapped file)
+    into one preallocated buffer. The AEAD API only takes bytes, so one segment at a time is copied out of the view.
+
+    :param ciphertext: The memoryview of the segments.
+    :param key: The decryption key (32 bytes).
+    :param iv: The IV of the file.
+    :param cipher: The name of a cipher in AEAD_CIPHERS.
+    :param associated_data: The data that was authenticated with every segment.
+    :return: The plaintext.
+    :raises ValueError: If the key is wrong or the file was modified.
+    """
+    aead = AEAD_CIPHERS[cipher](key)
+    segment_size = SEGMENT_SIZE + TAG_SIZE
+    count = max(-(-len(ciphertext) // segment_size), 1)
+    decrypted_data = bytearray(max(len(ciphertext) - count * TAG_SIZE, 0))
+    size = 0
+    try:
+        for counter in range(count):
+            with ciphertext[counter * segment_size:(counter + 1) * segment_size] as segment:
+                chunk = aead.decrypt(_segment_nonce(iv, counter, counter == count - 1), bytes(segment), associated_data)
+            decrypted_data[size:size + len(chunk)] = chunk
+            size += len(chunk)
+    except InvalidTag as error:
+        raise ValueError("The vault could not be authenticated: wrong password or modified file") from error
+    del decrypted_data[size:]
+    return decrypted_data
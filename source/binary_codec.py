@@ -0,0 +1,189 @@
+"""
+This module provides a compact binary serializer for vault dictionaries.
+
+The format is length-prefixed and stores every distinct dictionary key only once, in a key table at
+the start of the document; dictionaries then refer to their keys by index. Keys like
+"dateoffirstaccess" or "oldpasswordlist" that repeat in every entry therefore cost one or two bytes per use.
+
+Layout:
+- magic b"PWB1"
+- key table: varint count, then per key: varint length | UTF-8 bytes
+- value: tag byte followed by
+    - None / False / True: nothing
+    - int: zigzag varint
+    - float: 8 bytes IEEE 754, big endian
+    - str: varint length | UTF-8 bytes
+    - list: varint count | values
+    - dict: varint count | per item: varint key index | value
+
+The module includes functions to:
+- Encode a JSON-compatible value into bytes.
+- Decode bytes back into the value.
+"""
+import struct
+from typing import Any, Union
+
+BINARY_MAGIC = b"PWB1"
+_NONE, _FALSE, _TRUE, _INT, _FLOAT, _STR, _LIST, _DICT = range(8)
+_FLOAT_FORMAT = struct.Struct(">d")
+
+def _write_varint(parts: list, number: int) -> None:
+    """
+    Appends an unsigned integer in LEB128 varint form.
+
+    :param parts: The list of byte strings the output is collected in.
+    :param number: The non-negative integer.
+    """
+    while number >= 0x80:
+        parts.append(bytes(((number & 0x7F) | 0x80,)))
+        number >>= 7
+    parts.append(bytes((number,)))
+
+def _read_varint(buffer: Union[bytes, bytearray, memoryview], offset: int) -> tuple[int, int]:
+    """
+    Reads an unsigned LEB128 varint.
+
+    :param buffer: The encoded document.
+    :param offset: The offset of the varint.
+    :return: The tuple (number, offset after the varint).
+    """
+    number = 0
+    shift = 0
+    while True:
+        byte = buffer[offset]
+        offset += 1
+        number |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return number, offset
+        shift += 7
+
+def _collect_keys(value: Any, keys: dict[str, int]) -> None:
+    """
+    Adds every dictionary key found in the value to the key table.
+
+    :param value: The value to scan.
+    :param keys: The key table, mapping every key to its index.
+    """
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if not isinstance(key, str):
+                raise TypeError(f"keys must be str, not {type(key).__name__}")
+            if key not in keys:
+                keys[key] = len(keys)
+            _collect_keys(item, keys)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _collect_keys(item, keys)
+
+def _encode_value(value: Any, keys: dict[str, int], parts: list) -> None:
+    """
+    Appends the encoding of a value.
+
+    :param value: The value to encode.
+    :param keys: The key table.
+    :param parts: The list of byte strings the output is collected in.
+    """
+    if value is None:
+        parts.append(b"\x00")
+    elif value is False:
+        parts.append(b"\x01")
+    elif value is True:
+        parts.append(b"\x02")
+    elif isinstance(value, int):
+        parts.append(b"\x03")
+        _write_varint(parts, value << 1 if value >= 0 else ((-value) << 1) - 1)
+    elif isinstance(value, float):
+        parts.append(b"\x04" + _FLOAT_FORMAT.pack(value))
+    elif isinstance(value, str):
+        encoded = value.encode('utf-8')
+        parts.append(b"\x05")
+        _write_varint(parts, len(encoded))
+        parts.append(encoded)
+    elif isinstance(value, (list, tuple)):
+        parts.append(b"\x06")
+        _write_varint(parts, len(value))
+        for item in value:
+            _encode_value(item, keys, parts)
+    elif isinstance(value, dict):
+        parts.append(b"\x07")
+        _write_varint(parts, len(value))
+        for key, item in value.items():
+            _write_varint(parts, keys[key])
+            _encode_value(item, keys, parts)
+    else:
+        raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+def encode(value: Any) -> bytes:
+    """
+    Encodes a JSON-compatible value (dicts with str keys, lists, str, int, float, bool, None) into the binary format.
+
+    :param value: The value to encode.
+    :return: The encoded document (in bytes).
+    """
+    keys: dict[str, int] = {}
+    _collect_keys(value, keys)
+    parts: list = [BINARY_MAGIC]
+    _write_varint(parts, len(keys))
+    for key in keys:
+        encoded_key = key.encode('utf-8')
+        _write_varint(parts, len(encoded_key))
+        parts.append(encoded_key)
+    _encode_value(value, keys, parts)
+    return b"".join(parts)
+
+def _decode_value(buffer: Union[bytes, bytearray, memoryview], offset: int, keys: list[str]) -> tuple[Any, int]:
+    """
+    Decodes the value at an offset.
+
+    :param buffer: The encoded document.
+    :param offset: The offset of the value's tag byte.
+    :param keys: The key table.
+    :return: The tuple (value, offset after the value).
+    """
+    tag = buffer[offset]
+    offset += 1
+    if tag == _STR:
+        length, offset = _read_varint(buffer, offset)
+        return str(buffer[offset:offset + length], 'utf-8'), offset + length
+    if tag == _DICT:
+        count, offset = _read_varint(buffer, offset)
+        result = {}
+        for _ in range(count):
+            index, offset = _read_varint(buffer, offset)
+            result[keys[index]], offset = _decode_value(buffer, offset, keys)
+        return result, offset
+    if tag == _LIST:
+        count, offset = _read_varint(buffer, offset)
+        items = []
+        for _ in range(count):
+            item, offset = _decode_value(buffer, offset, keys)
+            items.append(item)
+        return items, offset
+    if tag == _INT:
+        number, offset = _read_varint(buffer, offset)
+        return (number >> 1) ^ -(number & 1), offset
+    if tag == _FLOAT:
+        return _FLOAT_FORMAT.unpack_from(buffer, offset)[0], offset + 8
+    if tag in (_NONE, _FALSE, _TRUE):
+        return (None, False, True)[tag], offset
+    raise ValueError(f"Unknown tag {tag} at offset {offset - 1}")
+
+def decode(buffer: Union[bytes, bytearray, memoryview]) -> Any:
+    """
+    Decodes a document that was encoded with encode.
+
+    :param buffer: The encoded document.
+    :return: The decoded value.
+    """
+    if bytes(buffer[:len(BINARY_MAGIC)]) != BINARY_MAGIC:
+        raise ValueError("Not a binary vault document")
+    count, offset = _read_varint(buffer, len(BINARY_MAGIC))
+    keys = []
+    for _ in range(count):
+        length, offset = _read_varint(buffer, offset)
+        keys.append(str(buffer[offset:offset + length], 'utf-8'))
+        offset += length
+    value, offset = _decode_value(buffer, offset, keys)
+    if offset != len(buffer):
+        raise ValueError("Trailing data after binary vault document")
+    return value
@@ -6,16 +6,70 @@ The module includes functions to:
 - Decrypt data that was encrypted with AES in CFB mode.
 - Save a Python dictionary to a file as encrypted data.
 - Load and decrypt a Python dictionary from an encrypted file.
+- Encrypt and decrypt streams in fixed-size chunks between file objects, so peak memory does not grow with a multiple of the vault size.
+- Load an encrypted dictionary through a memory map, slicing salt, IV and ciphertext as memoryviews and decrypting into one preallocated buffer.
+- Write files atomically and crash-safely through a temporary file, a rename and fsyncs according to the durability policy (see source.durability).
+- Serialize vault dictionaries with a pluggable codec ("json" by default, or the compact "binary" codec); the codec is recorded in the file header.
+- Compress the serialized vault before encryption with zlib, lzma or bz2, or pick the compressor automatically by payload size and a latency budget; the compressor is recorded in the file header.
+- Encrypt the vault with an authenticated cipher (AES-256-GCM or ChaCha20-Poly1305) in fixed-size segments, so a wrong key
+  or a tampered file is rejected at the tag of the first bad segment; the cipher is recorded in the file header.
+- Load several vault files concurrently in a bounded thread pool (load_many), with the timings of every file.
+- Encrypt the vault with a random data key that is wrapped by one key-encryption key per password in the key slots of the
+  header, so adding, changing or removing a password re-wraps the data key instead of re-encrypting the vault; the file is
+  still replaced atomically with the new header in front of the unchanged ciphertext, which costs a copy of the vault.
+Keys are derived from the password in source.key_derivation (KDF, key cache and session salts); the key slots and the
+authenticated segments are implemented in source.authenticated_encryption.
+
+File layout:
+- magic b"PWV2" | header length (2 bytes, big endian) | header (JSON, e.g. {"codec": "json", "compression": "zlib", "cipher": "aes-256-gcm",
+  "keys": [{"salt": ..., "kdf": {"name": "scrypt", "n": 32768, "r": 8, "p": 1}, "wrapped-key": ...}]}; files written by
+  earlier versions pad it with spaces) | salt (16 bytes) | IV (16 bytes) | ciphertext
+- with "aes-256-cfb" the ciphertext is one PKCS7-padded AES-CFB stream; with an AEAD cipher it is a sequence of segments,
+  each the encryption of SEGMENT_SIZE plaintext bytes (the last one shorter) followed by its 16-byte tag. The nonce of a
+  segment is the first 7 bytes of the IV | segment number (4 bytes, big endian) | 1 for the last segment, else 0, and
+  the segments of files with the "segment-key" field are encrypted with a per-file subkey (see source.authenticated_encryption);
+  everything before the ciphertext (header, salt, IV) is authenticated as associated data of every segment; of the header,
+  only the fields without the key slots are authenticated (see authenticated_header), as the key slots are rewritten.
+- the key slots hold the salt, the KDF and the wrapped data key (both base64) of every password that opens the vault.
+Files written before the header was introduced (salt | IV | ciphertext) are still loaded; they always hold JSON encrypted with AES-CFB.
+Files without key slots are encrypted with the key derived from the password and the salt of the file, with the KDF
+of the "kdf" field or, if there is none, PBKDF2-HMAC-SHA256 with KDF_ITERATIONS iterations (LEGACY_KDF).
 """
 import json
+import mmap
 import os
-from typing import Any
+import shutil
+import struct
+import tempfile
+import time
+import zlib
+import lzma
+import bz2
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, suppress
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, Optional, Union
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import padding
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from source import binary_codec, durability
+from source.key_derivation import get_session_salt, set_session_salt
+from source.authenticated_encryption import (AEAD_CIPHERS, Buffer, decrypt_mapped_segments, decrypt_segments, encrypt_segments,
+                                             key_slots_for_save, segment_key, SEGMENT_KEY, unlock_container, unwrap_key_slot, wrap_key_slot)
+
+CONTAINER_MAGIC = b"PWV2"
+DEFAULT_CODEC = "json"
+DEFAULT_CIPHER = "aes-256-gcm"
+LEGACY_CIPHER = "aes-256-cfb"
+DEFAULT_COMPRESSION = "auto"
+AUTO_COMPRESSION_MIN_SIZE = 4 * 1024
+AUTO_COMPRESSION_BUDGET = 0.1
+CHUNK_SIZE = 64 * 1024
+INCREMENTAL_JSON_MIN_SIZE = 8 * 1024 * 1024
+LOAD_MANY_WORKERS = min(8, os.cpu_count() or 1)
+CIPHERS = (LEGACY_CIPHER,) + tuple(AEAD_CIPHERS)
 
+_header_length = struct.Struct(">H")
+_compression_rates: dict[str, float] = {}
 
 def encrypt_data(data: bytes, key: bytes, iv: bytes) -> Any:
     """
@@ -49,55 +103,637 @@ def decrypt_data(encrypted_data: bytes, key: bytes, iv: bytes) -> Any:
     data = unpadder.update(padded_data) + unpadder.finalize()
     return data
 
-def save_encrypted_dict_to_file(data_dict: dict, output_filename: str, password: str) -> None:
+def encrypt_chunks(chunks: Iterable[Buffer], destination: BinaryIO, key: bytes, iv: bytes) -> int:
+    """
+    Encrypts a sequence of plaintext chunks with AES in CFB mode (PKCS7-padded, like encrypt_data) and writes
+    the ciphertext to a file object as it is produced.
+
+    :param chunks: The plaintext chunks (in bytes).
+    :param destination: The binary file object the ciphertext is written to.
+    :param key: The encryption key (in bytes).
+    :param iv: The initialization vector (IV) for the cipher (in bytes).
+    :return: The number of ciphertext bytes written.
+    """
+    padder = padding.PKCS7(128).padder() # type: ignore
+    cipher = Cipher(algorithms.AES(key), modes.CFB(iv), backend=default_backend()) # type: ignore
+    encryptor = cipher.encryptor() # type: ignore
+    written = 0
+    for chunk in chunks:
+        written += destination.write(encryptor.update(padder.update(chunk)))
+    written += destination.write(encryptor.update(padder.finalize()) + encryptor.finalize())
+    return written
+
+def decrypt_chunks(chunks: Iterable[bytes], key: bytes, iv: bytes) -> Iterator[bytes]:
+    """
+    Decrypts a sequence of ciphertext chunks that were encrypted with encrypt_data or encrypt_chunks
+    and yields the unpadded plaintext chunk by chunk.
+
+    :param chunks: The ciphertext chunks (in bytes).
+    :param key: The decryption key (in bytes).
+    :param iv: The initialization vector (IV) used during encryption (in bytes).
+    :return: An iterator over the plaintext chunks (in bytes).
+    """
+    cipher = Cipher(algorithms.AES(key), modes.CFB(iv), backend=default_backend()) # type: ignore
+    decryptor = cipher.decryptor() # type: ignore
+    unpadder = padding.PKCS7(128).unpadder() # type: ignore
+    for chunk in chunks:
+        data = unpadder.update(decryptor.update(chunk))
+        if data:
+            yield data
+    yield unpadder.update(decryptor.finalize()) + unpadder.finalize()
+
+def _read_chunks(source: BinaryIO, chunk_size: int) -> Iterator[bytes]:
+    """
+    Reads a file object in chunks of a fixed size until its end.
+
+    :param source: The binary file object.
+    :param chunk_size: The size of each chunk in bytes.
+    :return: An iterator over the chunks.
+    """
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+def encrypt_stream(source: BinaryIO, destination: BinaryIO, key: bytes, iv: bytes, chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Encrypts everything that is read from one file object into another, one fixed-size chunk at a time.
+
+    :param source: The binary file object the plaintext is read from.
+    :param destination: The binary file object the ciphertext is written to.
+    :param key: The encryption key (in bytes).
+    :param iv: The initialization vector (IV) for the cipher (in bytes).
+    :param chunk_size: The number of bytes read per chunk.
+    :return: The number of ciphertext bytes written.
+    """
+    return encrypt_chunks(_read_chunks(source, chunk_size), destination, key, iv)
+
+def decrypt_stream(source: BinaryIO, destination: BinaryIO, key: bytes, iv: bytes, chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Decrypts everything that is read from one file object into another, one fixed-size chunk at a time.
+
+    :param source: The binary file object the ciphertext is read from.
+    :param destination: The binary file object the plaintext is written to.
+    :param key: The decryption key (in bytes).
+    :param iv: The initialization vector (IV) used during encryption (in bytes).
+    :param chunk_size: The number of bytes read per chunk.
+    :return: The number of plaintext bytes written.
+    """
+    written = 0
+    for chunk in decrypt_chunks(_read_chunks(source, chunk_size), key, iv):
+        written += destination.write(chunk)
+    return written
+
+def _json_chunks(data_dict: dict, chunk_size: int) -> Iterator[bytes]:
+    """
+    Serializes a dictionary with the incremental JSON encoder and yields the UTF-8 output in chunks of about chunk_size bytes.
+    The output is identical to json.dumps(data_dict).
+
+    :param data_dict: The dictionary to serialize.
+    :param chunk_size: The approximate size of each chunk.
+    :return: An iterator over the JSON chunks (in bytes).
+    """
+    parts: list[str] = []
+    size = 0
+    for part in json.JSONEncoder().iterencode(data_dict):
+        parts.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield ''.join(parts).encode('utf-8')
+            parts, size = [], 0
+    if parts:
+        yield ''.join(parts).encode('utf-8')
+
+def _slice_chunks(data: bytes, chunk_size: int) -> Iterator[memoryview]:
+    """
+    Yields fixed-size slices of a bytes object without copying it.
+
+    :param data: The bytes to slice.
+    :param chunk_size: The size of each slice.
+    :return: An iterator over memoryview slices.
+    """
+    view = memoryview(data)
+    for offset in range(0, len(data), chunk_size):
+        yield view[offset:offset + chunk_size]
+
+@contextmanager
+def open_atomically(output_filename: str) -> Iterator[BinaryIO]:
+    """
+    Opens a temporary file next to the target for writing and renames it into place when the block
+    finishes, so readers see either the old or the new file but never a partially written one.
+    The temporary file gets a unique name (tempfile.mkstemp), so concurrent writers of the same target
+    never write into each other's temporary file. Unless the durability policy is "never", the temporary
+    file is fsynced before the rename and the directory after it (see source.durability), so a crash leaves
+    either the complete old or the complete new file.
+    If the block raises, the temporary file is removed and the target stays untouched.
+
+    :param output_filename: The name of the file to write.
+    :return: The binary file object to write to.
+    """
+    descriptor, temp_filename = tempfile.mkstemp(prefix=f"{os.path.basename(output_filename)}.", suffix=".tmp",
+                                                 dir=os.path.dirname(os.path.abspath(output_filename)))
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            yield file
+            durability.sync_before_rename(file)
+    except BaseException:
+        with suppress(OSError):
+            os.remove(temp_filename)
+        raise
+    os.replace(temp_filename, output_filename)
+    durability.sync_after_rename(output_filename)
+
+def write_file_atomically(output_filename: str, payload: bytes) -> None:
+    """
+    Writes the payload to a temporary file next to the target and renames it into place,
+    so readers see either the old or the new file but never a partially written one.
+
+    :param output_filename: The name of the file to write.
+    :param payload: The bytes to write.
+    """
+    with open_atomically(output_filename) as file:
+        file.write(payload)
+
+def _json_encode(value: Any) -> bytes:
+    """
+    Serializes a value with json.dumps.
+
+    :param value: The value to serialize.
+    :return: The UTF-8 encoded JSON (in bytes).
+    """
+    return json.dumps(value).encode('utf-8')
+
+def _json_decode(buffer: bytearray) -> Any:
+    """
+    Parses UTF-8 encoded JSON. The buffer is cleared once it is decoded, so only one copy of the plaintext is alive while parsing.
+
+    :param buffer: The UTF-8 encoded JSON.
+    :return: The parsed value.
+    """
+    json_string = buffer.decode('utf-8')
+    del buffer[:]
+    return json.loads(json_string)
+
+SERIALIZERS: dict[str, tuple[Callable[[Any], bytes], Callable[[bytearray], Any]]] = {
+    "json": (_json_encode, _json_decode),
+    "binary": (binary_codec.encode, binary_codec.decode),
+}
+
+def register_serializer(name: str, encode: Callable[[Any], bytes], decode: Callable[[bytearray], Any]) -> None:
+    """
+    Registers a serializer under a codec name, so it can be selected when saving and is picked automatically when loading.
+
+    :param name: The codec name that is recorded in the file header.
+    :param encode: A function that turns the vault dictionary into bytes.
+    :param decode: A function that turns the decrypted bytes (a bytearray it may clear) back into the dictionary.
+    """
+    SERIALIZERS[name] = (encode, decode)
+
+def get_serializer(codec: str) -> tuple[Callable[[Any], bytes], Callable[[bytearray], Any]]:
+    """
+    Returns the (encode, decode) functions of a registered serializer.
+
+    :param codec: The codec name.
+    :return: The tuple (encode, decode).
+    :raises ValueError: If no serializer is registered under that name.
+    """
+    try:
+        return SERIALIZERS[codec]
+    except KeyError:
+        raise ValueError(f"Unknown vault codec: {codec}") from None
+
+COMPRESSIONS: dict[str, tuple[Callable[[], Any], Callable[[], Any]]] = {
+    "zlib": (lambda: zlib.compressobj(6), zlib.decompressobj),
+    "bz2": (lambda: bz2.BZ2Compressor(9), bz2.BZ2Decompressor),
+    "lzma": (lzma.LZMACompressor, lzma.LZMADecompressor),
+}
+
+def _compress_chunks(chunks: Iterable[Buffer], compression: str) -> Iterator[Buffer]:
+    """
+    Compresses a sequence of chunks incrementally.
+
+    :param chunks: The uncompressed chunks.
+    :param compression: The name of a compressor in COMPRESSIONS, or "none".
+    :return: An iterator over the compressed chunks.
+    """
+    if compression == "none":
+        yield from chunks
+        return
+    compressor = COMPRESSIONS[compression][0]()
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def _decompress_chunks(chunks: Iterable[Buffer], compression: str) -> Iterator[Buffer]:
+    """
+    Decompresses a sequence of chunks incrementally.
+
+    :param chunks: The compressed chunks.
+    :param compression: The name of a compressor in COMPRESSIONS, or "none".
+    :return: An iterator over the decompressed chunks.
+    :raises ValueError: If the compressor is unknown.
+    """
+    if compression == "none":
+        yield from chunks
+        return
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown vault compression: {compression}")
+    decompressor = COMPRESSIONS[compression][1]()
+    for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+    if hasattr(decompressor, "flush"):
+        yield decompressor.flush()
+
+def _compression_rate(compression: str, sample: bytes) -> float:
+    """
+    Returns the seconds per byte a compressor needs on this host, measured once per process on a sample payload.
+
+    :param compression: The name of a compressor in COMPRESSIONS.
+    :param sample: A sample of the payload.
+    :return: The measured seconds per byte.
+    """
+    if compression not in _compression_rates:
+        start = time.perf_counter()
+        for _ in _compress_chunks([sample], compression):
+            pass
+        _compression_rates[compression] = (time.perf_counter() - start) / len(sample)
+    return _compression_rates[compression]
+
+def choose_compression(payload: bytes, latency_budget: Optional[float] = None) -> str:
+    """
+    Picks the compressor for a payload: none for small payloads, otherwise the strongest compressor
+    (lzma, then bz2, then zlib) whose estimated compression time fits into the latency budget.
+    zlib is used if none fits, as it still pays for itself in I/O.
+
+    :param payload: The serialized vault.
+    :param latency_budget: The time in seconds compression may take, or None for AUTO_COMPRESSION_BUDGET.
+    :return: The name of the compressor, or "none".
+    """
+    if len(payload) < AUTO_COMPRESSION_MIN_SIZE:
+        return "none"
+    budget = AUTO_COMPRESSION_BUDGET if latency_budget is None else latency_budget
+    sample = payload[:CHUNK_SIZE]
+    for compression in ("lzma", "bz2", "zlib"):
+        if _compression_rate(compression, sample) * len(payload) <= budget:
+            return compression
+    return "zlib"
+
+def build_container_header(header: dict) -> bytes:
+    """
+    Builds the file header that precedes salt, IV and ciphertext.
+
+    :param header: The header fields, e.g. {"codec": "json"}.
+    :return: The encoded header (in bytes).
+    """
+    encoded_header = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    return CONTAINER_MAGIC + _header_length.pack(len(encoded_header)) + encoded_header
+
+def authenticated_header(header: dict, encoded_header: bytes) -> bytes:
+    """
+    Returns the part of the file header that is authenticated as associated data: the encoded header
+    as it is, or for files with key slots the header fields without the key slots, re-encoded.
+
+    :param header: The parsed header fields.
+    :param encoded_header: The header as it was read from the file.
+    :return: The bytes to authenticate.
+    """
+    if "keys" not in header:
+        return bytes(encoded_header)
+    return build_container_header({name: value for name, value in header.items() if name != "keys"})
+
+def parse_container_header(buffer: Union[bytes, bytearray, memoryview]) -> tuple[dict, int]:
+    """
+    Parses the file header at the start of a buffer.
+
+    :param buffer: The start of the file (or the whole file).
+    :return: The tuple (header fields, offset of the salt); files without a header yield ({"codec": "json"}, 0).
+    """
+    if bytes(buffer[:len(CONTAINER_MAGIC)]) != CONTAINER_MAGIC:
+        return {"codec": "json"}, 0
+    start = len(CONTAINER_MAGIC) + _header_length.size
+    (length,) = _header_length.unpack_from(buffer, len(CONTAINER_MAGIC))
+    return json.loads(bytes(buffer[start:start + length]).decode('utf-8')), start + length
+
+def read_container_header(file: BinaryIO) -> dict:
+    """
+    Reads the file header from a file object opened at its start and leaves the file positioned at the salt.
+
+    :param file: The binary file object.
+    :return: The header fields.
+    """
+    prefix = file.read(len(CONTAINER_MAGIC) + _header_length.size)
+    if prefix[:len(CONTAINER_MAGIC)] != CONTAINER_MAGIC:
+        file.seek(0)
+        return {"codec": "json"}
+    (length,) = _header_length.unpack_from(prefix, len(CONTAINER_MAGIC))
+    header: dict = json.loads(file.read(length).decode('utf-8'))
+    return header
+
+def _existing_size(filename: str) -> int:
+    """
+    Returns the size of an existing vault file, as an estimate of the size of the next snapshot.
+
+    :param filename: The name of the vault file.
+    :return: The size in bytes, or 0 if the file does not exist.
+    """
+    try:
+        return os.path.getsize(filename)
+    except OSError:
+        return 0
+
+def _existing_header(filename: str) -> Optional[dict]:
+    """
+    Reads the header of an existing vault file, whose key slots a new snapshot keeps (see key_slots_for_save).
+
+    :param filename: The name of the vault file.
+    :return: The header fields, or None if there is no readable file.
+    """
+    try:
+        with open(filename, 'rb') as file:
+            return read_container_header(file)
+    except (OSError, ValueError):
+        return None
+
+def _rewrite_key_slots(filename: str, header: dict) -> None:
+    """
+    Writes a header with new key slots in front of the ciphertext of a vault file (without decrypting it)
+    and replaces the file atomically, so a crash leaves either the old or the new key slots but never a
+    torn header. The ciphertext is copied in chunks of CHUNK_SIZE, so the cost grows with the size of the
+    vault, but without the KDF, cipher and serializer work of a new snapshot.
+
+    :param filename: The name of the vault file.
+    :param header: The header fields with the new key slots.
+    """
+    with open(filename, 'rb') as file:
+        read_container_header(file)
+        with open_atomically(filename) as new_file:
+            new_file.write(build_container_header(header))
+            shutil.copyfileobj(file, new_file, CHUNK_SIZE)
+
+def change_password(filename: str, password: str, new_password: str, keep_old: bool = False) -> None:
+    """
+    Gives a new password access to a vault file by wrapping its data key for the new password (with the
+    default KDF); the vault itself is not re-encrypted. A file without key slots is rewritten once with a data key.
+    Changing the password to itself re-wraps its key slot with the default KDF.
+
+    The caller is responsible for locking the vault (see source.vault_storage.change_vault_password).
+
+    :param filename: The name of the vault file.
+    :param password: A password that opens the vault.
+    :param new_password: The new password.
+    :param keep_old: Whether the old password keeps working (adds a password instead of replacing it).
+    :raises ValueError: If the password does not open the vault.
+    """
+    with open(filename, 'rb') as file:
+        header = read_container_header(file)
+    if "keys" not in header:
+        save_encrypted_dict_to_file(load_encrypted_dict_from_file(filename, password), filename, password,
+                                    codec=header.get("codec"), compression=header.get("compression", "none"),
+                                    version=header.get("version"), cipher=header.get("cipher", LEGACY_CIPHER))
+        with open(filename, 'rb') as file:
+            header = read_container_header(file)
+    data_key, index = unwrap_key_slot(header, password)
+    key_slots = list(header["keys"])
+    new_slot = wrap_key_slot(data_key, new_password, get_session_salt(new_password))
+    if keep_old and new_password != password:
+        key_slots.append(new_slot)
+    else:
+        key_slots[index] = new_slot
+    _rewrite_key_slots(filename, dict(header, keys=key_slots))
+
+def remove_password(filename: str, password: str) -> None:
+    """
+    Removes the key slot of a password from a vault file, so the password no longer opens it.
+
+    :param filename: The name of the vault file.
+    :param password: The password to remove.
+    :raises ValueError: If the password does not open the vault or is its only password.
+    """
+    with open(filename, 'rb') as file:
+        header = read_container_header(file)
+    index = unwrap_key_slot(header, password)[1]
+    if len(header["keys"]) == 1:
+        raise ValueError("The only password of a vault cannot be removed")
+    _rewrite_key_slots(filename, dict(header, keys=[slot for number, slot in enumerate(header["keys"]) if number != index]))
+
+def save_encrypted_dict_to_file(data_dict: dict, output_filename: str, password: str, *, keep_salt: bool = True,
+                                stats: Optional[dict] = None, incremental_json: Optional[bool] = None, codec: Optional[str] = None,
+                                compression: Optional[str] = None, version: Optional[int] = None, cipher: Optional[str] = None) -> None:
     """
     Encrypts a dictionary and saves it to a file using a password-derived key.
 
-    The dictionary is first serialized into a JSON string and then encrypted using AES encryption.
-    The encryption key is derived from the provided password using PBKDF2 with a random salt.
+    The dictionary is first serialized with the selected codec (JSON by default), optionally compressed and then
+    encrypted, by default with AES-256-GCM. Codec, compressor and cipher are recorded in the file header.
+    The payload is encrypted with a random data key, which is wrapped with a key derived from the provided password with the
+    default KDF (see set_default_kdf). If the password opens the existing file, its data key and key slots are kept. By default
+    the session salt is kept across saves, so the cached key is reused; the IV is always fresh.
+    The ciphertext is streamed into the file in chunks of CHUNK_SIZE bytes, and the file is replaced atomically.
+    With incremental_json the JSON is produced chunk by chunk as well, which keeps peak memory flat for very
+    large vaults at the cost of the slower pure-Python encoder. By default this is done once the existing file
+    has reached INCREMENTAL_JSON_MIN_SIZE bytes, so small vaults keep the fast one-shot encoder.
 
     :param data_dict: The dictionary to be encrypted and saved.
     :param output_filename: The name of the file to save the encrypted data to.
     :param password: The password used to derive the encryption key.
+    :param keep_salt: Whether to use the session salt instead of a new random salt.
+    :param stats: An optional dictionary that receives "kdf_seconds", "cipher_seconds" and "bytes_written".
+    :param incremental_json: Whether to serialize the dictionary with the incremental JSON encoder (JSON codec only),
+        or None to decide by the size of the existing file.
+    :param codec: The name of a registered serializer (see SERIALIZERS), or None for DEFAULT_CODEC.
+    :param compression: "none", "auto", a compressor in COMPRESSIONS, or None for DEFAULT_COMPRESSION.
+        "auto" uses choose_compression, or zlib with incremental_json, where the size is not known in advance.
+    :param version: An optional vault version that is recorded in the file header (see source.vault_storage).
+    :param cipher: The name of a cipher in CIPHERS, or None for DEFAULT_CIPHER.
     """
-    json_string = json.dumps(data_dict)
-    data = json_string.encode('utf-8')
-    salt = os.urandom(16)
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=32,
-        salt=salt,
-        iterations=100000,
-        backend=default_backend() # type: ignore
-    )
-    key = kdf.derive(password.encode())
+    codec = codec or DEFAULT_CODEC
+    compression = compression or DEFAULT_COMPRESSION
+    cipher = cipher or DEFAULT_CIPHER
+    if cipher not in CIPHERS:
+        raise ValueError(f"Unknown vault cipher: {cipher}")
+    if incremental_json is None:
+        incremental_json = _existing_size(output_filename) >= INCREMENTAL_JSON_MIN_SIZE
+    if codec == "json" and incremental_json:
+        chunks: Iterable[Buffer] = _json_chunks(data_dict, CHUNK_SIZE)
+        if compression == "auto":
+            compression = "zlib"
+    else:
+        payload = get_serializer(codec)[0](data_dict)
+        if compression == "auto":
+            compression = choose_compression(payload)
+        chunks = _slice_chunks(payload, CHUNK_SIZE)
+    if compression != "none" and compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown vault compression: {compression}")
+    chunks = _compress_chunks(chunks, compression)
+    header_fields: dict[str, Any] = {"codec": codec, "compression": compression, "cipher": cipher}
+    if version is not None:
+        header_fields["version"] = version
+    if cipher != LEGACY_CIPHER:
+        header_fields["segment-key"] = SEGMENT_KEY
+    salt = get_session_salt(password) if keep_salt else os.urandom(16)
+    start = time.perf_counter()
+    key, header_fields["keys"] = key_slots_for_save(_existing_header(output_filename), password, salt, keep_salt)
+    kdf_done = time.perf_counter()
+    header = build_container_header(header_fields)
     iv = os.urandom(16)
-    encrypted_data = encrypt_data(data, key, iv)
-    with open(output_filename, 'wb') as file:
-        file.write(salt + iv + encrypted_data)
+    associated_data = authenticated_header(header_fields, header) + salt + iv
+    with open_atomically(output_filename) as file:
+        file.write(header + salt + iv)
+        if cipher == LEGACY_CIPHER:
+            written = len(header) + 32 + encrypt_chunks(chunks, file, key, iv)
+        else:
+            written = len(header) + 32 + encrypt_segments(chunks, file, segment_key(key, iv, header_fields), iv, cipher=cipher, associated_data=associated_data)
+    if stats is not None:
+        stats["kdf_seconds"] = stats.get("kdf_seconds", 0.0) + kdf_done - start
+        stats["cipher_seconds"] = stats.get("cipher_seconds", 0.0) + time.perf_counter() - kdf_done
+        stats["bytes_written"] = stats.get("bytes_written", 0) + written
 
-def load_encrypted_dict_from_file(input_filename: str, password: str) -> Any:
+def load_encrypted_dict_from_file(input_filename: str, password: str, stats: Optional[dict] = None) -> Any:
     """
     Loads and decrypts an encrypted dictionary from a file using a password-derived key.
 
-    The function reads the salt, IV, and encrypted data from the file, derives the decryption key using the provided password, and decrypts the data back into its original dictionary form.
+    The function reads the header, salt, IV, and encrypted data from the file, unwraps the data key (or derives
+    the key of a file without key slots) using the provided password, and decrypts the data back into its
+    original dictionary form with the cipher and codec named in the header. With an AEAD cipher every segment is authenticated before it is used.
+    The ciphertext is read, decrypted and decompressed in chunks of CHUNK_SIZE bytes, so only the plaintext is held in memory as a whole.
+    The salt the password was derived with becomes the session salt, so a following save reuses the cached key.
 
     :param input_filename: The name of the file containing the encrypted data.
     :param password: The password used to derive the decryption key.
+    :param stats: An optional dictionary that receives "kdf_seconds" and "cipher_seconds".
     :return: The decrypted dictionary.
+    :raises ValueError: If the password is wrong or the file was modified (reliably detected with AEAD ciphers only).
     """
     with open(input_filename, 'rb') as file:
-        salt = file.read(16)
-        iv = file.read(16)
-        encrypted_data = file.read()
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=32,
-        salt=salt,
-        iterations=100000,
-        backend=default_backend() # type: ignore
-    )
-    key = kdf.derive(password.encode())
-    decrypted_data = decrypt_data(encrypted_data, key, iv)
-    json_string = decrypted_data.decode('utf-8')
-    return json.loads(json_string)
+        header = read_container_header(file)
+        header_size = file.tell()
+        file.seek(0)
+        prefix = file.read(header_size + 32)
+        salt = prefix[header_size:header_size + 16]
+        iv = prefix[header_size + 16:]
+        associated_data = authenticated_header(header, prefix[:header_size]) + salt + iv
+        start = time.perf_counter()
+        key, session_salt = unlock_container(header, password, salt)
+        kdf_done = time.perf_counter()
+        decrypted_data = bytearray(max(os.fstat(file.fileno()).st_size - file.tell(), 0))
+        size = 0
+        cipher = header.get("cipher", LEGACY_CIPHER)
+        if cipher == LEGACY_CIPHER:
+            plaintext_chunks = decrypt_chunks(_read_chunks(file, CHUNK_SIZE), key, iv)
+        elif cipher in AEAD_CIPHERS:
+            plaintext_chunks = decrypt_segments(_read_chunks(file, CHUNK_SIZE), segment_key(key, iv, header), iv, cipher, associated_data)
+        else:
+            raise ValueError(f"Unknown vault cipher: {cipher}")
+        for chunk in _decompress_chunks(plaintext_chunks, header.get("compression", "none")):
+            decrypted_data[size:size + len(chunk)] = chunk
+            size += len(chunk)
+    del decrypted_data[size:]
+    if stats is not None:
+        stats["kdf_seconds"] = stats.get("kdf_seconds", 0.0) + kdf_done - start
+        stats["cipher_seconds"] = stats.get("cipher_seconds", 0.0) + time.perf_counter() - kdf_done
+    set_session_salt(password, session_salt)
+    return get_serializer(header.get("codec", "json"))[1](decrypted_data)
+
+def _decrypt_cfb_mmap(view: memoryview, offset: int, key: bytes, iv: bytes) -> bytearray:
+    """
+    Decrypts the AES-CFB ciphertext of a memory-mapped file into one preallocated buffer via update_into;
+    only the last block is passed through the PKCS7 unpadder.
+
+    :param view: The memoryview of the whole file.
+    :param offset: The offset of the salt.
+    :param key: The decryption key.
+    :param iv: The IV of the file.
+    :return: The plaintext.
+    """
+    cipher = Cipher(algorithms.AES(key), modes.CFB(iv), backend=default_backend()) # type: ignore
+    decryptor = cipher.decryptor() # type: ignore
+    decrypted_data = bytearray(len(view) - offset - 32 + 15)
+    with view[offset + 32:] as encrypted_data:
+        size = decryptor.update_into(encrypted_data, decrypted_data)
+    decryptor.finalize()
+    unpadder = padding.PKCS7(128).unpadder() # type: ignore
+    last_block = unpadder.update(bytes(decrypted_data[size - 16:size])) + unpadder.finalize()
+    size -= 16 - len(last_block)
+    del decrypted_data[size:]
+    return decrypted_data
+
+def load_encrypted_dict_mmap(input_filename: str, password: str, stats: Optional[dict] = None) -> Any:
+    """
+    Loads and decrypts an encrypted dictionary like load_encrypted_dict_from_file, but without copying the file contents.
+
+    The file is memory-mapped and the salt, IV and ciphertext are sliced from it as memoryviews. The
+    plaintext is written into one preallocated buffer (for AES-CFB via update_into, for AEAD ciphers segment
+    by segment) and decoded straight from the buffer with the codec named in the header.
+
+    :param input_filename: The name of the file containing the encrypted data.
+    :param password: The password used to derive the decryption key.
+    :param stats: An optional dictionary that receives "kdf_seconds" and "cipher_seconds".
+    :return: The decrypted dictionary.
+    :raises ValueError: If the password is wrong or the file was modified (reliably detected with AEAD ciphers only).
+    """
+    with open(input_filename, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        with memoryview(mapped) as view:
+            header, offset = parse_container_header(view)
+            salt = bytes(view[offset:offset + 16])
+            iv = bytes(view[offset + 16:offset + 32])
+            start = time.perf_counter()
+            key, session_salt = unlock_container(header, password, salt)
+            kdf_done = time.perf_counter()
+            cipher = header.get("cipher", LEGACY_CIPHER)
+            if cipher == LEGACY_CIPHER:
+                decrypted_data = _decrypt_cfb_mmap(view, offset, key, iv)
+            elif cipher in AEAD_CIPHERS:
+                associated_data = authenticated_header(header, bytes(view[:offset])) + salt + iv
+                with view[offset + 32:] as ciphertext:
+                    decrypted_data = decrypt_mapped_segments(ciphertext, segment_key(key, iv, header), iv, cipher, associated_data)
+            else:
+                raise ValueError(f"Unknown vault cipher: {cipher}")
+    if header.get("compression", "none") != "none":
+        decrypted_data = bytearray().join(_decompress_chunks([decrypted_data], header["compression"]))
+    if stats is not None:
+        stats["kdf_seconds"] = stats.get("kdf_seconds", 0.0) + kdf_done - start
+        stats["cipher_seconds"] = stats.get("cipher_seconds", 0.0) + time.perf_counter() - kdf_done
+    set_session_salt(password, session_salt)
+    return get_serializer(header.get("codec", "json"))[1](decrypted_data)
+
+def _timed_load(input_filename: str, password: str) -> tuple[Any, dict]:
+    """
+    Loads one vault file for load_many and measures it.
+
+    :param input_filename: The name of the file containing the encrypted data.
+    :param password: The password used to derive the decryption key.
+    :return: The tuple (decrypted dictionary, timings).
+    """
+    timings: dict[str, float] = {}
+    start = time.perf_counter()
+    data = load_encrypted_dict_from_file(input_filename, password, stats=timings)
+    timings["total_seconds"] = time.perf_counter() - start
+    return data, timings
+
+def load_many(passwords: dict[str, str], max_workers: Optional[int] = None, timings: Optional[dict] = None) -> dict[str, Any]:
+    """
+    Loads several vault files concurrently with load_encrypted_dict_from_file.
+
+    The files are loaded in a thread pool of at most max_workers threads. The key derivation and the
+    decryption run in the cryptography package, which releases the GIL, so loading N files costs
+    about one key derivation of wall time as long as N does not exceed the number of workers and cores.
+    The pool is bounded because every key derivation with scrypt holds its own memory.
+
+    :param passwords: The password of every file, keyed by file name.
+    :param max_workers: The maximum number of threads, or None for LOAD_MANY_WORKERS.
+    :param timings: An optional dictionary that receives per file name the "kdf_seconds", "cipher_seconds" and "total_seconds" of its load.
+    :return: The decrypted dictionary of every file, keyed by file name.
+    :raises ValueError: If a password is wrong or a file was modified; the error of the first such file is raised once all loads are done.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers or LOAD_MANY_WORKERS, len(passwords) or 1)), thread_name_prefix="vault-load") as executor:
+        futures = {filename: executor.submit(_timed_load, filename, password) for filename, password in passwords.items()}
+    results = {}
+    for filename, future in futures.items():
+        results[filename], file_timings = future.result()
+        if timings is not None:
+            timings[filename] = file_timings
+    return results
@@ -0,0 +1,207 @@
+"""
+This module decides when written vault files are flushed to stable storage (fsync).
+
+Three policies trade durability against save latency:
+- "always": every save fsyncs the temporary file before it is renamed into place and the directory
+  after the rename, so a save that returned survives a crash or power loss.
+- "interval": every save still fsyncs the temporary file before it is renamed into place, so a rename
+  never exposes a file whose contents are not on disk, but the directory (and data appended to a file)
+  is fsynced by a background thread at most every interval_ms milliseconds. A crash can lose at most
+  the renames and appends of the last interval, which leaves the previous complete file in place.
+- "never": fsync is left to the operating system.
+
+Syncs are group-committed: with "interval", every save of a burst into the same directory is covered
+by the one directory fsync of that interval. With "always", threads that wait for an fsync of the same
+directory or file share the next one instead of queuing one fsync each.
+
+The policy defaults to the environment variable PASSWORD_MANAGER_DURABILITY ("always", "never" or
+"interval:<ms>", e.g. "interval:100"), or "always" if it is not set.
+
+The module includes functions to:
+- Get and set the durability policy.
+- Sync a written file before and after it is renamed into place, and sync appends to a file.
+- Flush all pending syncs of the "interval" policy (also done at exit).
+"""
+import atexit
+import os
+import threading
+import warnings
+from typing import BinaryIO, Optional
+
+POLICIES = ("always", "interval", "never")
+DEFAULT_INTERVAL_MS = 100
+
+class _Settings: # pylint: disable=too-few-public-methods
+    """
+    The durability policy and the pending flush of the "interval" policy.
+    """
+    __slots__ = ("policy", "interval_ms", "flusher")
+
+    def __init__(self) -> None:
+        self.policy = "always"
+        self.interval_ms = DEFAULT_INTERVAL_MS
+        self.flusher: Optional[threading.Timer] = None
+
+_settings = _Settings()
+_pending: set[str] = set()
+_pending_lock = threading.Lock()
+_group_condition = threading.Condition()
+_group_requested: dict[str, int] = {}
+_group_synced: dict[str, int] = {}
+_group_in_flight: set[str] = set()
+
+def set_policy(policy: str, interval_ms: Optional[int] = None) -> None:
+    """
+    Sets the durability policy. Syncs that are still pending under "interval" are flushed first.
+
+    :param policy: "always", "interval" or "never".
+    :param interval_ms: The maximum time between the fsyncs of the "interval" policy, or None for DEFAULT_INTERVAL_MS.
+    :raises ValueError: If the policy or interval is invalid.
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown durability policy: {policy}")
+    if interval_ms is not None and interval_ms <= 0:
+        raise ValueError("interval_ms must be positive")
+    flush_pending()
+    _settings.policy = policy
+    _settings.interval_ms = interval_ms or DEFAULT_INTERVAL_MS
+
+def get_policy() -> tuple[str, int]:
+    """
+    Returns the current durability policy.
+
+    :return: The tuple (policy, interval in milliseconds).
+    """
+    return _settings.policy, _settings.interval_ms
+
+def _fsync_path(path: str) -> None:
+    """
+    Opens a file or directory read-only and fsyncs it. Paths that no longer exist are skipped.
+
+    :param path: The path of the file or directory.
+    """
+    try:
+        descriptor = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+def _group_fsync(path: str) -> None:
+    """
+    Fsyncs a file or directory, sharing the fsync with other threads that request one for the same path.
+
+    The first thread becomes the leader and runs the fsync; threads that arrive while it runs wait and
+    are covered together by the next fsync, so n concurrent requests cost at most two fsyncs.
+
+    :param path: The path of the file or directory.
+    """
+    with _group_condition:
+        ticket = _group_requested.get(path, 0) + 1
+        _group_requested[path] = ticket
+        while _group_synced.get(path, 0) < ticket:
+            if path in _group_in_flight:
+                _group_condition.wait()
+                continue
+            _group_in_flight.add(path)
+            target = _group_requested[path]
+            _group_condition.release()
+            try:
+                _fsync_path(path)
+            finally:
+                _group_condition.acquire()
+                _group_in_flight.discard(path)
+                _group_condition.notify_all()
+            _group_synced[path] = target
+
+def _directory_of(filename: str) -> str:
+    """
+    Returns the directory that holds the entry of a file.
+
+    :param filename: The name of the file.
+    :return: The directory of the file.
+    """
+    return os.path.dirname(os.path.abspath(filename))
+
+def _schedule(path: str) -> None:
+    """
+    Queues a file or directory for the next fsync of the "interval" policy and starts the flusher if it is idle.
+
+    :param path: The path of the file or directory.
+    """
+    with _pending_lock:
+        _pending.add(os.path.abspath(path))
+        if _settings.flusher is None:
+            _settings.flusher = threading.Timer(_settings.interval_ms / 1000, flush_pending)
+            _settings.flusher.daemon = True
+            _settings.flusher.start()
+
+def flush_pending() -> int:
+    """
+    Fsyncs every file and directory that was queued by the "interval" policy, each once.
+
+    :return: The number of paths that were synced.
+    """
+    with _pending_lock:
+        paths = sorted(_pending)
+        _pending.clear()
+        if _settings.flusher is not None:
+            _settings.flusher.cancel()
+            _settings.flusher = None
+    for path in paths:
+        _fsync_path(path)
+    return len(paths)
+
+def sync_before_rename(file: BinaryIO) -> None:
+    """
+    Flushes a written temporary file and, unless the policy is "never", fsyncs it before it is renamed into place.
+    Only the directory fsync after the rename is batched by the "interval" policy.
+
+    :param file: The open temporary file.
+    """
+    file.flush()
+    if _settings.policy != "never":
+        os.fsync(file.fileno())
+
+def sync_after_rename(filename: str) -> None:
+    """
+    Makes a rename into place durable according to the policy: "always" fsyncs the directory,
+    "interval" queues the directory for the next group fsync.
+
+    :param filename: The name the file was renamed to.
+    """
+    if _settings.policy == "always":
+        _group_fsync(_directory_of(filename))
+    elif _settings.policy == "interval":
+        _schedule(_directory_of(filename))
+
+def sync_appended(file: BinaryIO, filename: str) -> None:
+    """
+    Makes data appended to a file (e.g. a journal record) durable according to the policy.
+
+    :param file: The open file the data was appended to.
+    :param filename: The name of the file.
+    """
+    file.flush()
+    if _settings.policy == "always":
+        _group_fsync(os.path.abspath(filename))
+    elif _settings.policy == "interval":
+        _schedule(filename)
+
+def _policy_from_environment() -> None:
+    """
+    Sets the policy from the environment variable PASSWORD_MANAGER_DURABILITY, if it is set.
+    A malformed setting is reported with a warning and the current policy is kept, so a typo cannot keep the program from starting.
+    """
+    setting = os.environ.get("PASSWORD_MANAGER_DURABILITY", "")
+    if setting:
+        policy, _, interval = setting.partition(":")
+        try:
+            set_policy(policy, int(interval) if interval else None)
+        except ValueError as error:
+            warnings.warn(f"Ignoring the malformed PASSWORD_MANAGER_DURABILITY setting: {error}", RuntimeWarning)
+
+_policy_from_environment()
+atexit.register(flush_pending)
@@ -0,0 +1,94 @@
+"""
+This module provides the cold archive of password history hashes.
+
+The history of an entry is cut to get_history_depth() hashes (see source.password_history); the hashes
+that are cut move here, so the vault itself does not grow with every password change while a reused
+password is still recognised. The archive is its own encrypted vault file next to the vault
+({"accounts": {mail: [hash, ...]}}), written through source.vault_storage, so it is only read when a
+reuse check needs it and only written when a history is cut.
+
+The module includes:
+- archive_filename: the archive file that belongs to a vault location.
+- HistoryArchive: adds hashes to the archive and answers whether a hash is archived.
+"""
+import os
+from typing import Optional
+from source.vault_storage import load_vault_versioned, save_vault, update_vault, vault_version, StaleVaultError
+
+ARCHIVE_SUFFIX = ".archive"
+
+def archive_filename(location: str) -> str:
+    """
+    Returns the name of the archive file of a vault.
+
+    :param location: The file or directory of the vault.
+    :return: The name of the archive file, next to the vault.
+    """
+    return os.path.normpath(location) + ARCHIVE_SUFFIX
+
+class HistoryArchive:
+    """
+    The archived history hashes of a vault. Without a file name the archive is kept in memory.
+    The hashes are cached per account and loaded again when another writer changed the archive file.
+    """
+
+    def __init__(self, filename: Optional[str], password: str) -> None:
+        """
+        :param filename: The name of the archive file, or None to keep the archive in memory.
+        :param password: The password of the archive file.
+        """
+        self.filename = filename
+        self.password = password
+        self._hashes: dict[str, set[str]] = {}
+        self._version = 0
+
+    def _load(self) -> dict[str, set[str]]:
+        """
+        Returns the archived hashes by account, reading the archive file if it changed since it was last read.
+
+        :return: The sets of hashes by mail.
+        """
+        if self.filename is None:
+            return self._hashes
+        version = vault_version(self.filename)
+        if version == 0:
+            self._hashes, self._version = {}, 0
+        elif version != self._version:
+            archive, self._version = load_vault_versioned(self.filename, self.password)
+            self._hashes = {mail: set(hashes) for mail, hashes in archive["accounts"].items()}
+        return self._hashes
+
+    def add(self, mail: str, hashes: list[str]) -> None:
+        """
+        Adds history hashes of an account to the archive.
+
+        :param mail: The mail of the account.
+        :param hashes: The hashes.
+        """
+        if not hashes:
+            return
+        if self.filename is None:
+            self._hashes.setdefault(mail, set()).update(hashes)
+            return
+        if not os.path.exists(self.filename):
+            try:
+                save_vault({"accounts": {}}, self.filename, self.password, base_version=0)
+            except StaleVaultError:
+                pass
+
+        def extend(archive: dict) -> None:
+            archived = archive["accounts"].setdefault(mail, [])
+            known = set(archived)
+            archived.extend(item for item in hashes if item not in known)
+
+        update_vault(self.filename, self.password, extend)
+
+    def contains(self, mail: str, hashed: str) -> bool:
+        """
+        Returns whether a history hash of an account is archived.
+
+        :param mail: The mail of the account.
+        :param hashed: The hash.
+        :return: True if the hash is in the archive.
+        """
+        return hashed in self._load().get(mail, ())
@@ -0,0 +1,279 @@
+"""
+This module derives the keys that open a vault from its password.
+
+The module includes functions to:
+- Derive keys with PBKDF2-HMAC-SHA256 or scrypt; the KDF and its parameters are recorded in the file header
+  (see source.data_cryptography) and are upgraded on the next unlock.
+- Calibrate the KDF parameters to a target unlock time on the current host ('python -m source.key_derivation calibrate').
+- Derive keys through a bounded key cache with an idle timeout, so a run of loads and saves costs one key derivation.
+- Keep one salt per password for the session, so saves reuse the cached key.
+- Wipe the key cache.
+
+The default KDF of new files is LEGACY_KDF (PBKDF2-HMAC-SHA256 with KDF_ITERATIONS iterations), or the KDF of the
+environment variable PASSWORD_MANAGER_KDF (JSON, e.g. as printed by the calibrate command), if it is set.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from typing import Any, Optional
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+KDF_ITERATIONS = 100000
+LEGACY_KDF = {"name": "pbkdf2-sha256", "iterations": KDF_ITERATIONS}
+KDF_NAMES = ("pbkdf2-sha256", "scrypt")
+MIN_PBKDF2_ITERATIONS = 50000
+MIN_SCRYPT_COST = 2 ** 14
+MAX_SCRYPT_COST = 2 ** 20
+DEFAULT_UNLOCK_SECONDS = 0.5
+KEY_CACHE_SIZE = 8
+KEY_CACHE_IDLE_TIMEOUT = 300.0
+
+_fingerprint_secret = os.urandom(32)
+_key_cache: "OrderedDict[tuple[bytes, bytes, tuple], list]" = OrderedDict()
+_session_salts: dict[bytes, bytes] = {}
+_key_cache_lock = threading.Lock()
+
+class _Settings: # pylint: disable=too-few-public-methods
+    """
+    The KDF that new vault files are written with.
+    """
+    __slots__ = ("default_kdf",)
+
+    def __init__(self) -> None:
+        self.default_kdf: dict = dict(LEGACY_KDF)
+
+_settings = _Settings()
+
+def password_fingerprint(password: str) -> bytes:
+    """
+    Returns a keyed fingerprint of the password, which identifies it in caches without storing the password itself.
+
+    The fingerprint is keyed with a random per-process secret, so it cannot be looked up in a table of password hashes.
+
+    :param password: The password.
+    :return: The fingerprint (in bytes).
+    """
+    return hmac.new(_fingerprint_secret, password.encode(), hashlib.sha256).digest()
+
+def _evict_idle_keys(now: float) -> None:
+    """
+    Wipes and drops every cached key that has not been used for KEY_CACHE_IDLE_TIMEOUT seconds.
+    The caller must hold the key cache lock.
+
+    :param now: The current time of time.monotonic().
+    """
+    for cache_key in [cache_key for cache_key, entry in _key_cache.items() if now - entry[1] > KEY_CACHE_IDLE_TIMEOUT]:
+        _wipe_entry(_key_cache.pop(cache_key))
+
+def _wipe_entry(entry: list) -> None:
+    """
+    Overwrites the key material of a key cache entry with zeros.
+
+    :param entry: The cache entry [key, last_used].
+    """
+    key = entry[0]
+    key[:] = bytes(len(key))
+
+def validate_kdf(kdf: dict) -> dict:
+    """
+    Checks the parameters of a KDF and fills in the defaults of scrypt (r=8, p=1).
+
+    :param kdf: The KDF parameters, e.g. {"name": "pbkdf2-sha256", "iterations": 600000} or {"name": "scrypt", "n": 32768}.
+    :return: The complete KDF parameters.
+    :raises ValueError: If the KDF is unknown or a parameter is invalid.
+    """
+    name = kdf.get("name")
+    if name == "pbkdf2-sha256":
+        iterations = int(kdf.get("iterations", 0))
+        if iterations < 1:
+            raise ValueError("PBKDF2 needs a positive number of iterations")
+        return {"name": name, "iterations": iterations}
+    if name == "scrypt":
+        cost, block_size, parallelism = int(kdf.get("n", 0)), int(kdf.get("r", 8)), int(kdf.get("p", 1))
+        if cost < 2 or cost & (cost - 1) or block_size < 1 or parallelism < 1:
+            raise ValueError("scrypt needs a power of two n > 1 and positive r and p")
+        return {"name": name, "n": cost, "r": block_size, "p": parallelism}
+    raise ValueError(f"Unknown KDF: {name}")
+
+def get_default_kdf() -> dict:
+    """
+    Returns the KDF that new vault files are written with.
+
+    :return: The KDF parameters.
+    """
+    return dict(_settings.default_kdf)
+
+def set_default_kdf(kdf: dict) -> None:
+    """
+    Sets the KDF that new vault files are written with; vaults with other parameters are upgraded on their next unlock.
+
+    :param kdf: The KDF parameters (see validate_kdf).
+    """
+    _settings.default_kdf = validate_kdf(kdf)
+
+def header_kdf(header: dict) -> dict:
+    """
+    Returns the KDF a vault file was written with.
+
+    :param header: The fields of the file header.
+    :return: The KDF parameters, LEGACY_KDF for files without a "kdf" field.
+    """
+    return validate_kdf(header.get("kdf", LEGACY_KDF))
+
+def _run_kdf(password: str, salt: bytes, kdf: dict) -> bytes:
+    """
+    Derives a 256-bit key without the key cache.
+
+    :param password: The password the key is derived from.
+    :param salt: The salt (in bytes).
+    :param kdf: The complete KDF parameters.
+    :return: The derived key (in bytes).
+    """
+    if kdf["name"] == "scrypt":
+        function: Any = Scrypt(salt=bytes(salt), length=32, n=kdf["n"], r=kdf["r"], p=kdf["p"], backend=default_backend()) # type: ignore
+    else:
+        function = PBKDF2HMAC(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=bytes(salt),
+            iterations=kdf["iterations"],
+            backend=default_backend() # type: ignore
+        )
+    key: bytes = function.derive(password.encode())
+    return key
+
+def derive_key(password: str, salt: bytes, iterations: int = KDF_ITERATIONS, kdf: Optional[dict] = None) -> bytes:
+    """
+    Derives a 256-bit key from the password, reusing a cached key if one exists.
+
+    Without kdf the key is derived with PBKDF2-HMAC-SHA256 and the given number of iterations.
+    The cache is keyed by (password fingerprint, salt, KDF parameters), holds at most KEY_CACHE_SIZE keys
+    and drops keys that were not used for KEY_CACHE_IDLE_TIMEOUT seconds.
+    The caller gets an immutable copy of the key: wiping (eviction or wipe_key_cache) only overwrites the
+    copy held by the cache, while returned copies live until they are garbage collected. The ciphers of
+    the cryptography package keep their own copy of a key anyway, so a shared buffer could not be wiped either.
+
+    :param password: The password the key is derived from.
+    :param salt: The salt (in bytes).
+    :param iterations: The number of PBKDF2 iterations, if no kdf is given.
+    :param kdf: The KDF parameters (see validate_kdf), or None for PBKDF2 with the given iterations.
+    :return: The derived key (in bytes).
+    """
+    kdf = validate_kdf(kdf if kdf is not None else {"name": "pbkdf2-sha256", "iterations": iterations})
+    cache_key = (password_fingerprint(password), bytes(salt), tuple(sorted(kdf.items())))
+    now = time.monotonic()
+    with _key_cache_lock:
+        _evict_idle_keys(now)
+        entry = _key_cache.get(cache_key)
+        if entry is not None:
+            entry[1] = now
+            _key_cache.move_to_end(cache_key)
+            return bytes(entry[0])
+    key = _run_kdf(password, salt, kdf)
+    with _key_cache_lock:
+        _key_cache[cache_key] = [bytearray(key), now]
+        _key_cache.move_to_end(cache_key)
+        while len(_key_cache) > KEY_CACHE_SIZE:
+            _wipe_entry(_key_cache.popitem(last=False)[1])
+    return key
+
+def calibrate_kdf(name: str = "pbkdf2-sha256", target_seconds: float = DEFAULT_UNLOCK_SECONDS) -> dict:
+    """
+    Picks the KDF parameters whose derivation takes about target_seconds on the current host.
+
+    One probe derivation is timed and scaled: PBKDF2 iterations linearly (rounded down to thousands,
+    at least MIN_PBKDF2_ITERATIONS), the scrypt cost n to the largest power of two that stays within
+    the target (between MIN_SCRYPT_COST and MAX_SCRYPT_COST, with r=8 and p=1).
+
+    :param name: The KDF to calibrate, "pbkdf2-sha256" or "scrypt".
+    :param target_seconds: The unlock time to aim for.
+    :return: The KDF parameters.
+    :raises ValueError: If the KDF is unknown.
+    """
+    salt = os.urandom(16)
+    if name == "pbkdf2-sha256":
+        probe_iterations = 20000
+        start = time.perf_counter()
+        _run_kdf("calibration", salt, {"name": name, "iterations": probe_iterations})
+        seconds_per_iteration = (time.perf_counter() - start) / probe_iterations
+        iterations = int(target_seconds / seconds_per_iteration) // 1000 * 1000
+        return {"name": name, "iterations": max(iterations, MIN_PBKDF2_ITERATIONS)}
+    if name == "scrypt":
+        start = time.perf_counter()
+        _run_kdf("calibration", salt, {"name": name, "n": MIN_SCRYPT_COST, "r": 8, "p": 1})
+        elapsed = time.perf_counter() - start
+        cost = MIN_SCRYPT_COST
+        while cost < MAX_SCRYPT_COST and elapsed * 2 <= target_seconds:
+            cost *= 2
+            elapsed *= 2
+        return {"name": name, "n": cost, "r": 8, "p": 1}
+    raise ValueError(f"Unknown KDF: {name}")
+
+def get_session_salt(password: str) -> bytes:
+    """
+    Returns the salt this session uses for the password, drawing a new random salt the first time.
+
+    Saves that keep the session salt reuse the cached key, while every save still draws a fresh IV.
+
+    :param password: The password.
+    :return: The salt (in bytes).
+    """
+    with _key_cache_lock:
+        return _session_salts.setdefault(password_fingerprint(password), os.urandom(16))
+
+def set_session_salt(password: str, salt: bytes) -> None:
+    """
+    Sets the salt this session uses for the password, e.g. the salt of the vault file that was just loaded.
+
+    :param password: The password.
+    :param salt: The salt (in bytes).
+    """
+    with _key_cache_lock:
+        _session_salts[password_fingerprint(password)] = bytes(salt)
+
+def wipe_key_cache() -> None:
+    """
+    Overwrites and drops every cached key and forgets the session salts, so the next load or save derives its key again.
+    Only the keys held by the cache are overwritten, not the copies that derive_key has returned.
+    """
+    with _key_cache_lock:
+        for entry in _key_cache.values():
+            _wipe_entry(entry)
+        _key_cache.clear()
+        _session_salts.clear()
+
+def _default_kdf_from_environment() -> None:
+    """
+    Sets the default KDF from the environment variable PASSWORD_MANAGER_KDF (JSON, e.g. as printed by the calibrate command), if it is set.
+    A malformed setting is reported with a warning and the default KDF is kept, so a typo cannot keep the program from starting.
+    """
+    setting = os.environ.get("PASSWORD_MANAGER_KDF", "")
+    if setting:
+        try:
+            set_default_kdf(json.loads(setting))
+        except (ValueError, TypeError, AttributeError) as error:
+            warnings.warn(f"Ignoring the malformed PASSWORD_MANAGER_KDF setting: {error}", RuntimeWarning)
+
+_default_kdf_from_environment()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Key derivation tools.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    calibrate = commands.add_parser("calibrate", help="pick KDF parameters for a target unlock time on this host")
+    calibrate.add_argument("--kdf", choices=KDF_NAMES, default="pbkdf2-sha256", help="the KDF to calibrate")
+    calibrate.add_argument("--target", type=float, default=DEFAULT_UNLOCK_SECONDS, help="the target unlock time in seconds")
+    arguments = parser.parse_args()
+    parameters = calibrate_kdf(arguments.kdf, arguments.target)
+    start_time = time.perf_counter()
+    _run_kdf("calibration", os.urandom(16), parameters)
+    print(f"{json.dumps(parameters)} ({time.perf_counter() - start_time:.3f} s)")
+    print(f"export PASSWORD_MANAGER_KDF='{json.dumps(parameters)}'")
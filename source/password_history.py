@@ -0,0 +1,121 @@
+"""
+This module keeps the password history of the vault entries as salted hashes.
+
+An entry of schema 4 (see source.vault_schema) keeps the passwords it had before its current one in
+"history": a list of HMAC-SHA256 hashes under the "history-salt" of its account, oldest first, with at
+most get_history_depth() items. Hashing a candidate password once with the account salt is enough to
+check it against every history of the account, and no earlier password is stored in plaintext.
+Hashes that are pushed out of an entry's history move to the cold archive of the vault store
+(source.history_archive), so "was this password ever used" keeps its answer.
+
+The default depth is DEFAULT_HISTORY_DEPTH; it can be set with set_history_depth or with the environment
+variable PASSWORD_MANAGER_HISTORY_DEPTH.
+
+The module includes functions to:
+- Get and set the history depth.
+- Create or derive the history salt of an account and hash a password with it.
+- Push a password hash into a history and return the hashes that no longer fit.
+"""
+import base64
+import hashlib
+import hmac
+import os
+from typing import Optional
+
+DEFAULT_HISTORY_DEPTH = 10
+HISTORY_SALT_BYTES = 16
+HISTORY_HASH_CHARS = 32
+
+def _depth_from_environment() -> int:
+    """
+    Reads the history depth from PASSWORD_MANAGER_HISTORY_DEPTH.
+
+    :return: The history depth, DEFAULT_HISTORY_DEPTH if the variable is unset or invalid.
+    """
+    try:
+        depth = int(os.environ.get("PASSWORD_MANAGER_HISTORY_DEPTH", DEFAULT_HISTORY_DEPTH))
+    except ValueError:
+        return DEFAULT_HISTORY_DEPTH
+    return depth if depth >= 1 else DEFAULT_HISTORY_DEPTH
+
+class _Settings: # pylint: disable=too-few-public-methods
+    """
+    The history depth, read from the environment when the module is imported.
+    """
+    __slots__ = ("history_depth",)
+
+    def __init__(self) -> None:
+        self.history_depth = _depth_from_environment()
+
+_settings = _Settings()
+
+def get_history_depth() -> int:
+    """
+    Returns the maximum number of earlier passwords kept in the history of an entry.
+
+    :return: The history depth.
+    """
+    return _settings.history_depth
+
+def set_history_depth(depth: int) -> None:
+    """
+    Sets the maximum number of earlier passwords kept in the history of an entry.
+
+    :param depth: The history depth.
+    :raises ValueError: If the depth is smaller than 1.
+    """
+    if depth < 1:
+        raise ValueError("The history depth must be at least 1")
+    _settings.history_depth = depth
+
+def new_history_salt() -> str:
+    """
+    Creates a random history salt for a new account.
+
+    :return: The salt, Base64-encoded.
+    """
+    return base64.b64encode(os.urandom(HISTORY_SALT_BYTES)).decode('ascii')
+
+def derived_history_salt(account: dict) -> str:
+    """
+    Derives the history salt of an account that was created before history salts existed. The salt
+    depends on the mail and the master password hash, so every load of the account derives the same one.
+
+    :param account: The account dictionary.
+    :return: The salt, Base64-encoded.
+    """
+    material = f"history-salt\0{account.get('mail', '')}\0{account.get('master-password', '')}".encode('utf-8')
+    return base64.b64encode(hashlib.sha256(material).digest()[:HISTORY_SALT_BYTES]).decode('ascii')
+
+def account_salt(account: dict) -> bytes:
+    """
+    Returns the history salt of an account.
+
+    :param account: The account dictionary.
+    :return: The salt.
+    """
+    return base64.b64decode(account.get("history-salt") or derived_history_salt(account))
+
+def hash_history_password(salt: bytes, password: Optional[str]) -> str:
+    """
+    Hashes a password for the history of an account.
+
+    :param salt: The history salt of the account.
+    :param password: The password.
+    :return: The hash as hexadecimal string.
+    """
+    return hmac.new(salt, (password or "").encode('utf-8'), hashlib.sha256).hexdigest()[:HISTORY_HASH_CHARS]
+
+def push_history(history: list[str], hashed: str, depth: int) -> tuple[list[str], list[str]]:
+    """
+    Appends a password hash to a history (moving it to the end if it is already there) and cuts the
+    history to the given depth.
+
+    :param history: The history, oldest hash first; it is not changed.
+    :param hashed: The hash of the password that is replaced.
+    :param depth: The maximum number of hashes to keep.
+    :return: The tuple (new history, hashes that no longer fit, oldest first).
+    """
+    history = [item for item in history if item != hashed] + [hashed]
+    cut = max(len(history) - depth, 0)
+    return history[cut:], history[:cut]
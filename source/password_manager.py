@@ -4,34 +4,42 @@ This module provides following functions:
  - safe the new password data
  - show a specific password
  - delete a specific password
+ - find_entries: Finds the password entries of an account by the beginning of their name.
  - hash a password
  - start_screen: Displays the initial start screen with options to sign in, register, or exit the application.
  - choice_function: Handles user navigation through menu options and selection based on keypresses.
  - register: Facilitates user registration by collecting and validating email and password inputs, and saving the new account to a JSON file.
  - sign_in: Manages the sign-in process by verifying the provided email and master password against stored data.
- - create_accounts_file: Ensures the 'data.json' file exists or creates it if missing.
+ - create_accounts_file: Ensures the vault ('data.json' by default) exists or creates it if missing.
  - change_data: Allows users to update account details via terminal input.
+ - is_password_reused: Checks whether a new password was used for an entry before, including the archived history.
  - safe_changed_data: Saves updated account data to the JSON file.
  - safe_register_data: Registers a new account and stores it in the JSON file.
  - read_data_json: returns the data from the JSON file.
 """
-import os
 import sys
 import curses
 import json
 import hashlib
-import datetime
-from typing import Any
+import time
+from typing import Any, Optional
 from source.validation import is_password_correct, is_mail_correct
 from source.password_generation import generate_password
-from source.data_cryptography import load_encrypted_dict_from_file, save_encrypted_dict_to_file
+from source.vault_store import get_store
+from source.vault_model import PasswordEntry
+from source.vault_schema import format_timestamp
+from source.password_history import account_salt, get_history_depth, hash_history_password, new_history_salt, push_history
+
+MAX_SUGGESTIONS = 5
 
 def password_manager(stdscr: curses.window, height: int, width: int, mail: str) -> None:
     """
     Manages the display and selection of password entries for a specific account.
 
     Shows a list of existing passwords and provides options to view details of a selected
-    password or to add a new password entry.
+    password or to add a new password entry. A password is selected by its name or by the
+    beginning of it (see find_entries); if the input does not match exactly one entry, the
+    matching names are suggested and the input is asked again. An empty input shows the list again.
 
     Args:
         stdscr: The curses window object used for displaying and capturing user input.
@@ -47,9 +55,7 @@ def password_manager(stdscr: curses.window, height: int, width: int, mail: str)
     x = width // 2
     ky = 0
     go = True
-    data = read_data_json()
-    passwords_list = data["accounts"][mail]["passwords-list"]
-    passwords_list_sorted = sorted(passwords_list)
+    passwords_list_sorted = sorted(get_store().list_names(mail))
     pair_number = [1, 2, 2]
     text1 = "Passwörter:"
     text2 = "neues Passwort hinzufügen"
@@ -59,7 +65,7 @@ def password_manager(stdscr: curses.window, height: int, width: int, mail: str)
     a = -4
     x_new = 5
     for passwords in passwords_list_sorted:
-        stdscr.addstr(y + a, x_new, data["accounts"][mail]["passwords"][passwords]["name"], curses.color_pair(2) | curses.A_BOLD)
+        stdscr.addstr(y + a, x_new, passwords, curses.color_pair(2) | curses.A_BOLD)
         a += 2
         if a == 12:
             x_new = 40
@@ -76,15 +82,24 @@ def password_manager(stdscr: curses.window, height: int, width: int, mail: str)
     if ky == 0:
         is_password = False
         input_y, input_x = y - 8, x - 8
-        stdscr.move(input_y, input_x)
-        curses.curs_set(1)
-        data_to_be_shown = input_function(stdscr, input_y, input_x, is_password)
-        curses.curs_set(0)
-        try:
-            go = False
-            show_password(stdscr, data, mail, data_to_be_shown, y, x, height, width)
-        except KeyError:
-            password_manager(stdscr, height, width, mail)
+        matches: list[str] = []
+        while len(matches) != 1:
+            stdscr.move(input_y, input_x)
+            curses.curs_set(1)
+            data_to_be_shown = input_function(stdscr, input_y, input_x, is_password)
+            curses.curs_set(0)
+            if not data_to_be_shown:
+                password_manager(stdscr, height, width, mail)
+                return
+            matches = find_entries(mail, data_to_be_shown, MAX_SUGGESTIONS + 1)
+            stdscr.addstr(y - 7, input_x, " " * (width - input_x - 1))
+            if not matches:
+                stdscr.addstr(y - 7, input_x, "Kein Eintrag gefunden", curses.color_pair(3))
+            elif len(matches) > 1:
+                suggestions = ", ".join(matches[:MAX_SUGGESTIONS]) + (", ..." if len(matches) > MAX_SUGGESTIONS else "")
+                stdscr.addstr(y - 7, input_x, f"Meinten Sie: {suggestions}"[:width - input_x - 1], curses.color_pair(3))
+            stdscr.refresh()
+        show_password(stdscr, mail, matches[0], y, x, height, width)
     elif ky == 2:
         sys.exit(0)
     else:
@@ -198,7 +213,8 @@ def sign_in(stdscr: curses.window, height: int, width: int) -> str:
     Handles the user sign-in process by verifying email and master password.
 
     Displays prompts for email and master password, and validates the credentials
-    against the stored data. Provides feedback on incorrect credentials and navigates 
+    against the stored data, which is read when both have been entered so that accounts
+    registered in the meantime are found. Provides feedback on incorrect credentials and navigates 
     to the start screen if the user chooses to go back.
 
     Args:
@@ -210,7 +226,6 @@ def sign_in(stdscr: curses.window, height: int, width: int) -> str:
         str: The email address if sign-in is successful, or the original email input.
     """
     stdscr.clear()
-    data = read_data_json()
     text1 = "Anmelden:"
     text2 = "E-Mail-Adresse:"
     text3 = "Master-Passwort:"
@@ -220,7 +235,6 @@ def sign_in(stdscr: curses.window, height: int, width: int) -> str:
     pair_number = [1, 2, 2]
     go, go2 = True, True
     ky = 0
-    mail_correct, password_correct = False, False
     stdscr.addstr(y - 8, x - len(text1), text1, curses.color_pair(2) | curses.A_BOLD)
     #exit_text(stdscr, height, width)
     stdscr.refresh()
@@ -228,6 +242,7 @@ def sign_in(stdscr: curses.window, height: int, width: int) -> str:
     input_x = 0
     input_y = 0
     password_available, mail_available = False, False
+    mail, password = "", ""
     while go2:
         while go:
             stdscr.addstr(y - 4, x - len(text2) - 8, text2, curses.color_pair(pair_number[0]) | curses.A_BOLD)
@@ -254,14 +269,12 @@ def sign_in(stdscr: curses.window, height: int, width: int) -> str:
             if ky == 0:
                 mail = user_input
                 mail_available = True
-                mail_correct = mail in data["accounts"]["accounts-list"]
             if ky == 1:
                 password = user_input
                 password_available = True
-                hashed_password = hash_password(password)
-                password_correct = hashed_password == data['accounts'][mail]['master-password']
             if mail_available and password_available:
-                if mail_correct and password_correct:
+                accounts = read_data_json()["accounts"]
+                if mail in accounts and hash_password(password) == accounts[mail]['master-password']:
                     go2 = False
                     return mail
                 else:
@@ -450,22 +463,9 @@ def add_new_password(stdscr: curses.window, mail: str, height: int, width: int,
             password_manager(stdscr, height, width, mail)
         elif ky == 4 and name_available and password_available:
             go2 = False
-            time_of_access = datetime.datetime.now()
-            time_of_access_format = time_of_access.strftime("%d.%m.%Y %H:%M")
-            new_data: dict[str, dict[str, Any]] = {}
-            new_data = {
-                name: {
-                    "name": name,
-                    "password": password,
-                    "url": url,
-                    "text": notes,
-                    "oldpasswordlist": [],
-                    "dateoffirstaccess": time_of_access_format,
-                    "dateoflastchange": time_of_access_format
-                }
-            }
-            new_data[name]["oldpasswordlist"].append(password)
-            safe_new_password_data(new_data, mail, name)
+            time_of_access = int(time.time())
+            entry = PasswordEntry(name, password, url, notes, dateoffirstaccess=time_of_access, dateoflastchange=time_of_access)
+            safe_new_password_data({name: entry.to_dict()}, mail, name)
             password_manager(stdscr, height, width, mail)
         elif ky == 5 and (not name_available or not password_available):
             go = True
@@ -509,7 +509,9 @@ def add_new_password(stdscr: curses.window, mail: str, height: int, width: int,
 
 def safe_new_password_data(new_data: dict, mail: str, name: str) -> None:
     """
-    Adds a new password entry to the account data and updates 'data.json'.
+    Adds a new password entry to the account data through the configured vault store
+    (by default appended to the journal of 'data.json'). The entry is stored as given,
+    including its dates of first access and last change.
 
     Args:
         new_data (dict): The new password entry data to be added.
@@ -519,22 +521,35 @@ def safe_new_password_data(new_data: dict, mail: str, name: str) -> None:
     Returns:
         None
     """
-    data = load_encrypted_dict_from_file("./data.json", "oTclmO]dh}[QyM'i")
-    data["accounts"][mail]["passwords-list"].append(name)
-    data["accounts"][mail]["passwords"].update(new_data)
-    date_of_first_access = datetime.datetime.now()
-    date_of_first_access_format = date_of_first_access.strftime("%d.%m.%Y %H:%M")
-    date_of_first_access_format_to_dic = { "dateoffirstaccess": date_of_first_access_format }
-    date_of_last_change_format_to_dic = { "dateoflastchange": date_of_first_access_format }
-    data["accounts"][mail]["passwords"][name].update(date_of_first_access_format_to_dic)
-    data["accounts"][mail]["passwords"][name].update(date_of_last_change_format_to_dic)
-    save_encrypted_dict_to_file(data, "./data.json", "oTclmO]dh}[QyM'i")
+    get_store().apply({"op": "add_entry", "mail": mail, "name": name, "entry": new_data[name]})
+
+def find_entries(mail: str, query: str, limit: Optional[int] = None) -> list:
+    """
+    Finds the password entries of an account by their name or the beginning of it, ignoring case.
+
+    Uses the prefix index of the configured vault store (see source.vault_index.PrefixIndex), which
+    is built once per vault load, so the vault is not read or scanned again for every lookup. The exact
+    name is looked up before the prefix search, so it is found even if the limit cuts it from the matches.
+
+    Args:
+        mail (str): The email associated with the account.
+        query (str): The name or the beginning of the name of the entry.
+        limit (int): The maximum number of names, or None for all of them.
+
+    Returns:
+        list: The matching names in case-insensitive order, or only the query if it is the exact name of an entry.
+    """
+    index = get_store().prefix_index()
+    if index.contains(mail, query):
+        return [query]
+    return index.names_with_prefix(mail, query, limit)
 
 def delete_password(mail: str, data_to_be_shown: str) -> None:
     """
     Deletes a specified password entry from the JSON data file.
     
-    Removes the password entry and its name from the account's password list in 'data.json'.
+    Removes the password entry and its name from the account's password list through the
+    configured vault store (by default appended to the journal of 'data.json').
     
     Args:
         mail (str): The email associated with the account.
@@ -543,19 +558,18 @@ def delete_password(mail: str, data_to_be_shown: str) -> None:
     Returns:
         None
     """
-    data = load_encrypted_dict_from_file("./data.json", "oTclmO]dh}[QyM'i")
-    del data["accounts"][mail]["passwords"][data_to_be_shown]
-    data["accounts"][mail]["passwords-list"].remove(data_to_be_shown)
-    save_encrypted_dict_to_file(data, "./data.json", "oTclmO]dh}[QyM'i")
+    get_store().apply({"op": "delete_entry", "mail": mail, "name": data_to_be_shown})
 
-def show_password(stdscr: curses.window, data: dict, mail: str, data_to_be_shown: str, y: int, x: int, height: int, width: int) -> None:
+def show_password(stdscr: curses.window, mail: str, data_to_be_shown: str, y: int, x: int, height: int, width: int) -> None:
     """
     Displays detailed information about a specific password entry and provides options
     to show the password, copy it, modify it, or delete it.
 
+    The entry is read from the configured vault store (see VaultStore.get_entry), so it is current
+    and, with the envelope backend, only this entry is decrypted.
+
     Args:
         stdscr: The curses window object used for displaying information and capturing user input.
-        data (dict): The account data loaded from the JSON file.
         mail (str): The email associated with the account.
         data_to_be_shown (str): The name of the password entry to display.
         y (int): The vertical position in the terminal to start displaying information.
@@ -570,17 +584,12 @@ def show_password(stdscr: curses.window, data: dict, mail: str, data_to_be_shown
     pair_number = [1, 2, 2, 2]
     go, go2 = True, True
     ky = 0
-    name = data['accounts'][mail]['passwords'][data_to_be_shown]['name']
-    url = data['accounts'][mail]['passwords'][data_to_be_shown]['url']
-    notes = data['accounts'][mail]['passwords'][data_to_be_shown]['text']
-    password = data["accounts"][mail]["passwords"][data_to_be_shown]["password"]
-    date_of_first_access = data['accounts'][mail]['passwords'][data_to_be_shown]['dateoffirstaccess']
-    date_of_last_change = data['accounts'][mail]['passwords'][data_to_be_shown]['dateoflastchange']
-    stdscr.addstr(y - 10, x - 30, f"Erstellt: {date_of_first_access}", curses.color_pair(4))
-    stdscr.addstr(y - 10, x, f"Letzte Änderung: {date_of_last_change}", curses.color_pair(4))
-    stdscr.addstr(y - 8, x - 10, f"Name: {name}", curses.color_pair(2) | curses.A_BOLD)
-    stdscr.addstr(y - 2, x - 10, f"Link: {url}", curses.color_pair(2) | curses.A_BOLD)
-    stdscr.addstr(y, x - 10, f"Notiz: {notes}", curses.color_pair(2) | curses.A_BOLD)
+    entry = PasswordEntry.from_dict(get_store().get_entry(mail, data_to_be_shown))
+    stdscr.addstr(y - 10, x - 30, f"Erstellt: {format_timestamp(entry.dateoffirstaccess)}", curses.color_pair(4))
+    stdscr.addstr(y - 10, x, f"Letzte Änderung: {format_timestamp(entry.dateoflastchange)}", curses.color_pair(4))
+    stdscr.addstr(y - 8, x - 10, f"Name: {entry.name}", curses.color_pair(2) | curses.A_BOLD)
+    stdscr.addstr(y - 2, x - 10, f"Link: {entry.url}", curses.color_pair(2) | curses.A_BOLD)
+    stdscr.addstr(y, x - 10, f"Notiz: {entry.text}", curses.color_pair(2) | curses.A_BOLD)
     stdscr.refresh()
     while go2:
         while go:
@@ -590,11 +599,11 @@ def show_password(stdscr: curses.window, data: dict, mail: str, data_to_be_shown
             stdscr.addstr(y + 8, x - 10, "Zurück", curses.color_pair(pair_number[3]) | curses.A_BOLD)
             ky, pair_number, go = choice_function(stdscr, ky, pair_number, go)
         if ky == 0:
-            stdscr.addstr(y - 6, x - 10 + len("Passwort anzeigen") + 2, password)
+            stdscr.addstr(y - 6, x - 10 + len("Passwort anzeigen") + 2, entry.password)
             stdscr.refresh()
         elif ky == 1:
             go2 = False
-            change_data(stdscr, height, width, mail, name, url, notes, password, data_to_be_shown, data)
+            change_data(stdscr, height, width, mail, entry, data_to_be_shown)
         elif ky == 2:
             go2 = False
             delete_password(mail, data_to_be_shown)
@@ -616,25 +625,17 @@ def hash_password(password: str) -> str:
 
 def create_accounts_file() -> None:
     """
-    Checks if 'data.json' exists in the current directory.
-    If not, it creates the file with an initial empty accounts structure.
+    Checks if the vault (by default 'data.json') exists.
+    If not, it creates the vault with an initial empty accounts structure.
     """
-    if os.path.exists('./data.json'):
-        pass
-    else:
-        data: dict
-        data = {
-            "accounts": {
-                "accounts-list": [],
-            }
-        }
-        save_encrypted_dict_to_file(data, "./data.json", "oTclmO]dh}[QyM'i")
+    get_store().create()
 
-def change_data(stdscr: curses.window, height: int, width: int, mail: str, name: str, url: str, notes: str, password: str, data_to_be_shown: str, data: dict) -> None:
+def change_data(stdscr: curses.window, height: int, width: int, mail: str, entry: PasswordEntry, data_to_be_shown: str) -> None:
     """
     Manages the process of updating account details via user input in a terminal interface.
     
     Allows the user to change the name, URL, notes, and password of a specified account entry.
+    A new password is refused if it was used for the entry before (see is_password_reused).
     Updates the displayed information and handles saving or discarding changes based on user choices.
     
     Args:
@@ -642,12 +643,8 @@ def change_data(stdscr: curses.window, height: int, width: int, mail: str, name:
         height (int): The height of the terminal window.
         width (int): The width of the terminal window.
         mail (str): The email associated with the account.
-        name (str): The current name of the password entry.
-        url (str): The current URL associated with the entry.
-        notes (str): The current notes for the entry.
-        password (str): The current password for the entry.
+        entry (PasswordEntry): The password entry as it is stored, with its name, URL, notes, password and history.
         data_to_be_shown: Data to be displayed to the user.
-        data (dict): The account data loaded from the JSON file.
 
     Return:
         None
@@ -655,6 +652,7 @@ def change_data(stdscr: curses.window, height: int, width: int, mail: str, name:
     stdscr.clear()
     x = width //2
     y = height //2
+    name, url, notes, password = entry.name, entry.url, entry.text, entry.password
     text1 = "Einträge ändern:"
     go, go2 = True, True
     ky = 0
@@ -679,11 +677,11 @@ def change_data(stdscr: curses.window, height: int, width: int, mail: str, name:
             ky, pair_number, go = choice_function(stdscr, ky, pair_number, go)
         if ky == 5:
             go2 = False
-            show_password(stdscr, data, mail, data_to_be_shown, y, x, height, width)
+            show_password(stdscr, mail, data_to_be_shown, y, x, height, width)
         elif ky == 4:
             go2 = False
-            data = safe_changed_data(mail, name, url, notes, password, old_name, is_name_changed)
-            show_password(stdscr, data, mail, data_to_be_shown, y, x, height, width)
+            safe_changed_data(mail, name, url, notes, password, old_name, is_name_changed)
+            show_password(stdscr, mail, name, y, x, height, width)
         else:
             go = True
             is_password = True
@@ -723,7 +721,7 @@ def change_data(stdscr: curses.window, height: int, width: int, mail: str, name:
                     notes = new_notes
             elif ky == 3:
                 new_password = user_input
-                if new_password in data["accounts"][mail]["passwords"][name]["oldpasswordlist"]:
+                if is_password_reused(mail, entry, new_password):
                     stdscr.addstr(y + 8, x - 30, "Passwort schon mal verwendet", curses.color_pair(3))
                     stdscr.refresh()
                 elif is_password_correct(new_password):
@@ -733,20 +731,43 @@ def change_data(stdscr: curses.window, height: int, width: int, mail: str, name:
                     stdscr.refresh()
     stdscr.getch()
 
+def is_password_reused(mail: str, entry: PasswordEntry, password: str) -> bool:
+    """
+    Checks whether a password was used for an entry before: it is the current password or in the
+    history of the entry, or it was cut from a history of the account into the archive of the
+    configured vault store (see source.history_archive), which does not record the entry.
+
+    Args:
+        mail (str): The email associated with the account.
+        entry (PasswordEntry): The password entry as it is stored.
+        password (str): The new password.
+
+    Returns:
+        bool: True if the password must not be used again.
+    """
+    store = get_store()
+    salt = store.history_salt(mail)
+    return entry.has_used_password(password, salt) or store.archive.contains(mail, hash_history_password(salt, password))
+
 def is_mail_uniq(mail):
-    data = load_encrypted_dict_from_file("./data.json", "oTclmO]dh}[QyM'i")
-    mail_list = data["accounts"]["accounts-list"]
-    if mail in mail_list:
+    data = get_store().load()
+    if mail in data["accounts"]:
         return False
     else:
         return True
 
 def safe_changed_data(mail: str, name: str, url: str, notes: str, password: str, old_name: str, is_name_changed: bool) -> Any:
     """
-    Updates account data in 'data.json' with new information for a given password entry.
+    Updates account data in the configured vault store ('data.json' by default) with new information
+    for a given password entry. If another process changed the vault in the
+    meantime, the change is built again from the current data.
     
     If the name of the entry has changed, updates the entry with a new name and transfers
     old password history. If the name hasn't changed, only updates the URL, notes, and password.
+    A replaced password goes into the hashed history of the entry (see source.password_history);
+    hashes beyond the history depth move to the archive of the store. The archive is written before the change
+    is committed, so a crash in between leaves the hashes in both places rather than in neither; adding a hash
+    to the archive is idempotent, so a change that is built again does not archive anything twice.
     Also updates the date of the last change.
     
     Args:
@@ -761,52 +782,39 @@ def safe_changed_data(mail: str, name: str, url: str, notes: str, password: str,
     Returns:
         dict: The updated data structure from 'data.json'.
     """
-    data = load_encrypted_dict_from_file("./data.json", "oTclmO]dh}[QyM'i")
-    if is_name_changed:
-        old_password_list = data["accounts"][mail]["passwords"][old_name]["oldpasswordlist"]
-        data["accounts"][mail]["passwords-list"].remove(old_name)
-        data["accounts"][mail]["passwords-list"].append(name)
-        date_of_first_access = data["accounts"][mail]["passwords"][old_name]["dateoffirstaccess"]
-        new_name: dict[str, dict[str, Any]] = {}
-        new_name = {
-            name: {
-                "name": name,
-                "password": password,
-                "url": url,
-                "text": notes,
-                "oldpasswordlist": [],
-                "dateoffirstaccess": date_of_first_access
-                }
-            }
-        for password_in_old_password_list in old_password_list:
-            new_name[name]["oldpasswordlist"].append(password_in_old_password_list)
-        if password not in old_password_list:
-            new_name[name]["oldpasswordlist"].append(password)
-        del data["accounts"][mail]["passwords"][old_name]
-        data["accounts"][mail]["passwords"].update(new_name)
-    else:
-        old_password_list = data["accounts"][mail]["passwords"][name]["oldpasswordlist"]
-        new_url = { "url": url }
-        new_notes = { "text": notes }
-        new_password = { "password": password }
-        data["accounts"][mail]["passwords"][name].update(new_url)
-        data["accounts"][mail]["passwords"][name].update(new_notes)
-        data["accounts"][mail]["passwords"][name].update(new_password)
-        if password not in old_password_list:
-            data["accounts"][mail]["passwords"][name]["oldpasswordlist"].append(password)
-    new_date_of_last_change = datetime.datetime.now()
-    new_date_of_last_change_format = new_date_of_last_change.strftime("%d.%m.%Y %H:%M")
-    new_date_of_last_change_format_to_dic = { "dateoflastchange": new_date_of_last_change_format }
-    data["accounts"][mail]["passwords"][name].update(new_date_of_last_change_format_to_dic)
-    save_encrypted_dict_to_file(data, "./data.json", "oTclmO]dh}[QyM'i")
-    return data
+    if not is_name_changed:
+        old_name = name
+    store = get_store()
+
+    def build_record(data: dict) -> dict:
+        account = data["accounts"][mail]
+        entry = dict(account["passwords"][old_name])
+        history = list(entry.get("history", []))
+        if password != entry.get("password"):
+            salt = account_salt(account)
+            new_hash = hash_history_password(salt, password)
+            history = [item for item in history if item != new_hash]
+            history, cut = push_history(history, hash_history_password(salt, entry.get("password")), get_history_depth())
+            store.archive_history(mail, cut)
+        new_date_of_last_change = int(time.time())
+        entry.update({
+            "name": name,
+            "password": password,
+            "url": url,
+            "text": notes,
+            "history": history,
+            "dateoflastchange": new_date_of_last_change
+        })
+        return {"op": "change_entry", "mail": mail, "old_name": old_name, "name": name, "entry": entry}
+
+    return store.update(build_record)
 
 def safe_register_data(mail: str, password: str) -> None:
     """
     Registers a new account by adding it to the JSON data file.
 
-    Hashes the provided password, creates a new account entry, and updates
-    the 'data.json' file with this new account information.
+    Hashes the provided password, creates a new account entry, and stores it through
+    the configured vault store (by default appended to the journal of 'data.json').
 
     Args:
         mail (str): The email address associated with the new account.
@@ -817,28 +825,24 @@ def safe_register_data(mail: str, password: str) -> None:
     """
     hashed_password = hash_password(password)
     new_data = {
-        mail: {
-            "mail": mail,
-            "master-password": hashed_password,
-            "passwords-list": [],
-            "passwords": { 
-            }
+        "mail": mail,
+        "master-password": hashed_password,
+        "history-salt": new_history_salt(),
+        "passwords": { 
         }
     }
-    data = load_encrypted_dict_from_file("./data.json", "oTclmO]dh}[QyM'i")
-    data["accounts"].update(new_data)
-    data["accounts"]["accounts-list"].append(mail)
-    save_encrypted_dict_to_file(data, "./data.json", "oTclmO]dh}[QyM'i")
+    get_store().apply({"op": "register_account", "mail": mail, "account": new_data})
 
 def read_data_json() -> Any:
     """
     Reads and returns the data from the JSON file.
 
-    Opens the 'data.json' file, loads its contents into a Python dictionary, 
-    and returns the dictionary.
+    Loads the vault from the configured vault store (see source.vault_store). The default
+    store reads 'data.json' through the vault cache, so the file is only decrypted again
+    if it changed since the last load.
 
     Returns:
         dict: The data loaded from 'data.json'.
     """
-    data = load_encrypted_dict_from_file("./data.json", "oTclmO]dh}[QyM'i")
+    data = get_store().load()
     return data
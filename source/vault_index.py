@@ -0,0 +1,368 @@
+"""
+This module provides in-memory indexes over a decoded vault (schema 4, see source.vault_schema).
+
+An index is built once from a loaded vault and then kept up to date with the same mutation records
+that change the vault (see source.vault_journal.apply_record), so queries do not scan every entry.
+
+The module includes:
+- LastChangeIndex: the entries ordered by the date of their last change, for "recently changed" and
+  "not changed for N days" queries.
+- HistoryIndex: the current passwords and history hashes of every account, for "was this password
+  ever used in this account" checks.
+- PrefixIndex: the entry names of every account in case-insensitive order, for lookups by partial name.
+"""
+import bisect
+import time
+from collections import Counter
+from typing import Optional
+from source.password_history import account_salt, hash_history_password
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+def _discard(counter: Counter, key: object) -> None:
+    """
+    Decrements the count of a key and drops the key at zero, in O(1).
+
+    :param counter: The counter.
+    :param key: The key.
+    """
+    count = counter[key] - 1
+    if count > 0:
+        counter[key] = count
+    else:
+        counter.pop(key, None)
+
+class LastChangeIndex:
+    """
+    Keeps the (date of last change, mail, name) of every entry in a sorted list. Looking up a range
+    of dates is a binary search plus the matching entries; adding, changing or deleting an entry moves
+    one item of the list. Entries without an integer date of last change are not indexed.
+    """
+
+    def __init__(self) -> None:
+        self._order: list[tuple[int, str, str]] = []
+        self._changed: dict[tuple[str, str], int] = {}
+
+    @classmethod
+    def from_vault(cls, data: dict) -> "LastChangeIndex":
+        """
+        Builds the index of a decoded vault.
+
+        :param data: The vault dictionary.
+        :return: The index.
+        """
+        index = cls()
+        for mail, account in data["accounts"].items():
+            for name, entry in account.get("passwords", {}).items():
+                changed = entry.get("dateoflastchange")
+                if isinstance(changed, int):
+                    index._changed[(mail, name)] = changed
+        index._order = sorted((changed, mail, name) for (mail, name), changed in index._changed.items())
+        return index
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def add(self, mail: str, name: str, changed: int) -> None:
+        """
+        Adds an entry, or moves it if it is already indexed.
+
+        :param mail: The mail of the account.
+        :param name: The name of the entry.
+        :param changed: The date of the last change in epoch seconds.
+        """
+        self.remove(mail, name)
+        self._changed[(mail, name)] = changed
+        bisect.insort(self._order, (changed, mail, name))
+
+    def remove(self, mail: str, name: str) -> None:
+        """
+        Removes an entry from the index; entries that are not indexed are ignored.
+
+        :param mail: The mail of the account.
+        :param name: The name of the entry.
+        """
+        changed = self._changed.pop((mail, name), None)
+        if changed is not None:
+            del self._order[bisect.bisect_left(self._order, (changed, mail, name))]
+
+    def apply_record(self, record: dict) -> None:
+        """
+        Updates the index with a mutation record (see source.vault_journal.apply_record).
+
+        :param record: The mutation record.
+        """
+        mail = record["mail"]
+        operation = record["op"]
+        if operation == "register_account":
+            for name in [name for (indexed_mail, name) in self._changed if indexed_mail == mail]:
+                self.remove(mail, name)
+            entries = record["account"].get("passwords", {}).items()
+        elif operation in ("add_entry", "change_entry"):
+            if operation == "change_entry":
+                self.remove(mail, record["old_name"])
+            entries = [(record["name"], record["entry"])]
+        elif operation == "delete_entry":
+            self.remove(mail, record["name"])
+            return
+        else:
+            raise ValueError(f"Unknown journal operation: {operation}")
+        for name, entry in entries:
+            changed = entry.get("dateoflastchange")
+            if isinstance(changed, int):
+                self.add(mail, name, changed)
+            else:
+                self.remove(mail, name)
+
+    def recently_changed(self, limit: int, mail: Optional[str] = None) -> list[tuple[str, str, int]]:
+        """
+        Returns the most recently changed entries, newest first.
+
+        :param limit: The maximum number of entries.
+        :param mail: Only return entries of this account, or None for every account.
+        :return: The list of (mail, name, date of last change).
+        """
+        result: list[tuple[str, str, int]] = []
+        for changed, entry_mail, name in reversed(self._order):
+            if len(result) >= limit:
+                break
+            if mail is None or entry_mail == mail:
+                result.append((entry_mail, name, changed))
+        return result
+
+    def changed_between(self, start: int, end: int, mail: Optional[str] = None) -> list[tuple[str, str, int]]:
+        """
+        Returns the entries last changed in [start, end), oldest first.
+
+        :param start: The first date in epoch seconds.
+        :param end: The date in epoch seconds after the last one.
+        :param mail: Only return entries of this account, or None for every account.
+        :return: The list of (mail, name, date of last change).
+        """
+        first = bisect.bisect_left(self._order, (start,))
+        last = bisect.bisect_left(self._order, (end,))
+        return [(entry_mail, name, changed) for changed, entry_mail, name in self._order[first:last] if mail is None or entry_mail == mail]
+
+    def older_than(self, days: float, mail: Optional[str] = None, now: Optional[float] = None) -> list[tuple[str, str, int]]:
+        """
+        Returns the entries that have not been changed for a number of days, oldest first.
+
+        :param days: The number of days.
+        :param mail: Only return entries of this account, or None for every account.
+        :param now: The current time in epoch seconds, or None for time.time().
+        :return: The list of (mail, name, date of last change).
+        """
+        now = time.time() if now is None else now
+        if not self._order:
+            return []
+        return self.changed_between(self._order[0][0], int(now - days * SECONDS_PER_DAY), mail)
+
+class HistoryIndex:
+    """
+    Counts, per account, the current passwords of the entries and the hashes in their histories.
+    A check hashes the candidate once with the history salt of the account and looks both up in O(1).
+    Archived hashes are not part of the index (see source.history_archive).
+    """
+
+    def __init__(self) -> None:
+        self._salts: dict[str, bytes] = {}
+        self._passwords: dict[str, Counter] = {}
+        self._hashes: dict[str, Counter] = {}
+        self._entries: dict[str, dict[str, tuple[Optional[str], tuple[str, ...]]]] = {}
+
+    @classmethod
+    def from_vault(cls, data: dict) -> "HistoryIndex":
+        """
+        Builds the index of a decoded vault.
+
+        :param data: The vault dictionary.
+        :return: The index.
+        """
+        index = cls()
+        for mail, account in data["accounts"].items():
+            index._register(mail, account)
+        return index
+
+    def _register(self, mail: str, account: dict) -> None:
+        """
+        Indexes an account with all of its entries, replacing an account with the same mail.
+
+        :param mail: The mail of the account.
+        :param account: The account dictionary.
+        """
+        self._salts[mail] = account_salt(account)
+        self._passwords[mail] = Counter()
+        self._hashes[mail] = Counter()
+        self._entries[mail] = {}
+        for name, entry in account.get("passwords", {}).items():
+            self._add(mail, name, entry)
+
+    def _add(self, mail: str, name: str, entry: dict) -> None:
+        """
+        Indexes an entry.
+
+        :param mail: The mail of the account.
+        :param name: The name of the entry.
+        :param entry: The entry dictionary.
+        """
+        password, history = entry.get("password"), tuple(entry.get("history", ()))
+        self._entries[mail][name] = (password, history)
+        self._passwords[mail][password] += 1
+        self._hashes[mail].update(history)
+
+    def _remove(self, mail: str, name: str) -> None:
+        """
+        Removes an entry from the index; entries that are not indexed are ignored.
+
+        :param mail: The mail of the account.
+        :param name: The name of the entry.
+        """
+        indexed = self._entries.get(mail, {}).pop(name, None)
+        if indexed is None:
+            return
+        password, history = indexed
+        _discard(self._passwords[mail], password)
+        for hashed in history:
+            _discard(self._hashes[mail], hashed)
+
+    def apply_record(self, record: dict) -> None:
+        """
+        Updates the index with a mutation record (see source.vault_journal.apply_record).
+
+        :param record: The mutation record.
+        """
+        mail = record["mail"]
+        operation = record["op"]
+        if operation == "register_account":
+            self._register(mail, record["account"])
+        elif operation in ("add_entry", "change_entry"):
+            self._remove(mail, record["old_name"] if operation == "change_entry" else record["name"])
+            self._remove(mail, record["name"])
+            self._add(mail, record["name"], record["entry"])
+        elif operation == "delete_entry":
+            self._remove(mail, record["name"])
+        else:
+            raise ValueError(f"Unknown journal operation: {operation}")
+
+    def history_hash(self, mail: str, password: str) -> str:
+        """
+        Hashes a password with the history salt of an account.
+
+        :param mail: The mail of the account.
+        :param password: The password.
+        :return: The history hash.
+        :raises KeyError: If the account is not indexed.
+        """
+        return hash_history_password(self._salts[mail], password)
+
+    def was_used(self, mail: str, password: str) -> bool:
+        """
+        Returns whether a password is the current password of an entry of an account or in the history of one.
+
+        :param mail: The mail of the account.
+        :param password: The password.
+        :return: True if the password is or was used in the account.
+        :raises KeyError: If the account is not indexed.
+        """
+        return password in self._passwords[mail] or self.history_hash(mail, password) in self._hashes[mail]
+
+class PrefixIndex:
+    """
+    Keeps the (case-folded name, name) of the entries of every account in a sorted list. A lookup by
+    prefix is a binary search plus the matching names; adding, renaming or deleting an entry moves one
+    item of the list of its account.
+    """
+
+    def __init__(self) -> None:
+        self._names: dict[str, list[tuple[str, str]]] = {}
+
+    @classmethod
+    def from_vault(cls, data: dict) -> "PrefixIndex":
+        """
+        Builds the index of a decoded vault.
+
+        :param data: The vault dictionary.
+        :return: The index.
+        """
+        index = cls()
+        for mail, account in data["accounts"].items():
+            index._names[mail] = sorted((name.casefold(), name) for name in account.get("passwords", {}))
+        return index
+
+    def add(self, mail: str, name: str) -> None:
+        """
+        Adds an entry name; names that are already indexed are ignored.
+
+        :param mail: The mail of the account.
+        :param name: The name of the entry.
+        """
+        names = self._names.setdefault(mail, [])
+        key = (name.casefold(), name)
+        position = bisect.bisect_left(names, key)
+        if position == len(names) or names[position] != key:
+            names.insert(position, key)
+
+    def remove(self, mail: str, name: str) -> None:
+        """
+        Removes an entry name; names that are not indexed are ignored.
+
+        :param mail: The mail of the account.
+        :param name: The name of the entry.
+        """
+        names = self._names.get(mail, [])
+        key = (name.casefold(), name)
+        position = bisect.bisect_left(names, key)
+        if position < len(names) and names[position] == key:
+            del names[position]
+
+    def apply_record(self, record: dict) -> None:
+        """
+        Updates the index with a mutation record (see source.vault_journal.apply_record).
+
+        :param record: The mutation record.
+        """
+        mail = record["mail"]
+        operation = record["op"]
+        if operation == "register_account":
+            self._names[mail] = sorted((name.casefold(), name) for name in record["account"].get("passwords", {}))
+        elif operation == "add_entry":
+            self.add(mail, record["name"])
+        elif operation == "change_entry":
+            self.remove(mail, record["old_name"])
+            self.add(mail, record["name"])
+        elif operation == "delete_entry":
+            self.remove(mail, record["name"])
+        else:
+            raise ValueError(f"Unknown journal operation: {operation}")
+
+    def contains(self, mail: str, name: str) -> bool:
+        """
+        Returns whether an account has an entry with exactly this name.
+
+        :param mail: The mail of the account.
+        :param name: The name of the entry.
+        :return: True if the name is indexed for the account.
+        """
+        names = self._names.get(mail, [])
+        key = (name.casefold(), name)
+        position = bisect.bisect_left(names, key)
+        return position < len(names) and names[position] == key
+
+    def names_with_prefix(self, mail: str, prefix: str, limit: Optional[int] = None) -> list[str]:
+        """
+        Returns the names of the entries of an account that start with a prefix, ignoring case, in
+        case-insensitive order.
+
+        :param mail: The mail of the account.
+        :param prefix: The prefix; an empty prefix matches every entry.
+        :param limit: The maximum number of names, or None for all of them.
+        :return: The list of names, empty if the account is not indexed.
+        """
+        names = self._names.get(mail, [])
+        folded = prefix.casefold()
+        position = bisect.bisect_left(names, (folded,))
+        result: list[str] = []
+        while position < len(names) and names[position][0].startswith(folded) and (limit is None or len(result) < limit):
+            result.append(names[position][1])
+            position += 1
+        return result
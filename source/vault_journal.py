@@ -0,0 +1,319 @@
+"""
+This module provides the append-only journal that is kept next to the encrypted vault snapshot.
+
+Every change to the vault is written as one encrypted mutation record at the end of
+'<vault>.journal', so a change costs O(record) instead of a rewrite of the whole vault.
+The journal starts with a header that names the snapshot it belongs to; once the snapshot is
+rewritten (e.g. by a compaction) the old journal no longer matches and is ignored.
+
+File layout:
+- header: magic (4 bytes) | salt (16 bytes) | snapshot id (32 bytes)
+- record: length of nonce + ciphertext (4 bytes, big endian) | nonce (12 bytes) | AES-256-GCM ciphertext and tag
+Journals with the magic b"PWJ1" (written before records were authenticated) hold IV (16 bytes) | AES-CFB ciphertext
+records instead; they are still read, and rewritten in the current layout before a record is appended to them.
+
+The module includes functions to:
+- Apply a mutation record (add entry, change entry, delete entry, register account) to a vault dictionary,
+  and copy only the part of a shared vault dictionary that a record changes.
+- Append an encrypted record to the journal.
+- Read and decrypt all records of a journal that belongs to the current snapshot.
+- Count the records of a journal without decrypting them.
+
+Records are encrypted with a subkey (see source.authenticated_encryption.derive_subkey) of the data key of the snapshot
+the journal belongs to, so they stay readable when a password of the vault is changed; for snapshots without key slots,
+of a key derived from the password and the salt of the journal by the KDF of the snapshot. Every record is authenticated
+together with the snapshot id and its offset in the journal, so records cannot be modified, reordered, or moved into the
+journal of another snapshot.
+"""
+import copy
+import hashlib
+import json
+import os
+import struct
+from typing import Any, BinaryIO, Optional
+from source import durability
+from source.vault_schema import SCHEMA_VERSION, migrate_vault, migrate_account, migrate_entry
+from source.password_history import account_salt
+from source.data_cryptography import decrypt_data, read_container_header, write_file_atomically
+from source.key_derivation import derive_key, get_session_salt, header_kdf
+from source.authenticated_encryption import decrypt_record, derive_subkey, encrypt_record, unwrap_data_key
+
+JOURNAL_MAGIC = b"PWJ2"
+LEGACY_JOURNAL_MAGIC = b"PWJ1"
+JOURNAL_SUFFIX = ".journal"
+_HEADER_SIZE = len(JOURNAL_MAGIC) + 16 + 32
+_LENGTH = struct.Struct(">I")
+_OFFSET = struct.Struct(">Q")
+
+def journal_filename(filename: str) -> str:
+    """
+    Returns the name of the journal file that belongs to a vault file.
+
+    :param filename: The name of the vault file.
+    :return: The name of the journal file.
+    """
+    return filename + JOURNAL_SUFFIX
+
+def snapshot_id(filename: str) -> bytes:
+    """
+    Returns an id of the current vault snapshot.
+
+    The id is a hash over the start of the file, which holds the random IV of the snapshot and therefore
+    changes with every save, without reading the whole vault. For snapshots with key slots only the salt
+    and IV are hashed, as the key slots in the header are rewritten when a password changes.
+
+    :param filename: The name of the vault file.
+    :return: The snapshot id (32 bytes).
+    """
+    with open(filename, 'rb') as file:
+        if "keys" in read_container_header(file):
+            return hashlib.sha256(file.read(32)).digest()
+        file.seek(0)
+        return hashlib.sha256(file.read(4096)).digest()
+
+def apply_record(data: dict, record: dict) -> None:
+    """
+    Applies a mutation record to a decrypted vault dictionary in place.
+    A vault of an older schema is migrated first, and so are the account and entry of the record
+    (see source.vault_schema), so records written by older versions still apply.
+
+    Supported operations:
+    - add_entry: {"mail", "name", "entry"}
+    - change_entry: {"mail", "old_name", "name", "entry"}
+    - delete_entry: {"mail", "name"}
+    - register_account: {"mail", "account"}
+
+    :param data: The decrypted vault dictionary.
+    :param record: The mutation record.
+    """
+    migrate_vault(data)
+    operation = record["op"]
+    if operation == "register_account":
+        data["accounts"][record["mail"]] = migrate_account(dict(record["account"]))
+        return
+    account = data["accounts"][record["mail"]]
+    if operation == "add_entry":
+        account["passwords"][record["name"]] = migrate_entry(record["entry"], account_salt(account))
+    elif operation == "change_entry":
+        if record["old_name"] != record["name"]:
+            account["passwords"].pop(record["old_name"], None)
+        account["passwords"][record["name"]] = migrate_entry(record["entry"], account_salt(account))
+    elif operation == "delete_entry":
+        account["passwords"].pop(record["name"], None)
+    else:
+        raise ValueError(f"Unknown journal operation: {operation}")
+
+def copy_for_record(data: dict, record: dict) -> dict:
+    """
+    Returns a copy of a vault dictionary that apply_record can mutate for the record without touching the original.
+
+    Only the dictionaries on the path of the record are copied (the vault, its accounts and the account of
+    the record with its entries), so the copy costs O(accounts + entries of the account) instead of O(vault);
+    everything else is shared with the original. A vault of an older schema is copied as a whole, as
+    apply_record migrates all of it.
+
+    :param data: The decrypted vault dictionary, e.g. one that is shared with the vault cache.
+    :param record: The mutation record.
+    :return: The copy.
+    """
+    if data.get("schema") != SCHEMA_VERSION:
+        return copy.deepcopy(data)
+    copied = dict(data, accounts=dict(data["accounts"]))
+    account = copied["accounts"].get(record["mail"])
+    if record["op"] != "register_account" and account is not None:
+        copied["accounts"][record["mail"]] = dict(account, passwords=dict(account.get("passwords", {})))
+    return copied
+
+def _read_header(journal: str) -> Optional[tuple[bytes, bytes, bytes]]:
+    """
+    Reads the magic, salt and snapshot id from the header of a journal file.
+
+    :param journal: The name of the journal file.
+    :return: The tuple (magic, salt, snapshot id), or None if the journal does not exist or has no valid header.
+    """
+    try:
+        with open(journal, 'rb') as file:
+            header = file.read(_HEADER_SIZE)
+    except FileNotFoundError:
+        return None
+    if len(header) != _HEADER_SIZE or header[:4] not in (JOURNAL_MAGIC, LEGACY_JOURNAL_MAGIC):
+        return None
+    return header[:4], header[4:20], header[20:]
+
+def _record_key(filename: str, password: str, salt: bytes) -> bytes:
+    """
+    Returns the key of the journal records: the data key of the snapshot, or for snapshots without
+    key slots the key derived from the password and the salt of the journal by the KDF of the snapshot.
+
+    :param filename: The name of the vault file.
+    :param password: The password of the vault.
+    :param salt: The salt of the journal.
+    :return: The key (in bytes).
+    """
+    with open(filename, 'rb') as file:
+        header = read_container_header(file)
+    if "keys" in header:
+        return unwrap_data_key(header, password)
+    return derive_key(password, salt, kdf=header_kdf(header))
+
+def _encrypt_record(record: dict, key: bytes, current_id: bytes, offset: int) -> bytes:
+    """
+    Encrypts a mutation record for the journal of a snapshot, bound to the snapshot id and its offset.
+
+    :param record: The mutation record.
+    :param key: The key of the journal records (see _record_key).
+    :param current_id: The id of the snapshot the journal belongs to.
+    :param offset: The offset of the record (of its length field) in the journal file.
+    :return: The length field, nonce and ciphertext of the record.
+    """
+    encrypted_record = encrypt_record(json.dumps(record).encode('utf-8'), derive_subkey(key, current_id, b"vault journal"), current_id + _OFFSET.pack(offset))
+    return _LENGTH.pack(len(encrypted_record)) + encrypted_record
+
+def _decrypt_records(content: bytes, key: bytes, magic: bytes, current_id: bytes) -> list[Any]:
+    """
+    Decrypts the complete records of a journal.
+
+    :param content: The journal content after the header.
+    :param key: The key of the journal records (see _record_key).
+    :param magic: The magic of the journal, which tells the layout of its records.
+    :param current_id: The id of the snapshot the journal belongs to.
+    :return: The mutation records in the order they were appended.
+    :raises ValueError: If a record was modified or moved.
+    """
+    records = []
+    if magic == LEGACY_JOURNAL_MAGIC:
+        for start, end in _record_spans(content):
+            records.append(json.loads(decrypt_data(content[start + 16:end], key, content[start:start + 16]).decode('utf-8')))
+        return records
+    record_key = derive_subkey(key, current_id, b"vault journal")
+    for start, end in _record_spans(content):
+        offset = _HEADER_SIZE + start - _LENGTH.size
+        records.append(json.loads(decrypt_record(content[start:end], record_key, current_id + _OFFSET.pack(offset)).decode('utf-8')))
+    return records
+
+def _upgrade_journal(journal: str, key: bytes, salt: bytes, current_id: bytes) -> None:
+    """
+    Rewrites a journal with unauthenticated records (magic b"PWJ1") atomically in the current layout.
+
+    :param journal: The name of the journal file.
+    :param key: The key of the journal records (see _record_key).
+    :param salt: The salt of the journal.
+    :param current_id: The id of the snapshot the journal belongs to.
+    """
+    with open(journal, 'rb') as file:
+        file.seek(_HEADER_SIZE)
+        content = file.read()
+    upgraded = bytearray(JOURNAL_MAGIC + salt + current_id)
+    for record in _decrypt_records(content, key, LEGACY_JOURNAL_MAGIC, current_id):
+        upgraded += _encrypt_record(record, key, current_id, len(upgraded))
+    write_file_atomically(journal, bytes(upgraded))
+
+def append_record(filename: str, password: str, record: dict) -> int:
+    """
+    Encrypts a mutation record and appends it to the journal of the vault.
+
+    A new journal is started if there is none or if the existing one belongs to an older snapshot;
+    a journal with unauthenticated records is rewritten in the current layout first. A record torn by
+    a crash during an earlier append is cut off, so the new record follows the last complete one.
+    The caller holds the lock of the vault (see source.vault_storage.vault_lock).
+    The record is synced to disk according to the durability policy.
+
+    :param filename: The name of the vault file.
+    :param password: The password used to derive the encryption key.
+    :param record: The mutation record.
+    :return: The size of the journal in bytes after the append.
+    """
+    journal = journal_filename(filename)
+    current_id = snapshot_id(filename)
+    header = _read_header(journal)
+    if header is None or header[2] != current_id:
+        salt = get_session_salt(password)
+        with open(journal, 'wb') as file:
+            file.write(JOURNAL_MAGIC + salt + current_id)
+        key = _record_key(filename, password, salt)
+    else:
+        salt = header[1]
+        key = _record_key(filename, password, salt)
+        if header[0] == LEGACY_JOURNAL_MAGIC:
+            _upgrade_journal(journal, key, salt, current_id)
+    with open(journal, 'r+b') as file:
+        end = _complete_end(file)
+        if file.seek(0, os.SEEK_END) != end:
+            file.truncate(end)
+        file.seek(end)
+        file.write(_encrypt_record(record, key, current_id, end))
+        durability.sync_appended(file, journal)
+        return file.tell()
+
+def _complete_end(file: BinaryIO) -> int:
+    """
+    Returns the end of the last complete record of an open journal by following the length fields of its
+    records, without reading the records themselves. Anything after it is a record torn by a crash.
+
+    :param file: The journal, opened for reading.
+    :return: The offset after the last complete record (the header size if there is none).
+    """
+    size = file.seek(0, os.SEEK_END)
+    end = _HEADER_SIZE
+    while end + _LENGTH.size <= size:
+        file.seek(end)
+        (length,) = _LENGTH.unpack(file.read(_LENGTH.size))
+        if length < 16 or end + _LENGTH.size + length > size:
+            break
+        end += _LENGTH.size + length
+    return end
+
+def _record_spans(content: bytes) -> list[tuple[int, int]]:
+    """
+    Splits the journal content after the header into its complete records; a torn record at the end is left out.
+
+    :param content: The journal content after the header.
+    :return: The (start, end) offsets of the nonce (or IV) and ciphertext of every record.
+    """
+    spans = []
+    offset = 0
+    while offset + _LENGTH.size <= len(content):
+        (length,) = _LENGTH.unpack_from(content, offset)
+        offset += _LENGTH.size
+        if length < 16 or offset + length > len(content):
+            break
+        spans.append((offset, offset + length))
+        offset += length
+    return spans
+
+def count_records(filename: str) -> int:
+    """
+    Counts the complete records of the journal that belongs to the current snapshot, without decrypting them.
+
+    :param filename: The name of the vault file.
+    :return: The number of records, 0 if there is no journal or it belongs to an older snapshot.
+    """
+    journal = journal_filename(filename)
+    header = _read_header(journal)
+    if header is None or header[2] != snapshot_id(filename):
+        return 0
+    with open(journal, 'rb') as file:
+        file.seek(_HEADER_SIZE)
+        return len(_record_spans(file.read()))
+
+def read_records(filename: str, password: str) -> list[Any]:
+    """
+    Reads and decrypts all records of the journal that belongs to the current snapshot.
+
+    A journal of an older snapshot yields no records, and a torn record at the end of the
+    journal (e.g. from a crash during an append) is ignored.
+
+    :param filename: The name of the vault file.
+    :param password: The password used to derive the decryption key.
+    :return: The mutation records in the order they were appended.
+    :raises ValueError: If a record was modified or moved.
+    """
+    journal = journal_filename(filename)
+    current_id = snapshot_id(filename)
+    header = _read_header(journal)
+    if header is None or header[2] != current_id:
+        return []
+    with open(journal, 'rb') as file:
+        file.seek(_HEADER_SIZE)
+        content = file.read()
+    return _decrypt_records(content, _record_key(filename, password, header[1]), header[0], current_id)
@@ -0,0 +1,193 @@
+"""
+This module provides the object model of the accounts and password entries of a decoded vault (schema 4,
+see source.vault_schema).
+
+The decoded vault keeps every entry as a dictionary with string keys. PasswordEntry stores the same
+fields in __slots__, which needs no per-instance dictionary and looks the fields up by a fixed offset
+instead of hashing the key. An Account wraps the account dictionary of a decoded vault and builds a
+PasswordEntry only when the entry is first asked for, so listing the names of an account costs nothing
+beyond the dictionary keys. Both serialize back to the layout of data.json and share the field values
+(strings and history lists) with the dictionaries they were built from instead of copying them.
+
+The module includes:
+- PasswordEntry: one password entry.
+- Account: one account with lazily built entries.
+"""
+from typing import Any, Iterator, Optional
+from source.password_history import hash_history_password
+
+ENTRY_FIELDS = ("name", "password", "url", "text", "history", "dateoffirstaccess", "dateoflastchange")
+ENTRY_DEFAULTS: dict[str, Any] = {"name": "", "password": "", "url": "", "text": "", "history": [], "dateoffirstaccess": 0, "dateoflastchange": 0}
+
+class PasswordEntry:
+    """
+    A password entry of an account. Fields that are missing from the entry dictionary get their default
+    (see ENTRY_DEFAULTS) and are left out again by to_dict as long as they keep it; keys that are not entry
+    fields are kept in extra, so an entry survives the round trip unchanged.
+    """
+    __slots__ = ENTRY_FIELDS + ("extra", "missing")
+
+    def __init__(self, name: str, password: str = "", url: str = "", text: str = "", *, history: Optional[list] = None,
+                 dateoffirstaccess: int = 0, dateoflastchange: int = 0, extra: Optional[dict] = None,
+                 missing: tuple[str, ...] = ()) -> None:
+        """
+        :param name: The name of the entry.
+        :param password: The current password.
+        :param url: The URL of the entry.
+        :param text: The note of the entry.
+        :param history: The hashes of the earlier passwords, oldest first (see source.password_history).
+        :param dateoffirstaccess: The date the entry was created, in epoch seconds.
+        :param dateoflastchange: The date the entry was last changed, in epoch seconds.
+        :param extra: Further keys of the entry dictionary, or None.
+        :param missing: The fields that were missing from the entry dictionary.
+        """
+        self.name = name
+        self.password = password
+        self.url = url
+        self.text = text
+        self.history: list = history if history is not None else []
+        self.dateoffirstaccess = dateoffirstaccess
+        self.dateoflastchange = dateoflastchange
+        self.extra = extra
+        self.missing = missing
+
+    @classmethod
+    def from_dict(cls, entry: dict) -> "PasswordEntry":
+        """
+        Builds an entry from its dictionary in the layout of data.json.
+
+        :param entry: The entry dictionary.
+        :return: The entry.
+        """
+        extra = {key: value for key, value in entry.items() if key not in ENTRY_FIELDS} or None
+        missing = tuple(field for field in ENTRY_FIELDS if field not in entry)
+        return cls(entry.get("name", ""), entry.get("password", ""), entry.get("url", ""), entry.get("text", ""),
+                   history=entry.get("history", []), dateoffirstaccess=entry.get("dateoffirstaccess", 0),
+                   dateoflastchange=entry.get("dateoflastchange", 0), extra=extra, missing=missing)
+
+    def to_dict(self) -> dict:
+        """
+        Returns the entry in the layout of data.json. The field values are shared, not copied.
+
+        :return: The entry dictionary.
+        """
+        entry = {}
+        for field in ENTRY_FIELDS:
+            value = getattr(self, field)
+            if field not in self.missing or value != ENTRY_DEFAULTS[field]:
+                entry[field] = value
+        if self.extra:
+            entry.update(self.extra)
+        return entry
+
+    def has_used_password(self, password: str, salt: bytes) -> bool:
+        """
+        Returns whether a password is the current password or in the history of the entry.
+
+        :param password: The password.
+        :param salt: The history salt of the account.
+        :return: True if the password has been used for this entry.
+        """
+        return password == self.password or hash_history_password(salt, password) in self.history
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, PasswordEntry):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"PasswordEntry(name={self.name!r})"
+
+class Account:
+    """
+    An account of a decoded vault. The entries are built when they are first asked for.
+    """
+    __slots__ = ("mail", "master_password", "_passwords", "extra")
+
+    def __init__(self, mail: str, master_password: Optional[str] = None, passwords: Optional[dict] = None, extra: Optional[dict] = None) -> None:
+        """
+        :param mail: The mail of the account.
+        :param master_password: The hash of the master password.
+        :param passwords: The entries by name, as dictionaries or PasswordEntry objects; the mapping is taken over, not copied.
+        :param extra: Further keys of the account dictionary, or None.
+        """
+        self.mail = mail
+        self.master_password = master_password
+        self._passwords: dict[str, Any] = passwords if passwords is not None else {}
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, account: dict) -> "Account":
+        """
+        Wraps an account dictionary in the layout of data.json. Only the mapping of the entries is copied
+        (one reference per entry), so building an entry later does not change the dictionary of the vault.
+
+        :param account: The account dictionary.
+        :return: The account.
+        """
+        extra = {key: value for key, value in account.items() if key not in ("mail", "master-password", "passwords")} or None
+        return cls(account.get("mail", ""), account.get("master-password"), dict(account.get("passwords", {})), extra)
+
+    @classmethod
+    def from_vault(cls, data: dict, mail: str) -> "Account":
+        """
+        Wraps an account of a decoded vault.
+
+        :param data: The vault dictionary.
+        :param mail: The mail of the account.
+        :return: The account.
+        :raises KeyError: If the vault has no account with this mail.
+        """
+        return cls.from_dict(data["accounts"][mail])
+
+    def names(self) -> Iterator[str]:
+        """
+        Iterates over the names of the entries in the order they were added, without building any entry.
+
+        :return: An iterator over the names.
+        """
+        return iter(self._passwords)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._passwords
+
+    def __len__(self) -> int:
+        return len(self._passwords)
+
+    def entry(self, name: str) -> PasswordEntry:
+        """
+        Returns an entry, building it from its dictionary on first access.
+
+        :param name: The name of the entry.
+        :return: The entry.
+        :raises KeyError: If the account has no entry with this name.
+        """
+        entry = self._passwords[name]
+        if not isinstance(entry, PasswordEntry):
+            entry = PasswordEntry.from_dict(entry)
+            self._passwords[name] = entry
+        return entry
+
+    def entries(self) -> Iterator[PasswordEntry]:
+        """
+        Iterates over all entries in the order they were added, building them as needed.
+
+        :return: An iterator over the entries.
+        """
+        for name in list(self._passwords):
+            yield self.entry(name)
+
+    def to_dict(self) -> dict:
+        """
+        Returns the account in the layout of data.json. Entries that were never built are passed on
+        as the dictionaries they were read from; a missing mail or master password is left out.
+
+        :return: The account dictionary.
+        """
+        passwords = {name: entry.to_dict() if isinstance(entry, PasswordEntry) else entry for name, entry in self._passwords.items()}
+        account: dict[str, Any] = {"mail": self.mail, "master-password": self.master_password}
+        account = {key: value for key, value in account.items() if value}
+        account["passwords"] = passwords
+        if self.extra:
+            account.update(self.extra)
+        return account
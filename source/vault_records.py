@@ -0,0 +1,281 @@
+"""
+This module provides an envelope-encrypted vault format in which every password entry is encrypted on its own.
+
+A random data key encrypts a small index and every entry record separately; the data key itself is
+wrapped (AES key wrap) with a key derived from the password. The index holds the accounts and maps
+every entry name to a random record id, so listing the entries of an account decrypts only the index,
+and opening an entry decrypts only that record. Records that were not changed are written back as
+they are, without decrypting or re-encrypting them.
+
+File layout (a JSON document, binary fields base64-encoded):
+- "format": "envelope-v2"
+- "salt": the salt of the password-derived key-encryption key
+- "kdf": the parameters of the KDF that derives the key-encryption key (PBKDF2 with KDF_ITERATIONS iterations if missing)
+- "wrapped-key": the wrapped data key
+- "index": nonce + ciphertext of {mail: {"mail", "master-password", "history-salt", "entries": {name: record id}}}, in the order the accounts
+  were registered (indexes written before schema 2 also hold an "accounts-list", which is dropped when the vault is opened)
+- "records": {record id: nonce + ciphertext of the entry}
+
+The index and the records are encrypted with AES-256-GCM (see source.authenticated_encryption.encrypt_record) under a subkey
+of the data key; every record is authenticated together with its record id and the index with b"index", so a record
+cannot be modified or swapped with another one. Vaults of the format "envelope-v1" hold IV + AES-CFB ciphertexts instead;
+their records are re-encrypted when the vault is opened and written in the current format by the next save.
+
+The module includes:
+- EnvelopeVault: lazy access to the names and entries of an envelope vault, and the mutation records of source.vault_journal.apply_record.
+- create_envelope_vault: converts a vault dictionary in the data.json layout into an envelope vault file.
+"""
+import base64
+import copy
+import json
+import os
+import uuid
+from typing import Any
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import keywrap
+from source.data_cryptography import decrypt_data, write_file_atomically
+from source.authenticated_encryption import decrypt_record, derive_subkey, encrypt_record
+from source.key_derivation import derive_key, get_session_salt, header_kdf, get_default_kdf
+from source.vault_schema import empty_vault, migrate_account, migrate_entry, migrate_vault
+from source.password_history import account_salt, derived_history_salt, new_history_salt
+
+ENVELOPE_FORMAT = "envelope-v2"
+LEGACY_ENVELOPE_FORMAT = "envelope-v1"
+INDEX_ID = b"index"
+
+def _record_key(data_key: bytes) -> bytes:
+    """
+    Returns the key the index and the records are encrypted with: a subkey of the data key.
+
+    :param data_key: The data key of the vault.
+    :return: The key (32 bytes).
+    """
+    return derive_subkey(data_key, b"", b"vault envelope records")
+
+def _encrypt_json(value: Any, key: bytes, associated_data: bytes) -> str:
+    """
+    Serializes a value to JSON and encrypts it with a fresh nonce.
+
+    :param value: The value to encrypt.
+    :param key: The encryption key (in bytes).
+    :param associated_data: The id the value is bound to: the record id, or INDEX_ID for the index.
+    :return: The base64-encoded nonce and ciphertext.
+    """
+    return base64.b64encode(encrypt_record(json.dumps(value).encode('utf-8'), key, associated_data)).decode('ascii')
+
+def _decrypt_json(encrypted_value: str, key: bytes, associated_data: bytes) -> Any:
+    """
+    Decrypts a value that was encrypted with _encrypt_json.
+
+    :param encrypted_value: The base64-encoded nonce and ciphertext.
+    :param key: The decryption key (in bytes).
+    :param associated_data: The id the value was bound to.
+    :return: The decrypted value.
+    :raises ValueError: If the value was modified or belongs to another id.
+    """
+    return json.loads(decrypt_record(base64.b64decode(encrypted_value), key, associated_data).decode('utf-8'))
+
+def _decrypt_legacy_json(encrypted_value: str, key: bytes) -> Any:
+    """
+    Decrypts a value of an "envelope-v1" vault (IV + AES-CFB ciphertext under the data key).
+
+    :param encrypted_value: The base64-encoded IV and ciphertext.
+    :param key: The data key (in bytes).
+    :return: The decrypted value.
+    """
+    raw = base64.b64decode(encrypted_value)
+    return json.loads(decrypt_data(raw[16:], key, raw[:16]).decode('utf-8'))
+
+class EnvelopeVault:
+    """
+    Gives lazy access to an envelope vault file: only the index is decrypted when the vault is opened,
+    and every entry is decrypted when it is requested.
+    """
+
+    def __init__(self, filename: str, password: str) -> None:
+        """
+        Opens an envelope vault file, unwraps its data key and decrypts its index.
+        The records of an "envelope-v1" vault are re-encrypted in the current format.
+
+        :param filename: The name of the envelope vault file.
+        :param password: The password used to derive the key-encryption key.
+        :raises cryptography.hazmat.primitives.keywrap.InvalidUnwrap: If the password is wrong.
+        """
+        with open(filename, 'r', encoding='utf-8') as file:
+            document = json.load(file)
+        if document.get("format") not in (ENVELOPE_FORMAT, LEGACY_ENVELOPE_FORMAT):
+            raise ValueError(f"{filename} is not an envelope vault")
+        self.filename = filename
+        self.salt = base64.b64decode(document["salt"])
+        self._wrapped_key = document["wrapped-key"]
+        self.kdf = header_kdf(document)
+        key_encryption_key = derive_key(password, self.salt, kdf=self.kdf)
+        data_key = keywrap.aes_key_unwrap(key_encryption_key, base64.b64decode(self._wrapped_key), default_backend()) # type: ignore
+        self._record_key = _record_key(data_key)
+        self._records: dict[str, str] = document["records"]
+        if document["format"] == LEGACY_ENVELOPE_FORMAT:
+            self.index: dict = _decrypt_legacy_json(document["index"], data_key)
+            self._records = {record_id: _encrypt_json(_decrypt_legacy_json(record, data_key), self._record_key, record_id.encode('ascii'))
+                             for record_id, record in self._records.items()}
+        else:
+            self.index = _decrypt_json(document["index"], self._record_key, INDEX_ID)
+        if "accounts-list" in self.index:
+            self.index = migrate_vault({"accounts": self.index})["accounts"]
+
+    def list_names(self, mail: str) -> list[str]:
+        """
+        Returns the entry names of an account without decrypting any entry.
+
+        :param mail: The email of the account.
+        :return: The entry names.
+        """
+        return list(self.index[mail]["entries"])
+
+    def history_salt(self, mail: str) -> bytes:
+        """
+        Returns the history salt of an account from the index, without decrypting any entry.
+
+        :param mail: The email of the account.
+        :return: The salt.
+        """
+        return account_salt(self.index[mail])
+
+    def get_entry(self, mail: str, name: str) -> Any:
+        """
+        Decrypts and returns a single entry.
+
+        :param mail: The email of the account.
+        :param name: The name of the entry.
+        :return: The decrypted entry dictionary.
+        :raises KeyError: If the account has no entry with that name.
+        """
+        record_id = self.index[mail]["entries"][name]
+        return migrate_entry(_decrypt_json(self._records[record_id], self._record_key, record_id.encode('ascii')), account_salt(self.index[mail]))
+
+    def set_entry(self, mail: str, name: str, entry: dict, old_name: str = "") -> None:
+        """
+        Encrypts and stores an entry, optionally replacing the entry it was renamed from.
+
+        :param mail: The email of the account.
+        :param name: The name of the entry.
+        :param entry: The entry dictionary.
+        :param old_name: The previous name of the entry, if it was renamed.
+        """
+        entries = self.index[mail]["entries"]
+        if old_name and old_name != name:
+            self.delete_entry(mail, old_name)
+        record_id = entries.get(name) or uuid.uuid4().hex
+        self._records[record_id] = _encrypt_json(entry, self._record_key, record_id.encode('ascii'))
+        entries[name] = record_id
+
+    def delete_entry(self, mail: str, name: str) -> None:
+        """
+        Deletes an entry and its record.
+
+        :param mail: The email of the account.
+        :param name: The name of the entry.
+        """
+        record_id = self.index[mail]["entries"].pop(name)
+        del self._records[record_id]
+
+    def register_account(self, mail: str, master_password: str) -> None:
+        """
+        Adds a new account without entries to the index.
+
+        :param mail: The email of the account.
+        :param master_password: The hashed master password of the account.
+        """
+        self.index[mail] = {"mail": mail, "master-password": master_password, "history-salt": new_history_salt(), "entries": {}}
+
+    def apply_record(self, record: dict) -> None:
+        """
+        Applies a mutation record (see source.vault_journal.apply_record); only the records of the changed
+        entries are encrypted. The change is kept in memory until save is called.
+
+        :param record: The mutation record.
+        :raises KeyError: If the record refers to an account that does not exist.
+        """
+        operation = record["op"]
+        mail = record["mail"]
+        if operation == "register_account":
+            account = migrate_account(dict(record["account"]))
+            for name in list(self.index.get(mail, {}).get("entries", {})):
+                self.delete_entry(mail, name)
+            self.index[mail] = {"mail": account.get("mail", mail), "master-password": account.get("master-password", ""),
+                                "history-salt": account["history-salt"], "entries": {}}
+            for name, entry in account.get("passwords", {}).items():
+                self.set_entry(mail, name, entry)
+            return
+        entries = self.index[mail]["entries"]
+        if operation in ("add_entry", "change_entry"):
+            old_name = record.get("old_name", "")
+            self.set_entry(mail, record["name"], migrate_entry(record["entry"], account_salt(self.index[mail])), old_name if old_name in entries else "")
+        elif operation == "delete_entry":
+            if record["name"] in entries:
+                self.delete_entry(mail, record["name"])
+        else:
+            raise ValueError(f"Unknown journal operation: {operation}")
+
+    def to_dict(self) -> dict:
+        """
+        Decrypts every entry and returns the vault in the layout of data.json.
+
+        :return: The decrypted vault dictionary.
+        """
+        data = empty_vault()
+        for mail, account in self.index.items():
+            data["accounts"][mail] = {
+                "mail": account["mail"],
+                "master-password": account["master-password"],
+                "history-salt": account.get("history-salt") or derived_history_salt(account),
+                "passwords": {name: self.get_entry(mail, name) for name in account["entries"]}
+            }
+        return data
+
+    def save(self) -> None:
+        """
+        Re-encrypts the index and writes the vault atomically; unchanged records are written back as they are.
+        """
+        document = {
+            "format": ENVELOPE_FORMAT,
+            "salt": base64.b64encode(self.salt).decode('ascii'),
+            "kdf": self.kdf,
+            "wrapped-key": self._wrapped_key,
+            "index": _encrypt_json(self.index, self._record_key, INDEX_ID),
+            "records": self._records
+        }
+        write_file_atomically(self.filename, json.dumps(document).encode('utf-8'))
+
+def create_envelope_vault(data_dict: dict, filename: str, password: str) -> EnvelopeVault:
+    """
+    Writes a vault dictionary in the layout of data.json as an envelope vault file with a new random data key.
+
+    :param data_dict: The vault dictionary.
+    :param filename: The name of the envelope vault file.
+    :param password: The password used to derive the key-encryption key.
+    :return: The opened envelope vault.
+    """
+    salt = get_session_salt(password)
+    kdf = get_default_kdf()
+    data_key = os.urandom(32)
+    wrapped_key = keywrap.aes_key_wrap(derive_key(password, salt, kdf=kdf), data_key, default_backend()) # type: ignore
+    accounts = migrate_vault(copy.deepcopy(data_dict))["accounts"]
+    record_key = _record_key(data_key)
+    index: dict[str, Any] = {}
+    records = {}
+    for mail, account in accounts.items():
+        index[mail] = {"mail": account.get("mail", mail), "master-password": account.get("master-password", ""), "history-salt": account["history-salt"], "entries": {}}
+        for name, entry in account["passwords"].items():
+            record_id = uuid.uuid4().hex
+            records[record_id] = _encrypt_json(entry, record_key, record_id.encode('ascii'))
+            index[mail]["entries"][name] = record_id
+    document = {
+        "format": ENVELOPE_FORMAT,
+        "salt": base64.b64encode(salt).decode('ascii'),
+        "kdf": kdf,
+        "wrapped-key": base64.b64encode(wrapped_key).decode('ascii'),
+        "index": _encrypt_json(index, record_key, INDEX_ID),
+        "records": records
+    }
+    write_file_atomically(filename, json.dumps(document).encode('utf-8'))
+    return EnvelopeVault(filename, password)
@@ -0,0 +1,135 @@
+"""
+This module describes the layout of the decrypted vault and migrates vaults of older layouts.
+
+Schema 4 (current):
+- {"schema": 4, "accounts": {mail: account}}
+- account: {"mail", "master-password", "history-salt", "passwords": {name: entry}}
+- entry: {"name", "password", "url", "text", "history", "dateoffirstaccess", "dateoflastchange"}
+The dictionaries keep their insertion order, so the keys of "accounts" and "passwords" are the only
+record of which accounts and entries exist and in which order they were added: membership, adding
+and deleting are dictionary operations in O(1). The dates of an entry are integer epoch seconds, which
+sort and compare without parsing; they are only formatted (format_timestamp) when they are drawn.
+The history of an entry holds salted hashes of its earlier passwords (see source.password_history).
+
+Older schemas are converted on the fly when a vault is loaded or a mutation record is applied to it;
+the converted vault is written the next time it is saved:
+- Schema 3 kept every password an entry ever had in plaintext in "oldpasswordlist", ending with the
+  current one. The earlier passwords become the hashed "history" (all of them; the history is cut to
+  its depth the next time the password changes), and the account gets its derived history salt.
+- Schema 2 stored the dates as local time strings in DATE_FORMAT ("%d.%m.%Y %H:%M").
+- Schema 1 (vaults without a "schema" field) additionally kept the lists "accounts-list" (next to the
+  accounts) and "passwords-list" (in every account), which duplicated the keys of the dictionaries.
+
+The module includes functions to:
+- Create an empty vault.
+- Migrate a vault, a single account or a single entry to schema 4 in place, or migrate a copy of a shared vault.
+- Format a stored date for display.
+"""
+import copy
+import datetime
+from typing import Any, Optional
+from source.password_history import account_salt, derived_history_salt, hash_history_password
+
+SCHEMA_VERSION = 4
+DATE_FORMAT = "%d.%m.%Y %H:%M"
+DATE_FIELDS = ("dateoffirstaccess", "dateoflastchange")
+
+def empty_vault() -> dict:
+    """
+    Returns a new vault without accounts.
+
+    :return: The empty vault dictionary.
+    """
+    return {"schema": SCHEMA_VERSION, "accounts": {}}
+
+def format_timestamp(value: Any) -> str:
+    """
+    Formats a stored date of an entry in DATE_FORMAT (local time). Dates that are not epoch seconds
+    (e.g. strings that could not be migrated) are returned as they are.
+
+    :param value: The epoch seconds.
+    :return: The formatted date.
+    """
+    if isinstance(value, int):
+        return datetime.datetime.fromtimestamp(value).strftime(DATE_FORMAT)
+    return "" if value is None else str(value)
+
+def migrate_entry(entry: dict, salt: Optional[bytes] = None) -> dict:
+    """
+    Converts an entry of an older schema in place: dates that are local time strings in DATE_FORMAT become
+    epoch seconds (integers, and strings that do not match DATE_FORMAT, are left as they are), and with the
+    history salt of the account the plaintext "oldpasswordlist" becomes the hashed "history".
+
+    :param entry: The entry dictionary.
+    :param salt: The history salt of the account, or None to leave the password history as it is.
+    :return: The same entry dictionary.
+    """
+    if salt is not None and "oldpasswordlist" in entry:
+        history: list[str] = []
+        for password in entry.pop("oldpasswordlist"):
+            if password != entry.get("password"):
+                hashed = hash_history_password(salt, password)
+                history = [item for item in history if item != hashed] + [hashed]
+        entry["history"] = history
+    for field in DATE_FIELDS:
+        value = entry.get(field)
+        if isinstance(value, str):
+            try:
+                entry[field] = int(datetime.datetime.strptime(value, DATE_FORMAT).timestamp())
+            except ValueError:
+                pass
+    return entry
+
+def migrate_account(account: dict) -> dict:
+    """
+    Converts an account of an older schema to schema 4 in place: the entries are ordered by the
+    "passwords-list" of schema 1 (entries missing from it follow in their order), the list is dropped,
+    an account without a history salt gets its derived one, and every entry is migrated.
+
+    :param account: The account dictionary.
+    :return: The same account dictionary.
+    """
+    passwords = account.get("passwords", {})
+    if "passwords-list" in account:
+        ordered = {name: passwords[name] for name in account.pop("passwords-list") if name in passwords}
+        ordered.update(passwords)
+        account["passwords"] = passwords = ordered
+    if "history-salt" not in account:
+        account["history-salt"] = derived_history_salt(account)
+    salt = account_salt(account)
+    for entry in passwords.values():
+        migrate_entry(entry, salt)
+    return account
+
+def migrate_vault(data: Any) -> Any:
+    """
+    Converts a vault of an older schema to schema 4 in place: the accounts are ordered by the "accounts-list"
+    of schema 1 (accounts missing from it follow in their order), the list is dropped and every account is migrated.
+    Vaults of schema 4 are left as they are, so the check costs O(1).
+
+    :param data: The vault dictionary.
+    :return: The same vault dictionary.
+    """
+    if data.get("schema") == SCHEMA_VERSION:
+        return data
+    accounts = data.get("accounts", {})
+    mails = accounts.pop("accounts-list", [])
+    ordered = {mail: accounts[mail] for mail in mails if mail in accounts}
+    ordered.update(accounts)
+    for account in ordered.values():
+        migrate_account(account)
+    data["schema"] = SCHEMA_VERSION
+    data["accounts"] = ordered
+    return data
+
+def migrated_vault(data: Any) -> Any:
+    """
+    Returns a vault of schema 4 without changing the given one, e.g. a vault that is shared with the vault cache:
+    the vault itself if it already is of schema 4, otherwise a migrated deep copy.
+
+    :param data: The vault dictionary.
+    :return: The vault dictionary of schema 4.
+    """
+    if data.get("schema") == SCHEMA_VERSION:
+        return data
+    return migrate_vault(copy.deepcopy(data))
@@ -0,0 +1,161 @@
+"""
+This module provides a sharded vault layout with one encrypted file per account.
+
+A sharded vault is a directory that holds a small encrypted accounts index ('index.json') and
+one encrypted shard file per account ('account-<id>.json'). The index maps every mail to the id
+of its shard, so loading or saving one account only decrypts and encrypts that account's shard.
+Shard ids are random, so the file names do not reveal the registered mails.
+
+The module includes functions to:
+- Load the accounts index and single account shards.
+- Edit a single account shard in a transaction, register new accounts and remove accounts.
+- Load a whole sharded vault back into the data.json layout.
+- Migrate an existing data.json into the sharded layout (also usable from the command line).
+"""
+import argparse
+import os
+import uuid
+from contextlib import contextmanager, suppress
+from typing import Any, Iterator
+from source.vault_storage import load_vault, save_vault, vault_transaction, invalidate_vault_cache
+from source.vault_journal import journal_filename
+from source.vault_schema import empty_vault, migrate_account, migrated_vault
+
+INDEX_FILENAME = "index.json"
+
+def _index_path(directory: str) -> str:
+    """
+    Returns the path of the accounts index of a sharded vault.
+
+    :param directory: The directory of the sharded vault.
+    :return: The path of the index file.
+    """
+    return os.path.join(directory, INDEX_FILENAME)
+
+def _shard_path(directory: str, shard_id: str) -> str:
+    """
+    Returns the path of an account shard.
+
+    :param directory: The directory of the sharded vault.
+    :param shard_id: The id of the shard.
+    :return: The path of the shard file.
+    """
+    return os.path.join(directory, f"account-{shard_id}.json")
+
+def create_sharded_vault(directory: str, password: str) -> None:
+    """
+    Creates an empty sharded vault in the directory unless it already has an accounts index.
+
+    :param directory: The directory of the sharded vault.
+    :param password: The password used to derive the encryption key.
+    """
+    os.makedirs(directory, exist_ok=True)
+    if not os.path.exists(_index_path(directory)):
+        save_vault({"shards": {}}, _index_path(directory), password)
+
+def load_shard_index(directory: str, password: str) -> Any:
+    """
+    Loads the accounts index, which maps the mail of every account to its shard id, in the order the accounts were registered.
+    Indexes written before schema 2 also hold an "accounts-list", which is ignored.
+
+    :param directory: The directory of the sharded vault.
+    :param password: The password used to derive the decryption key.
+    :return: The decrypted index dictionary.
+    """
+    return load_vault(_index_path(directory), password)
+
+def load_account(directory: str, password: str, mail: str) -> Any:
+    """
+    Loads a single account by decrypting only its shard.
+
+    :param directory: The directory of the sharded vault.
+    :param password: The password used to derive the decryption key.
+    :param mail: The email of the account.
+    :return: The decrypted account dictionary.
+    """
+    shard_id = load_shard_index(directory, password)["shards"][mail]
+    return migrate_account(load_vault(_shard_path(directory, shard_id), password))
+
+@contextmanager
+def account_transaction(directory: str, password: str, mail: str) -> Iterator[Any]:
+    """
+    Loads a single account shard, yields it for mutations and commits only that shard.
+
+    :param directory: The directory of the sharded vault.
+    :param password: The password used for the vault.
+    :param mail: The email of the account.
+    :return: The decrypted account dictionary, to be mutated in place.
+    """
+    shard_id = load_shard_index(directory, password)["shards"][mail]
+    with vault_transaction(_shard_path(directory, shard_id), password) as account:
+        yield account
+
+def register_account(directory: str, password: str, mail: str, account: dict) -> None:
+    """
+    Stores a new account in its own shard and adds it to the accounts index.
+
+    :param directory: The directory of the sharded vault.
+    :param password: The password used to derive the encryption key.
+    :param mail: The email of the account.
+    :param account: The account dictionary.
+    """
+    with vault_transaction(_index_path(directory), password) as index:
+        shard_id = index["shards"].get(mail) or uuid.uuid4().hex
+        save_vault(migrate_account(dict(account)), _shard_path(directory, shard_id), password)
+        index["shards"][mail] = shard_id
+
+def remove_account(directory: str, password: str, mail: str) -> None:
+    """
+    Removes an account from the accounts index and deletes its shard.
+
+    :param directory: The directory of the sharded vault.
+    :param password: The password used to derive the encryption key.
+    :param mail: The email of the account.
+    """
+    with vault_transaction(_index_path(directory), password) as index:
+        shard_id = index["shards"].pop(mail, None)
+    if shard_id is not None:
+        path = _shard_path(directory, shard_id)
+        for filename in (path, journal_filename(path)):
+            with suppress(FileNotFoundError):
+                os.remove(filename)
+        invalidate_vault_cache(path)
+
+def load_sharded_vault(directory: str, password: str) -> dict:
+    """
+    Loads every shard of a sharded vault and returns it in the layout of data.json.
+
+    :param directory: The directory of the sharded vault.
+    :param password: The password used to derive the decryption key.
+    :return: The decrypted vault dictionary.
+    """
+    index = load_shard_index(directory, password)
+    data = empty_vault()
+    for mail, shard_id in index["shards"].items():
+        data["accounts"][mail] = migrate_account(load_vault(_shard_path(directory, shard_id), password))
+    return data
+
+def migrate_to_shards(filename: str, directory: str, password: str) -> int:
+    """
+    Splits an existing vault file (e.g. data.json) into a sharded vault.
+
+    :param filename: The name of the vault file to split.
+    :param directory: The directory the sharded vault is written to.
+    :param password: The password of the vault; the shards are encrypted with the same password.
+    :return: The number of migrated accounts.
+    """
+    accounts = migrated_vault(load_vault(filename, password))["accounts"]
+    create_sharded_vault(directory, password)
+    with vault_transaction(_index_path(directory), password):
+        for mail, account in accounts.items():
+            register_account(directory, password, mail, account)
+    return len(accounts)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split a vault file into one encrypted shard per account.")
+    parser.add_argument("filename", help="the vault file to split, e.g. data.json")
+    parser.add_argument("directory", help="the directory of the sharded vault")
+    parser.add_argument("--password", default="oTclmO]dh}[QyM'i", help="the password of the vault")
+    arguments = parser.parse_args()
+    count = migrate_to_shards(arguments.filename, arguments.directory, arguments.password)
+    print(f"{count} Accounts nach {arguments.directory} migriert.")
@@ -0,0 +1,393 @@
+"""
+This module provides a vault storage engine on top of SQLite for vaults with many accounts and entries.
+
+Instead of one encrypted blob, the vault is kept in three tables, so reading or changing one entry
+touches only its rows:
+- accounts: one row per account
+- entries: one row per password entry, in the order the entries were added
+- history: one row per item of an entry's "history" (the password hashes, see source.password_history;
+  databases written before schema 4 hold the plaintext "oldpasswordlist" here, which is migrated when it is read)
+
+Every row is encrypted on its own (nonce + AES-256-GCM ciphertext, see source.authenticated_encryption.encrypt_record)
+with a subkey of the key derived from the password with the salt and the KDF parameters stored in the meta table, and is
+authenticated together with its place in the database (the blind index of an account, the account id and blind index of
+an entry, the entry id and position of a history item), so rows cannot be modified or swapped. Databases written before
+rows were authenticated (IV + AES-CFB ciphertext) are re-encrypted once when they are opened. Mails and entry names are looked up
+through indexed blind indexes (HMAC-SHA256 under a key derived from the vault key), so the database
+file reveals neither the registered mails nor the entry names.
+
+The vault is read and changed through the same operations as the file vault: the whole vault in the
+layout of data.json, and the mutation records of source.vault_journal.apply_record.
+
+The module includes:
+- SqliteVault: loads accounts and the whole vault, replaces the whole vault, and applies mutation records.
+- import_vault: converts an existing vault file (e.g. data.json) into a SQLite vault (also usable from the command line).
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import sqlite3
+import struct
+from typing import Any, Optional
+from source.data_cryptography import decrypt_data
+from source.authenticated_encryption import decrypt_record, derive_subkey, encrypt_record
+from source.key_derivation import derive_key, get_session_salt, header_kdf, get_default_kdf
+from source.vault_storage import load_vault
+from source.vault_schema import empty_vault, migrate_account, migrated_vault
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS accounts (
+    id INTEGER PRIMARY KEY,
+    mail_index BLOB NOT NULL,
+    payload BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+    name_index BLOB NOT NULL,
+    position INTEGER NOT NULL,
+    payload BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    entry_id INTEGER NOT NULL REFERENCES entries(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    payload BLOB NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS accounts_mail ON accounts(mail_index);
+CREATE UNIQUE INDEX IF NOT EXISTS entries_account_name ON entries(account_id, name_index);
+CREATE INDEX IF NOT EXISTS entries_account_position ON entries(account_id, position);
+CREATE INDEX IF NOT EXISTS history_entry ON history(entry_id, position);
+"""
+HISTORY_FIELDS = ("history", "oldpasswordlist")
+ROW_CIPHER = "aes-256-gcm"
+
+_row_id = struct.Struct(">q")
+
+class SqliteVault:
+    """
+    Gives row-level access to a vault stored in a SQLite database.
+    """
+
+    def __init__(self, filename: str, password: str) -> None:
+        """
+        Opens a SQLite vault, creating an empty one if the database does not exist yet.
+
+        :param filename: The name of the database file.
+        :param password: The password used to derive the encryption key.
+        :raises ValueError: If the password does not match the vault.
+        """
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+        meta = dict(self.connection.execute("SELECT key, value FROM meta"))
+        if "salt" not in meta:
+            meta = {"salt": get_session_salt(password), "kdf": json.dumps(get_default_kdf())}
+        self.kdf = header_kdf({"kdf": json.loads(meta["kdf"])} if "kdf" in meta else {})
+        self._key = derive_key(password, meta["salt"], kdf=self.kdf)
+        self._index_key = hmac.new(self._key, b"vault-sqlite-index", hashlib.sha256).digest()
+        self._row_key = derive_subkey(self._key, b"", b"vault-sqlite-rows")
+        verifier = hmac.new(self._key, b"vault-sqlite-verifier", hashlib.sha256).digest()
+        if "verifier" not in meta:
+            with self.connection:
+                self.connection.executemany("INSERT INTO meta (key, value) VALUES (?, ?)",
+                                            [("salt", meta["salt"]), ("kdf", meta["kdf"]), ("verifier", verifier), ("row-cipher", ROW_CIPHER)])
+        elif not hmac.compare_digest(meta["verifier"], verifier):
+            self.connection.close()
+            raise ValueError(f"Wrong password for {filename}")
+        elif "row-cipher" not in meta:
+            self._upgrade_rows()
+
+    def close(self) -> None:
+        """
+        Closes the database connection.
+        """
+        self.connection.close()
+
+    def _blind_index(self, value: str) -> bytes:
+        """
+        Returns the blind index of a mail or entry name.
+
+        :param value: The mail or entry name.
+        :return: The keyed hash of the value.
+        """
+        return hmac.new(self._index_key, value.encode('utf-8'), hashlib.sha256).digest()
+
+    def _encrypt(self, value: Any, row: bytes) -> bytes:
+        """
+        Serializes a value to JSON and encrypts it with a fresh nonce, bound to the place of its row.
+
+        :param value: The value to encrypt.
+        :param row: The place of the row (see _account_row, _entry_row and _history_row).
+        :return: The nonce and ciphertext.
+        """
+        return encrypt_record(json.dumps(value).encode('utf-8'), self._row_key, row)
+
+    def _decrypt(self, payload: bytes, row: bytes) -> Any:
+        """
+        Decrypts a row payload that was encrypted with _encrypt.
+
+        :param payload: The nonce and ciphertext.
+        :param row: The place of the row.
+        :return: The decrypted value.
+        :raises ValueError: If the payload was modified or belongs to another row.
+        """
+        return json.loads(decrypt_record(payload, self._row_key, row).decode('utf-8'))
+
+    @staticmethod
+    def _account_row(mail_index: bytes) -> bytes:
+        """
+        Returns the place of an account row, which its payload is authenticated with.
+
+        :param mail_index: The blind index of the mail.
+        :return: The associated data of the row.
+        """
+        return b"account" + mail_index
+
+    @staticmethod
+    def _entry_row(account_id: int, name_index: bytes) -> bytes:
+        """
+        Returns the place of an entry row, which its payload is authenticated with.
+
+        :param account_id: The row id of the account.
+        :param name_index: The blind index of the entry name.
+        :return: The associated data of the row.
+        """
+        return b"entry" + _row_id.pack(account_id) + name_index
+
+    @staticmethod
+    def _history_row(entry_id: int, position: int) -> bytes:
+        """
+        Returns the place of a history row, which its payload is authenticated with.
+
+        :param entry_id: The row id of the entry.
+        :param position: The position of the item in the history.
+        :return: The associated data of the row.
+        """
+        return b"history" + _row_id.pack(entry_id) + _row_id.pack(position)
+
+    def _upgrade_rows(self) -> None:
+        """
+        Re-encrypts every row of a database written before rows were authenticated (IV + AES-CFB ciphertext
+        under the vault key) in one transaction.
+        """
+        def legacy(payload: bytes) -> Any:
+            return json.loads(decrypt_data(payload[16:], self._key, payload[:16]).decode('utf-8'))
+        with self.connection:
+            for row_id, mail_index, payload in self.connection.execute("SELECT id, mail_index, payload FROM accounts").fetchall():
+                self.connection.execute("UPDATE accounts SET payload = ? WHERE id = ?", (self._encrypt(legacy(payload), self._account_row(mail_index)), row_id))
+            for row_id, account_id, name_index, payload in self.connection.execute("SELECT id, account_id, name_index, payload FROM entries").fetchall():
+                self.connection.execute("UPDATE entries SET payload = ? WHERE id = ?", (self._encrypt(legacy(payload), self._entry_row(account_id, name_index)), row_id))
+            for row_id, entry_id, position, payload in self.connection.execute("SELECT id, entry_id, position, payload FROM history").fetchall():
+                self.connection.execute("UPDATE history SET payload = ? WHERE id = ?", (self._encrypt(legacy(payload), self._history_row(entry_id, position)), row_id))
+            self.connection.execute("INSERT INTO meta (key, value) VALUES (?, ?)", ("row-cipher", ROW_CIPHER))
+
+    def _account_id(self, mail: str) -> Optional[int]:
+        """
+        Looks up the row id of an account by its mail.
+
+        :param mail: The email of the account.
+        :return: The row id, or None if there is no such account.
+        """
+        row = self.connection.execute("SELECT id FROM accounts WHERE mail_index = ?", (self._blind_index(mail),)).fetchone()
+        return row[0] if row else None
+
+    def _entry_id(self, account_id: int, name: str) -> Optional[int]:
+        """
+        Looks up the row id of an entry by its account and name.
+
+        :param account_id: The row id of the account.
+        :param name: The name of the entry.
+        :return: The row id, or None if the account has no such entry.
+        """
+        row = self.connection.execute("SELECT id FROM entries WHERE account_id = ? AND name_index = ?", (account_id, self._blind_index(name))).fetchone()
+        return row[0] if row else None
+
+    def _write_entry(self, account_id: int, name: str, entry: dict, entry_id: Optional[int] = None) -> None:
+        """
+        Inserts an entry at the end of the account's entries, or updates it in place, and replaces its history.
+
+        :param account_id: The row id of the account.
+        :param name: The name of the entry.
+        :param entry: The entry dictionary.
+        :param entry_id: The row id of the entry to update, or None to insert it.
+        """
+        history_field = next((field for field in HISTORY_FIELDS if field in entry), None)
+        fields = {key: value for key, value in entry.items() if key != history_field}
+        name_index = self._blind_index(name)
+        payload = self._encrypt({"name": name, "fields": fields, "history-field": history_field}, self._entry_row(account_id, name_index))
+        if entry_id is None:
+            (position,) = self.connection.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM entries WHERE account_id = ?", (account_id,)).fetchone()
+            cursor = self.connection.execute(
+                "INSERT INTO entries (account_id, name_index, position, payload) VALUES (?, ?, ?, ?)",
+                (account_id, name_index, position, payload))
+            entry_id = cursor.lastrowid
+            if entry_id is None:
+                raise sqlite3.DatabaseError("The entry could not be stored")
+        else:
+            self.connection.execute("UPDATE entries SET payload = ? WHERE id = ?", (payload, entry_id))
+            self.connection.execute("DELETE FROM history WHERE entry_id = ?", (entry_id,))
+        self.connection.executemany(
+            "INSERT INTO history (entry_id, position, payload) VALUES (?, ?, ?)",
+            [(entry_id, position, self._encrypt(item, self._history_row(entry_id, position)))
+             for position, item in enumerate(entry.get(history_field, []) if history_field else [])])
+
+    def _read_entries(self, account_id: int) -> dict[str, dict]:
+        """
+        Decrypts all entries of an account together with their history.
+
+        :param account_id: The row id of the account.
+        :return: The entries by name, in the order they were added.
+        """
+        history: dict[int, list] = {}
+        for entry_id, position, payload in self.connection.execute(
+                "SELECT history.entry_id, history.position, history.payload FROM history JOIN entries ON entries.id = history.entry_id "
+                "WHERE entries.account_id = ? ORDER BY history.entry_id, history.position", (account_id,)):
+            history.setdefault(entry_id, []).append(self._decrypt(payload, self._history_row(entry_id, position)))
+        entries = {}
+        for entry_id, name_index, payload in self.connection.execute(
+                "SELECT id, name_index, payload FROM entries WHERE account_id = ? ORDER BY position", (account_id,)):
+            row = self._decrypt(payload, self._entry_row(account_id, name_index))
+            entry = row["fields"]
+            history_field = row["history-field"] if "history-field" in row else ("oldpasswordlist" if row.get("has-history") else None)
+            if history_field:
+                entry[history_field] = history.get(entry_id, [])
+            entries[row["name"]] = entry
+        return entries
+
+    def list_accounts(self) -> list[str]:
+        """
+        Returns the mails of all accounts in the order they were registered.
+
+        :return: The mails.
+        """
+        return [self._decrypt(payload, self._account_row(mail_index))["mail"]
+                for mail_index, payload in self.connection.execute("SELECT mail_index, payload FROM accounts ORDER BY id")]
+
+    def load_account(self, mail: str) -> Any:
+        """
+        Loads a single account in the layout of data.json; only the rows of that account are decrypted.
+
+        :param mail: The email of the account.
+        :return: The account dictionary.
+        :raises KeyError: If there is no such account.
+        """
+        account_id = self._account_id(mail)
+        if account_id is None:
+            raise KeyError(mail)
+        (payload,) = self.connection.execute("SELECT payload FROM accounts WHERE id = ?", (account_id,)).fetchone()
+        account = self._decrypt(payload, self._account_row(self._blind_index(mail)))
+        account["passwords"] = self._read_entries(account_id)
+        return migrate_account(account)
+
+    def to_dict(self) -> dict:
+        """
+        Decrypts the whole vault and returns it in the layout of data.json.
+
+        :return: The decrypted vault dictionary.
+        """
+        data = empty_vault()
+        for mail in self.list_accounts():
+            data["accounts"][mail] = self.load_account(mail)
+        return data
+
+    def apply_record(self, record: dict) -> None:
+        """
+        Applies a mutation record (see source.vault_journal.apply_record) in one database transaction.
+
+        :param record: The mutation record.
+        :raises KeyError: If the record refers to an account that does not exist.
+        """
+        operation = record["op"]
+        with self.connection:
+            if operation == "register_account":
+                self._register_account(record["mail"], record["account"])
+                return
+            account_id = self._account_id(record["mail"])
+            if account_id is None:
+                raise KeyError(record["mail"])
+            if operation == "add_entry":
+                self._write_entry(account_id, record["name"], record["entry"], self._entry_id(account_id, record["name"]))
+            elif operation == "change_entry":
+                entry_id = self._entry_id(account_id, record["name"])
+                if record["old_name"] != record["name"]:
+                    old_entry_id = self._entry_id(account_id, record["old_name"])
+                    if old_entry_id is not None:
+                        self.connection.execute("DELETE FROM entries WHERE id = ?", (old_entry_id,))
+                self._write_entry(account_id, record["name"], record["entry"], entry_id)
+            elif operation == "delete_entry":
+                self.connection.execute("DELETE FROM entries WHERE account_id = ? AND name_index = ?", (account_id, self._blind_index(record["name"])))
+            else:
+                raise ValueError(f"Unknown journal operation: {operation}")
+
+    def replace_accounts(self, accounts: dict) -> None:
+        """
+        Replaces the whole vault in one database transaction: the accounts of the mapping are stored
+        (see _register_account) and every other account is deleted with its entries and history.
+
+        :param accounts: The account dictionaries by mail, in the layout of data.json.
+        """
+        kept = {self._blind_index(mail) for mail in accounts}
+        with self.connection:
+            for mail, account in accounts.items():
+                self._register_account(mail, account)
+            removed = [(account_id,) for account_id, mail_index in self.connection.execute("SELECT id, mail_index FROM accounts") if mail_index not in kept]
+            self.connection.executemany("DELETE FROM accounts WHERE id = ?", removed)
+
+    def _register_account(self, mail: str, account: dict) -> None:
+        """
+        Stores an account with all of its entries, replacing an existing account with the same mail.
+
+        :param mail: The email of the account.
+        :param account: The account dictionary in the layout of data.json.
+        """
+        account = migrate_account(dict(account))
+        fields = {key: value for key, value in account.items() if key != "passwords"}
+        fields["mail"] = mail
+        account_id = self._account_id(mail)
+        mail_index = self._blind_index(mail)
+        if account_id is None:
+            cursor = self.connection.execute("INSERT INTO accounts (mail_index, payload) VALUES (?, ?)", (mail_index, self._encrypt(fields, self._account_row(mail_index))))
+            account_id = cursor.lastrowid
+            if account_id is None:
+                raise sqlite3.DatabaseError("The account could not be stored")
+        else:
+            self.connection.execute("UPDATE accounts SET payload = ? WHERE id = ?", (self._encrypt(fields, self._account_row(mail_index)), account_id))
+            self.connection.execute("DELETE FROM entries WHERE account_id = ?", (account_id,))
+        for name, entry in account.get("passwords", {}).items():
+            self._write_entry(account_id, name, entry)
+
+def import_vault(filename: str, database: str, password: str) -> int:
+    """
+    Converts an existing vault file (e.g. data.json) into a SQLite vault.
+
+    :param filename: The name of the vault file to import.
+    :param database: The name of the database file; accounts that already exist in it are replaced.
+    :param password: The password of the vault; the database is encrypted with the same password.
+    :return: The number of imported accounts.
+    """
+    accounts = migrated_vault(load_vault(filename, password))["accounts"]
+    vault = SqliteVault(database, password)
+    try:
+        with vault.connection:
+            for mail, account in accounts.items():
+                vault._register_account(mail, account)  # pylint: disable=protected-access
+    finally:
+        vault.close()
+    return len(accounts)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import a vault file into a SQLite vault.")
+    parser.add_argument("filename", help="the vault file to import, e.g. data.json")
+    parser.add_argument("database", help="the SQLite database file")
+    parser.add_argument("--password", default="oTclmO]dh}[QyM'i", help="the password of the vault")
+    arguments = parser.parse_args()
+    count = import_vault(arguments.filename, arguments.database, arguments.password)
+    print(f"{count} Accounts nach {arguments.database} importiert.")
@@ -0,0 +1,503 @@
+"""
+This module provides cached access to the encrypted vault file (data.json).
+
+Decrypting the vault costs a full key derivation plus an AES decrypt and a JSON parse, so the
+decrypted dictionary is kept in a process-wide cache. Snapshots of at least MMAP_LOAD_MIN_SIZE bytes
+are loaded through a memory map (see source.data_cryptography.load_encrypted_dict_mmap), which saves
+the copies of the file contents; smaller ones are read, where the mapping costs more than it saves. A cache entry is keyed by the file's
+inode, size and modification time and is dropped as soon as another writer touches the file.
+A load hands out the cached dictionary itself, so a cache hit costs O(1); it must be treated as
+read-only. The mutation paths (transactions and journal records) work on copies, and a cached
+dictionary is never changed in place: a record replaces it with a copy of the changed path.
+
+Single changes are appended to the vault's journal (see source.vault_journal) instead of rewriting
+the whole file; loading replays the journal on top of the snapshot, and once the journal grows past
+COMPACT_JOURNAL_RECORDS records or COMPACT_JOURNAL_BYTES bytes it is folded into a new snapshot in
+a background thread.
+
+Several processes may share one vault. Every vault has a version: the counter in the snapshot header
+plus the number of records in its journal; it grows by one with every commit. Readers never lock;
+they retry a load if the files changed underneath it. Writers hold an advisory fcntl lock on
+'<vault>.lock' only while they commit. A commit that names the version its change was based on
+is refused with StaleVaultError once another writer got in first, and update_vault and
+update_vault_record re-run the mutation on the fresh vault until it applies.
+
+A vault whose header names other KDF parameters than the current default (see
+source.key_derivation.set_default_kdf) is rehashed with the default KDF the first time
+it is unlocked, so old vaults are upgraded without any action by the user. For vaults with key
+slots only the key slot of the password is re-wrapped; older vaults are rewritten once.
+
+The module includes functions to:
+- Load the vault through the cache.
+- Save the vault and refresh the cache entry, so the next load does not decrypt the file again.
+- Invalidate the cache.
+- Group any number of mutations into one transaction that loads once and commits with a single atomic write.
+- Append a single mutation record to the journal and compact the journal into a new snapshot.
+- Read the version of a vault, lock a vault for a commit and retry a mutation that was based on a stale version.
+- Change or add a password of a vault by rewriting its key slots only.
+"""
+import copy
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Iterator, Optional
+from source.data_cryptography import load_encrypted_dict_from_file, load_encrypted_dict_mmap, save_encrypted_dict_to_file, read_container_header, change_password
+from source.key_derivation import password_fingerprint
+from source.authenticated_encryption import needs_rehash
+from source.vault_journal import journal_filename, apply_record, copy_for_record, append_record, read_records, count_records
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # type: ignore
+
+COMPACT_JOURNAL_RECORDS = 100
+COMPACT_JOURNAL_BYTES = 256 * 1024
+LOCK_SUFFIX = ".lock"
+LOAD_ATTEMPTS = 5
+UPDATE_ATTEMPTS = 20
+MMAP_LOAD_MIN_SIZE = 1024 * 1024
+
+_vault_cache: dict[str, tuple[tuple, bytes, Any, int, int]] = {}
+_vault_cache_lock = threading.Lock()
+_path_locks: dict[str, threading.RLock] = {}
+_path_locks_lock = threading.Lock()
+_file_locks: dict[str, list] = {}
+_compactions: dict[str, threading.Thread] = {}
+_active_transactions = threading.local()
+
+class StaleVaultError(Exception):
+    """
+    Raised when a commit is based on a vault version that another writer has already replaced.
+    """
+
+class VaultBusyError(Exception):
+    """
+    Raised when a vault changed while it was loaded under its lock, i.e. a writer did not take the lock.
+    """
+
+def lock_filename(filename: str) -> str:
+    """
+    Returns the name of the lock file that belongs to a vault file.
+
+    :param filename: The name of the vault file.
+    :return: The name of the lock file.
+    """
+    return filename + LOCK_SUFFIX
+
+@contextmanager
+def vault_lock(filename: str) -> Iterator[None]:
+    """
+    Holds the commit lock of a vault: a lock of the vault against the other threads of this process and an exclusive
+    advisory fcntl lock on the vault's lock file against other processes. The lock is re-entrant within a thread, and
+    commits to different vaults do not wait for each other. Without fcntl (e.g. on Windows) only threads of this process are excluded.
+
+    :param filename: The name of the vault file.
+    """
+    path = os.path.abspath(filename)
+    with _path_locks_lock:
+        path_lock = _path_locks.setdefault(path, threading.RLock())
+    with path_lock:
+        held = _file_locks.get(path)
+        if held is None:
+            lock_file = open(lock_filename(path), 'a+b')
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            held = _file_locks[path] = [lock_file, 0]
+        held[1] += 1
+        try:
+            yield
+        finally:
+            held[1] -= 1
+            if held[1] == 0:
+                del _file_locks[path]
+                held[0].close()
+
+def _snapshot_header(path: str) -> dict:
+    """
+    Reads the header fields of a vault snapshot without decrypting it.
+
+    :param path: The path of the vault file.
+    :return: The header fields, e.g. the version counter and the KDF parameters.
+    """
+    with open(path, 'rb') as file:
+        return read_container_header(file)
+
+def _load_snapshot(path: str, password: str, stats: Optional[dict]) -> Any:
+    """
+    Decrypts a vault snapshot, through a memory map if it has at least MMAP_LOAD_MIN_SIZE bytes.
+
+    :param path: The path of the vault file.
+    :param password: The password of the vault.
+    :param stats: An optional dictionary that receives "kdf_seconds" and "cipher_seconds".
+    :return: The decrypted dictionary.
+    """
+    if os.path.getsize(path) >= MMAP_LOAD_MIN_SIZE:
+        return load_encrypted_dict_mmap(path, password, stats=stats)
+    return load_encrypted_dict_from_file(path, password, stats=stats)
+
+def _snapshot_version(path: str) -> int:
+    """
+    Reads the version counter from the header of a vault snapshot without decrypting it.
+
+    :param path: The path of the vault file.
+    :return: The version of the snapshot, 0 for files written before versions were introduced.
+    """
+    return int(_snapshot_header(path).get("version", 0))
+
+def vault_version(filename: str) -> int:
+    """
+    Returns the current version of a vault: the version of its snapshot plus the number of records in its journal.
+    Nothing is decrypted, so this is cheap enough to be checked before every commit.
+
+    :param filename: The name of the vault file.
+    :return: The version of the vault, or 0 if the file does not exist.
+    """
+    path = os.path.abspath(filename)
+    try:
+        return _snapshot_version(path) + count_records(path)
+    except FileNotFoundError:
+        return 0
+
+def _file_signature(filename: str) -> tuple[int, int, int]:
+    """
+    Returns the (inode, size, mtime_ns) signature of a file, which changes whenever the file is rewritten.
+
+    :param filename: The path of the file.
+    :return: The signature of the file.
+    """
+    stat = os.stat(filename)
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+def _vault_signature(path: str) -> tuple:
+    """
+    Returns the signature of a vault, made of the signatures of its snapshot and its journal.
+
+    :param path: The absolute path of the vault file.
+    :return: The signature of the vault.
+    """
+    try:
+        journal_signature: Optional[tuple[int, int, int]] = _file_signature(journal_filename(path))
+    except FileNotFoundError:
+        journal_signature = None
+    return (_file_signature(path), journal_signature)
+
+def load_vault(filename: str, password: str, stats: Optional[dict] = None) -> Any:
+    """
+    Loads the decrypted vault, decrypting the file only if it changed since it was last loaded or saved.
+    The records of the vault's journal are replayed on top of the snapshot.
+
+    The dictionary is shared with the cache and must not be mutated; use vault_transaction, update_vault or
+    update_vault_record to change the vault, or copy.deepcopy it to get a private copy.
+
+    :param filename: The name of the file containing the encrypted vault.
+    :param password: The password used to derive the decryption key.
+    :param stats: An optional dictionary that receives the KDF and cipher timings if the file is decrypted.
+    :return: The decrypted dictionary.
+    """
+    return load_vault_versioned(filename, password, stats=stats)[0]
+
+def load_vault_versioned(filename: str, password: str, stats: Optional[dict] = None) -> tuple[Any, int]:
+    """
+    Loads the decrypted vault like load_vault and also returns the version it was loaded at.
+
+    The load takes no lock. If another process commits while the snapshot and journal are read, the
+    load is repeated (up to LOAD_ATTEMPTS times), so the returned dictionary and version belong together;
+    if a commit overlaps every attempt, the vault is loaded once more under its lock (see vault_lock),
+    which holds the writers back, so a busy vault delays the load but does not make it fail.
+    A vault written with other KDF parameters than the default is re-encrypted with the default KDF
+    (rehash on unlock); if another writer commits first or the file cannot be written, it stays as it is.
+
+    :param filename: The name of the file containing the encrypted vault.
+    :param password: The password used to derive the decryption key.
+    :param stats: An optional dictionary that receives the KDF and cipher timings if the file is decrypted.
+    :return: The tuple (decrypted dictionary, version).
+    :raises VaultBusyError: If the vault changed even while it was loaded under its lock (a writer that ignores the lock).
+    """
+    path = os.path.abspath(filename)
+    fingerprint = password_fingerprint(password)
+    for attempt in range(LOAD_ATTEMPTS + 1):
+        locked = attempt == LOAD_ATTEMPTS
+        with vault_lock(path) if locked else nullcontext():
+            signature = _vault_signature(path)
+            with _vault_cache_lock:
+                cached = _vault_cache.get(path)
+            if cached is not None and cached[0] == signature and cached[1] == fingerprint:
+                return cached[2], cached[4]
+            try:
+                header = _snapshot_header(path)
+                version = int(header.get("version", 0))
+                data = _load_snapshot(path, password, stats)
+            except FileNotFoundError:
+                if attempt >= LOAD_ATTEMPTS - 1:
+                    raise
+                continue
+            except ValueError:
+                # The file can be replaced (e.g. by change_vault_password) between reading its header and its ciphertext.
+                if locked or _vault_signature(path) == signature:
+                    raise
+                continue
+            records = read_records(path, password)
+            for record in records:
+                apply_record(data, record)
+            version += len(records)
+            if _vault_signature(path) == signature:
+                with _vault_cache_lock:
+                    _vault_cache[path] = (signature, fingerprint, data, len(records), version)
+                if needs_rehash(header, password):
+                    try:
+                        version = _rehash_vault(data, path, password, header, version)
+                    except (StaleVaultError, OSError):
+                        pass
+                return data, version
+    raise VaultBusyError(f"{filename} changed while it was loaded under its lock")
+
+def _rehash_vault(data: Any, path: str, password: str, header: dict, version: int) -> int:
+    """
+    Rehashes a vault with the default KDF after it was unlocked: re-wraps the key slot of the password
+    in the header, or rewrites a vault without key slots as a new snapshot.
+
+    :param data: The loaded vault dictionary.
+    :param path: The absolute path of the vault file.
+    :param password: The password the vault was unlocked with.
+    :param header: The header fields of the loaded snapshot.
+    :param version: The version the vault was loaded at.
+    :return: The version of the vault after the rehash.
+    :raises StaleVaultError: If another writer committed in the meantime.
+    """
+    if "keys" not in header:
+        return save_vault(data, path, password, base_version=version)
+    with vault_lock(path):
+        if vault_version(path) != version:
+            raise StaleVaultError(f"{path} changed before it could be rehashed")
+        change_password(path, password, password)
+        with _vault_cache_lock:
+            _vault_cache[path] = (_vault_signature(path), password_fingerprint(password), data, count_records(path), version)
+    return version
+
+def change_vault_password(filename: str, password: str, new_password: str, keep_old: bool = False) -> None:
+    """
+    Changes (or with keep_old adds) a password of the vault under the vault lock. Only the key slots in the header
+    change: the vault is not decrypted or re-encrypted, but its ciphertext is copied once to replace the file atomically,
+    so the cost is a copy of the vault. The version of the vault stays the same.
+    A vault without key slots is first saved once as a snapshot with a data key.
+
+    :param filename: The name of the vault file.
+    :param password: A password that opens the vault.
+    :param new_password: The new password.
+    :param keep_old: Whether the old password keeps working.
+    :raises ValueError: If the password does not open the vault.
+    """
+    path = os.path.abspath(filename)
+    with vault_lock(path):
+        if "keys" not in _snapshot_header(path):
+            save_vault(load_vault(path, password), path, password)
+        invalidate_vault_cache(path)
+        change_password(path, password, new_password, keep_old=keep_old)
+
+def save_vault(data_dict: dict, filename: str, password: str, stats: Optional[dict] = None, base_version: Optional[int] = None) -> int:
+    """
+    Encrypts and saves the vault as a new snapshot, drops the journal it supersedes and stores the saved dictionary in the cache.
+    The snapshot is written under the vault lock and gets the next version.
+
+    :param data_dict: The dictionary to be encrypted and saved.
+    :param filename: The name of the file to save the encrypted vault to.
+    :param password: The password used to derive the encryption key.
+    :param stats: An optional dictionary that receives the KDF and cipher timings and the number of bytes written.
+    :param base_version: The version the dictionary was loaded at, or None to overwrite the vault unconditionally.
+    :return: The new version of the vault.
+    :raises StaleVaultError: If the vault is no longer at base_version.
+    """
+    path = os.path.abspath(filename)
+    invalidate_vault_cache(path)
+    with vault_lock(path):
+        current_version = vault_version(path)
+        if base_version is not None and base_version != current_version:
+            raise StaleVaultError(f"{filename} is at version {current_version}, not {base_version}")
+        new_version = current_version + 1
+        save_encrypted_dict_to_file(data_dict, path, password, stats=stats, version=new_version)
+        try:
+            os.remove(journal_filename(path))
+        except FileNotFoundError:
+            pass
+        with _vault_cache_lock:
+            _vault_cache[path] = (_vault_signature(path), password_fingerprint(password), copy.deepcopy(data_dict), 0, new_version)
+    return new_version
+
+def invalidate_vault_cache(filename: Optional[str] = None) -> None:
+    """
+    Drops the cache entry of a vault file, or every cache entry if no file is given.
+
+    :param filename: The name of the vault file, or None to clear the whole cache.
+    """
+    with _vault_cache_lock:
+        if filename is None:
+            _vault_cache.clear()
+        else:
+            _vault_cache.pop(os.path.abspath(filename), None)
+
+@contextmanager
+def vault_transaction(filename: str, password: str, stats: Optional[dict] = None) -> Iterator[Any]:
+    """
+    Loads the vault once, yields it for any number of mutations and commits it with one atomic write.
+
+    Nothing is written if the block raises. A transaction that is opened while another transaction on
+    the same file is active in this thread joins the outer one, so helpers that open their own
+    transaction can be batched by wrapping them in an outer one. The commit fails with StaleVaultError
+    if another writer committed since the vault was loaded; use update_vault to retry automatically.
+
+    :param filename: The name of the file containing the encrypted vault.
+    :param password: The password used for the vault.
+    :param stats: An optional dictionary that receives "kdf_seconds", "cipher_seconds", "bytes_written" and "total_seconds".
+    :return: The decrypted dictionary (a private copy), to be mutated in place.
+    """
+    path = os.path.abspath(filename)
+    active = _active_transactions.__dict__.setdefault("vaults", {})
+    if path in active:
+        yield active[path]
+        return
+    start = time.perf_counter()
+    data, version = load_vault_versioned(path, password, stats=stats)
+    data = copy.deepcopy(data)
+    active[path] = data
+    try:
+        yield data
+    finally:
+        del active[path]
+    save_vault(data, path, password, stats=stats, base_version=version)
+    if stats is not None:
+        stats["total_seconds"] = time.perf_counter() - start
+
+def append_vault_record(filename: str, password: str, record: dict, base_version: Optional[int] = None) -> int:
+    """
+    Applies a single mutation record (see source.vault_journal.apply_record) to the vault by appending it to the journal.
+
+    Inside an active vault_transaction on the same file the record is applied to the transaction's
+    dictionary instead and written with its commit. Once the journal exceeds the compaction
+    thresholds, a background compaction is started.
+
+    :param filename: The name of the vault file.
+    :param password: The password used for the vault.
+    :param record: The mutation record.
+    :param base_version: The version the record was built from, or None to append it to whatever version is current.
+    :return: The new version of the vault (within a transaction: the version the transaction was loaded at).
+    :raises StaleVaultError: If the vault is no longer at base_version.
+    """
+    path = os.path.abspath(filename)
+    active = _active_transactions.__dict__.setdefault("vaults", {})
+    if path in active:
+        apply_record(active[path], record)
+        return base_version or 0
+    fingerprint = password_fingerprint(password)
+    with vault_lock(path):
+        record_count = count_records(path)
+        current_version = _snapshot_version(path) + record_count
+        if base_version is not None and base_version != current_version:
+            raise StaleVaultError(f"{filename} is at version {current_version}, not {base_version}")
+        signature = _vault_signature(path)
+        journal_size = append_record(path, password, record)
+        record_count += 1
+        with _vault_cache_lock:
+            cached = _vault_cache.pop(path, None)
+            if cached is not None and cached[0] == signature and cached[1] == fingerprint:
+                data = copy_for_record(cached[2], record)
+                apply_record(data, record)
+                _vault_cache[path] = (_vault_signature(path), fingerprint, data, record_count, current_version + 1)
+    if record_count >= COMPACT_JOURNAL_RECORDS or journal_size >= COMPACT_JOURNAL_BYTES:
+        _start_background_compaction(path, password)
+    return current_version + 1
+
+def update_vault(filename: str, password: str, mutate: Callable[[Any], Any], attempts: int = UPDATE_ATTEMPTS) -> Any:
+    """
+    Runs a mutation on the vault in a vault_transaction and re-runs it on the fresh vault whenever
+    another writer committed first, until it commits.
+
+    :param filename: The name of the vault file.
+    :param password: The password used for the vault.
+    :param mutate: A function that mutates the vault dictionary in place; it may run more than once.
+    :param attempts: The maximum number of attempts.
+    :return: The return value of the mutation that was committed.
+    :raises StaleVaultError: If the mutation did not commit within the given attempts.
+    """
+    for attempt in range(attempts):
+        try:
+            with vault_transaction(filename, password) as data:
+                result = mutate(data)
+            return result
+        except StaleVaultError:
+            if attempt == attempts - 1:
+                raise
+    raise StaleVaultError(filename)
+
+def update_vault_record(filename: str, password: str, build_record: Callable[[Any], dict], attempts: int = UPDATE_ATTEMPTS) -> Any:
+    """
+    Builds a mutation record from the current vault and appends it to the journal. If another writer
+    committed in between, the record is built again from the fresh vault, until it is appended.
+
+    :param filename: The name of the vault file.
+    :param password: The password used for the vault.
+    :param build_record: A function that returns the mutation record for a vault dictionary, which it must not mutate; it may run more than once.
+    :param attempts: The maximum number of attempts.
+    :return: The vault dictionary with the record applied (a copy of the changed path, see source.vault_journal.copy_for_record).
+    :raises StaleVaultError: If the record was not appended within the given attempts.
+    """
+    path = os.path.abspath(filename)
+    active = _active_transactions.__dict__.setdefault("vaults", {})
+    if path in active:
+        apply_record(active[path], build_record(active[path]))
+        return copy.deepcopy(active[path])
+    for attempt in range(attempts):
+        data, version = load_vault_versioned(path, password)
+        record = build_record(data)
+        try:
+            append_vault_record(path, password, record, base_version=version)
+        except StaleVaultError:
+            if attempt == attempts - 1:
+                raise
+            continue
+        data = copy_for_record(data, record)
+        apply_record(data, record)
+        return data
+    raise StaleVaultError(filename)
+
+def compact_vault(filename: str, password: str) -> None:
+    """
+    Folds the journal of the vault into a new snapshot and drops the journal.
+
+    :param filename: The name of the vault file.
+    :param password: The password used for the vault.
+    """
+    path = os.path.abspath(filename)
+    with vault_lock(path):
+        if os.path.exists(journal_filename(path)):
+            data, version = load_vault_versioned(path, password)
+            save_vault(data, path, password, base_version=version)
+
+def _start_background_compaction(path: str, password: str) -> None:
+    """
+    Starts compact_vault in a background thread unless a compaction of the vault is already running.
+
+    :param path: The absolute path of the vault file.
+    :param password: The password used for the vault.
+    """
+    with _vault_cache_lock:
+        running = _compactions.get(path)
+        if running is not None and running.is_alive():
+            return
+        thread = threading.Thread(target=compact_vault, args=(path, password), name="vault-compaction", daemon=True)
+        _compactions[path] = thread
+    thread.start()
+
+def wait_for_compaction(filename: Optional[str] = None) -> None:
+    """
+    Waits until the background compaction of the vault, or of every vault, has finished.
+
+    :param filename: The name of the vault file, or None to wait for all compactions.
+    """
+    with _vault_cache_lock:
+        if filename is None:
+            threads = list(_compactions.values())
+        else:
+            threads = [thread for thread in [_compactions.get(os.path.abspath(filename))] if thread is not None]
+    for thread in threads:
+        thread.join()
@@ -0,0 +1,568 @@
+"""
+This module provides the storage backends the password manager reads and writes its vault through.
+
+Every backend implements the VaultStore interface: load the whole vault in the layout of data.json
+(schema 4, see source.vault_schema; vaults of older schemas are migrated when they are loaded),
+save a whole vault, apply the mutation records of source.vault_journal.apply_record, list the entry
+names of an account, read a single entry or the history salt of an account (by default from the loaded vault). The screens
+in source.password_manager only talk to the store returned by get_store(), so they no longer depend
+on a file name or a password.
+
+Backends:
+- "file": the encrypted vault file with its journal (source.vault_storage); the default, on './data.json'.
+- "memory": a plain dictionary in memory, without key derivation or encryption, for tests and benchmarks.
+- "sharded": one encrypted file per account in a directory (source.vault_shards).
+- "sqlite": a SQLite database with per-row encryption (source.vault_sqlite).
+- "envelope": an envelope vault with one encrypted record per entry (source.vault_records); listing the names
+  of an account or reading its history salt decrypts only the index, and reading an entry only its record.
+
+The backend is selected by configuration: configure_store() with an explicit store, or the environment
+variables PASSWORD_MANAGER_BACKEND (backend name), PASSWORD_MANAGER_VAULT (file, directory or
+database) and PASSWORD_MANAGER_PASSWORD (vault password), which are read the first time get_store() is called.
+
+Every store also keeps the indexes of source.vault_index: a LastChangeIndex of the entries by the date
+of their last change, a HistoryIndex of the passwords used in every account and a PrefixIndex of the
+entry names for lookups by partial name. They are built from the vault on first use and updated with
+the records applied through the store. The history hashes that are cut from the entries go to the
+store's HistoryArchive (source.history_archive), next to the vault.
+
+Unlocking a vault costs a full key derivation. warm_up_store() starts it in a background thread as soon
+as the program starts (the cryptography package releases the GIL while it derives), and get_store()
+waits for that thread, so the first screen that needs the vault only waits for the work that is left.
+"""
+import copy
+import os
+import threading
+from typing import Any, Callable, Optional, TypeVar, cast
+from source.vault_journal import apply_record, copy_for_record
+from source.vault_storage import load_vault, load_vault_versioned, save_vault, append_vault_record, update_vault_record, vault_version
+from source import vault_shards
+from source.vault_sqlite import SqliteVault
+from source.vault_records import EnvelopeVault, create_envelope_vault
+from source.vault_schema import SCHEMA_VERSION, empty_vault, migrate_account, migrate_vault, migrated_vault
+from source.vault_index import LastChangeIndex, HistoryIndex, PrefixIndex
+from source.history_archive import HistoryArchive, archive_filename
+from source.password_history import account_salt
+
+DEFAULT_BACKEND = "file"
+DEFAULT_VAULT_PASSWORD = "oTclmO]dh}[QyM'i"
+DEFAULT_LOCATIONS = {"file": "./data.json", "sharded": "./vault", "sqlite": "./data.db", "envelope": "./data.envelope.json"}
+
+INDEX_TYPES = (LastChangeIndex, HistoryIndex, PrefixIndex)
+IndexT = TypeVar("IndexT", LastChangeIndex, HistoryIndex, PrefixIndex)
+
+
+class VaultStore:
+    """
+    The interface of a vault storage backend.
+    """
+    archive: HistoryArchive
+    _indexes: Optional[dict[type, Any]] = None
+
+    def exists(self) -> bool:
+        """
+        Returns whether the vault has been created.
+
+        :return: True if the vault exists.
+        """
+        raise NotImplementedError
+
+    def load(self) -> Any:
+        """
+        Loads the whole vault. The dictionary may be shared with a cache of the backend and must not be
+        mutated; changes go through apply or update.
+
+        :return: The vault dictionary in the layout of data.json.
+        """
+        raise NotImplementedError
+
+    def save(self, data_dict: dict) -> None:
+        """
+        Replaces the whole vault.
+
+        :param data_dict: The vault dictionary in the layout of data.json.
+        """
+        raise NotImplementedError
+
+    def apply(self, record: dict) -> None:
+        """
+        Applies a single mutation record (see source.vault_journal.apply_record).
+
+        :param record: The mutation record.
+        """
+        raise NotImplementedError
+
+    def update(self, build_record: Callable[[Any], dict]) -> Any:
+        """
+        Builds a mutation record from the current vault and applies it.
+
+        :param build_record: A function that returns the mutation record for a vault dictionary.
+        :return: The vault dictionary with the record applied.
+        """
+        data = self.load()
+        record = build_record(data)
+        self.apply(record)
+        data = copy_for_record(data, record)
+        apply_record(data, record)
+        return data
+
+    def list_names(self, mail: str) -> list[str]:
+        """
+        Returns the entry names of an account in the order they were added.
+
+        :param mail: The mail of the account.
+        :return: The names.
+        :raises KeyError: If there is no such account.
+        """
+        return list(self.load()["accounts"][mail]["passwords"])
+
+    def get_entry(self, mail: str, name: str) -> Any:
+        """
+        Returns a single entry of an account. Like the result of load, it must not be mutated.
+
+        :param mail: The mail of the account.
+        :param name: The name of the entry.
+        :return: The entry dictionary in the layout of data.json.
+        :raises KeyError: If there is no such account or entry.
+        """
+        return self.load()["accounts"][mail]["passwords"][name]
+
+    def history_salt(self, mail: str) -> bytes:
+        """
+        Returns the history salt of an account (see source.password_history.account_salt).
+
+        :param mail: The mail of the account.
+        :return: The salt.
+        :raises KeyError: If there is no such account.
+        """
+        return account_salt(self.load()["accounts"][mail])
+
+    def create(self) -> None:
+        """
+        Creates an empty vault unless the vault already exists.
+        """
+        if not self.exists():
+            self.save(empty_vault())
+
+    def _index(self, index_type: type[IndexT]) -> IndexT:
+        """
+        Returns one of the indexes of INDEX_TYPES. They are built from the vault on first use and kept
+        up to date with the records applied through this store.
+
+        :param index_type: The class of the index.
+        :return: The index.
+        """
+        if self._indexes is None:
+            data = self.load()
+            self._indexes = {kind: kind.from_vault(data) for kind in INDEX_TYPES}
+        return cast(IndexT, self._indexes[index_type])
+
+    def _index_record(self, record: dict) -> None:
+        """
+        Updates the indexes, if they have been built, with a record applied through this store.
+
+        :param record: The mutation record.
+        """
+        if self._indexes is not None:
+            for index in self._indexes.values():
+                index.apply_record(record)
+
+    def last_change_index(self) -> LastChangeIndex:
+        """
+        Returns the index of the entries by the date of their last change.
+
+        :return: The index.
+        """
+        return self._index(LastChangeIndex)
+
+    def history_index(self) -> HistoryIndex:
+        """
+        Returns the index of the current passwords and history hashes of every account.
+
+        :return: The index.
+        """
+        return self._index(HistoryIndex)
+
+    def prefix_index(self) -> PrefixIndex:
+        """
+        Returns the index of the entry names of every account by prefix.
+
+        :return: The index.
+        """
+        return self._index(PrefixIndex)
+
+    def password_was_used(self, mail: str, password: str) -> bool:
+        """
+        Returns whether a password is or was used for any entry of an account, including the archived history.
+        Both lookups are O(1); the archive is only read when it changed.
+
+        :param mail: The mail of the account.
+        :param password: The password.
+        :return: True if the password is or was used in the account.
+        :raises KeyError: If there is no such account.
+        """
+        index = self.history_index()
+        return index.was_used(mail, password) or self.archive.contains(mail, index.history_hash(mail, password))
+
+    def archive_history(self, mail: str, hashes: list[str]) -> None:
+        """
+        Moves history hashes that were cut from an entry of an account to the archive.
+
+        :param mail: The mail of the account.
+        :param hashes: The hashes.
+        """
+        self.archive.add(mail, hashes)
+
+    def warm_up(self) -> None:
+        """
+        Does the expensive part of unlocking the vault (reading the header and deriving the key) ahead of the first load.
+        The default loads the vault once, which fills the key cache and the vault cache.
+        """
+        if self.exists():
+            self.load()
+
+class FileVaultStore(VaultStore):
+    """
+    Stores the vault in an encrypted file with a journal, through the cache of source.vault_storage.
+    The indexes remember the vault version they belong to and are built again if another writer
+    committed in the meantime. A vault of an older schema is migrated once per dictionary of the vault
+    cache: the migrated copy is kept until the cache hands out another dictionary (see _migrated).
+    """
+
+    def __init__(self, filename: str, password: str) -> None:
+        """
+        :param filename: The name of the vault file.
+        :param password: The password of the vault.
+        """
+        self.filename = filename
+        self.password = password
+        self.archive = HistoryArchive(archive_filename(filename), password)
+        self._index_version = 0
+        self._migration: tuple[Any, Any] = (None, None)
+
+    def _migrated(self, data: Any) -> Any:
+        """
+        Returns a vault from the vault cache migrated to the current schema (see source.vault_schema.migrated_vault).
+        The cache hands out the same dictionary for as long as the file keeps its signature, so the migrated
+        copy of the last dictionary is reused instead of migrating the whole vault again on every load.
+
+        :param data: The vault dictionary returned by the vault cache.
+        :return: The vault dictionary of the current schema; it must not be mutated.
+        """
+        source, migrated = self._migration
+        if source is not data:
+            migrated = migrated_vault(data)
+            self._migration = (data, migrated)
+        return migrated
+
+    def exists(self) -> bool:
+        return os.path.exists(self.filename)
+
+    def load(self) -> Any:
+        return self._migrated(load_vault(self.filename, self.password))
+
+    def save(self, data_dict: dict) -> None:
+        save_vault(data_dict, self.filename, self.password)
+        self._indexes = None
+
+    def apply(self, record: dict) -> None:
+        self._index_commit(record, append_vault_record(self.filename, self.password, record))
+
+    def update(self, build_record: Callable[[Any], dict]) -> Any:
+        records = []
+
+        def build(data: Any) -> dict:
+            records.append(build_record(self._migrated(data)))
+            return records[-1]
+
+        data = update_vault_record(self.filename, self.password, build)
+        self._index_commit(records[-1], vault_version(self.filename))
+        return data
+
+    def _index(self, index_type: type[IndexT]) -> IndexT:
+        if self._indexes is None or self._index_version != vault_version(self.filename):
+            data, self._index_version = load_vault_versioned(self.filename, self.password)
+            data = self._migrated(data)
+            self._indexes = {kind: kind.from_vault(data) for kind in INDEX_TYPES}
+        return cast(IndexT, self._indexes[index_type])
+
+    def _index_commit(self, record: dict, version: int) -> None:
+        """
+        Updates the indexes with a record this store committed as the given version. If the indexes
+        are not at the version before, another writer committed too and they are dropped.
+
+        :param record: The mutation record.
+        :param version: The version of the vault after the commit.
+        """
+        if self._indexes is not None and self._index_version == version - 1:
+            self._index_record(record)
+            self._index_version = version
+        else:
+            self._indexes = None
+
+class MemoryVaultStore(VaultStore):
+    """
+    Keeps the vault as a plain dictionary in memory. Nothing is derived, encrypted or written,
+    so code that uses the vault can be tested and measured without the cost of the KDF.
+    """
+
+    def __init__(self, data_dict: Optional[dict] = None) -> None:
+        """
+        :param data_dict: The initial vault dictionary, or None for a vault that does not exist yet.
+        """
+        self.data = migrate_vault(copy.deepcopy(data_dict)) if data_dict is not None else None
+        self.archive = HistoryArchive(None, "")
+
+    def exists(self) -> bool:
+        return self.data is not None
+
+    def load(self) -> Any:
+        return self.data
+
+    def save(self, data_dict: dict) -> None:
+        self.data = migrate_vault(copy.deepcopy(data_dict))
+        self._indexes = None
+
+    def apply(self, record: dict) -> None:
+        if self.data is None:
+            raise FileNotFoundError("The in-memory vault has not been saved yet")
+        record = copy.deepcopy(record)
+        self.data = copy_for_record(self.data, record)
+        apply_record(self.data, record)
+        self._index_record(record)
+
+    def warm_up(self) -> None:
+        pass
+
+class ShardedVaultStore(VaultStore):
+    """
+    Stores every account in its own encrypted file (see source.vault_shards); a change only rewrites the shard of its account.
+    """
+
+    def __init__(self, directory: str, password: str) -> None:
+        """
+        :param directory: The directory of the sharded vault.
+        :param password: The password of the vault.
+        """
+        self.directory = directory
+        self.password = password
+        self.archive = HistoryArchive(archive_filename(directory), password)
+
+    def exists(self) -> bool:
+        return os.path.exists(os.path.join(self.directory, vault_shards.INDEX_FILENAME))
+
+    def load(self) -> Any:
+        return vault_shards.load_sharded_vault(self.directory, self.password)
+
+    def save(self, data_dict: dict) -> None:
+        vault_shards.create_sharded_vault(self.directory, self.password)
+        accounts = migrate_vault(copy.deepcopy(data_dict))["accounts"]
+        for mail, account in accounts.items():
+            vault_shards.register_account(self.directory, self.password, mail, account)
+        for mail in list(vault_shards.load_shard_index(self.directory, self.password)["shards"]):
+            if mail not in accounts:
+                vault_shards.remove_account(self.directory, self.password, mail)
+        self._indexes = None
+
+    def apply(self, record: dict) -> None:
+        mail = record["mail"]
+        if record["op"] == "register_account":
+            vault_shards.register_account(self.directory, self.password, mail, record["account"])
+        else:
+            with vault_shards.account_transaction(self.directory, self.password, mail) as account:
+                apply_record({"schema": SCHEMA_VERSION, "accounts": {mail: migrate_account(account)}}, record)
+        self._index_record(record)
+
+class SqliteVaultStore(VaultStore):
+    """
+    Stores the vault in a SQLite database with per-row encryption (see source.vault_sqlite).
+    """
+
+    def __init__(self, filename: str, password: str) -> None:
+        """
+        :param filename: The name of the database file.
+        :param password: The password of the vault.
+        """
+        self.filename = filename
+        self.password = password
+        self.archive = HistoryArchive(archive_filename(filename), password)
+        self._vault: Optional[SqliteVault] = None
+
+    def _open(self) -> SqliteVault:
+        """
+        Opens the database on first use and keeps the connection for later calls.
+
+        :return: The opened SQLite vault.
+        """
+        if self._vault is None:
+            self._vault = SqliteVault(self.filename, self.password)
+        return self._vault
+
+    def exists(self) -> bool:
+        return os.path.exists(self.filename)
+
+    def load(self) -> Any:
+        return self._open().to_dict()
+
+    def save(self, data_dict: dict) -> None:
+        self._open().replace_accounts(migrate_vault(copy.deepcopy(data_dict))["accounts"])
+        self._indexes = None
+
+    def apply(self, record: dict) -> None:
+        self._open().apply_record(record)
+        self._index_record(record)
+
+    def warm_up(self) -> None:
+        # A SQLite connection may only be used by the thread that opened it, so the
+        # vault is opened and closed again here; the derived key stays in the key cache.
+        if self.exists():
+            SqliteVault(self.filename, self.password).close()
+
+class EnvelopeVaultStore(VaultStore):
+    """
+    Stores the vault as an envelope vault (see source.vault_records). Listing the names of an account
+    decrypts only the index and reading an entry only its record; a change encrypts only the records it
+    touches and writes the file atomically.
+    """
+
+    def __init__(self, filename: str, password: str) -> None:
+        """
+        :param filename: The name of the envelope vault file.
+        :param password: The password of the vault.
+        """
+        self.filename = filename
+        self.password = password
+        self.archive = HistoryArchive(archive_filename(filename), password)
+        self._vault: Optional[EnvelopeVault] = None
+
+    def _open(self) -> EnvelopeVault:
+        """
+        Opens the vault on first use and keeps its decrypted index for later calls.
+
+        :return: The opened envelope vault.
+        """
+        if self._vault is None:
+            self._vault = EnvelopeVault(self.filename, self.password)
+        return self._vault
+
+    def exists(self) -> bool:
+        return os.path.exists(self.filename)
+
+    def load(self) -> Any:
+        return self._open().to_dict()
+
+    def save(self, data_dict: dict) -> None:
+        self._vault = create_envelope_vault(data_dict, self.filename, self.password)
+        self._indexes = None
+
+    def apply(self, record: dict) -> None:
+        vault = self._open()
+        vault.apply_record(record)
+        vault.save()
+        self._index_record(record)
+
+    def list_names(self, mail: str) -> list[str]:
+        return self._open().list_names(mail)
+
+    def get_entry(self, mail: str, name: str) -> Any:
+        return self._open().get_entry(mail, name)
+
+    def history_salt(self, mail: str) -> bytes:
+        return self._open().history_salt(mail)
+
+BACKENDS: dict[str, Callable[[str, str], VaultStore]] = {
+    "file": FileVaultStore,
+    "memory": lambda location, password: MemoryVaultStore(),
+    "sharded": ShardedVaultStore,
+    "sqlite": SqliteVaultStore,
+    "envelope": EnvelopeVaultStore,
+}
+
+def create_store(backend: str = DEFAULT_BACKEND, location: Optional[str] = None, password: str = DEFAULT_VAULT_PASSWORD) -> VaultStore:
+    """
+    Creates a vault store.
+
+    :param backend: The name of the backend (see BACKENDS).
+    :param location: The file, directory or database of the vault, or None for the backend's default location.
+    :param password: The password of the vault.
+    :return: The vault store.
+    :raises ValueError: If the backend is unknown.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown vault backend: {backend}")
+    return BACKENDS[backend](location or DEFAULT_LOCATIONS.get(backend, ""), password)
+
+def store_from_environment() -> VaultStore:
+    """
+    Creates the vault store that is configured by the environment variables PASSWORD_MANAGER_BACKEND,
+    PASSWORD_MANAGER_VAULT and PASSWORD_MANAGER_PASSWORD.
+
+    :return: The vault store.
+    """
+    return create_store(
+        os.environ.get("PASSWORD_MANAGER_BACKEND", DEFAULT_BACKEND),
+        os.environ.get("PASSWORD_MANAGER_VAULT") or None,
+        os.environ.get("PASSWORD_MANAGER_PASSWORD", DEFAULT_VAULT_PASSWORD))
+
+class _Settings: # pylint: disable=too-few-public-methods
+    """
+    The configured vault store and the thread that is warming it up.
+    """
+    __slots__ = ("store", "warm_up_thread")
+
+    def __init__(self) -> None:
+        self.store: Optional[VaultStore] = None
+        self.warm_up_thread: Optional[threading.Thread] = None
+
+_settings = _Settings()
+
+def configure_store(store: Optional[VaultStore]) -> None:
+    """
+    Sets the vault store the password manager uses.
+
+    :param store: The vault store, or None to configure it from the environment again on the next get_store().
+    """
+    wait_for_warm_up()
+    _settings.store = store
+
+def get_store() -> VaultStore:
+    """
+    Returns the configured vault store, creating it from the environment on first use.
+    If the store is being warmed up, the call waits until the warm-up has finished.
+
+    :return: The vault store.
+    """
+    wait_for_warm_up()
+    if _settings.store is None:
+        _settings.store = store_from_environment()
+    return _settings.store
+
+def _warm_up(store: VaultStore) -> None:
+    """
+    Runs the warm-up of a store in the background thread. Errors are left to the first
+    load in the foreground, which repeats the work and reports them (e.g. a wrong password).
+
+    :param store: The vault store.
+    """
+    try:
+        store.warm_up()
+    except Exception: # pylint: disable=broad-except
+        pass
+
+def warm_up_store() -> None:
+    """
+    Starts warming up the configured store (see VaultStore.warm_up) in a background thread.
+    """
+    store = get_store()
+    thread = threading.Thread(target=_warm_up, args=(store,), name="vault-warm-up", daemon=True)
+    _settings.warm_up_thread = thread
+    thread.start()
+
+def wait_for_warm_up() -> None:
+    """
+    Waits until a warm-up started by warm_up_store has finished.
+    """
+    thread = _settings.warm_up_thread
+    if thread is not None and thread is not threading.current_thread():
+        thread.join()
+        _settings.warm_up_thread = None
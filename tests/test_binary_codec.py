@@ -0,0 +1,45 @@
+# pylint: disable=C
+import unittest
+import json
+from source.binary_codec import encode, decode
+
+class TestBinaryCodec(unittest.TestCase):
+
+    def setUp(self):
+        self.data = {
+            'accounts': {
+                'accounts-list': ['test@example.com'],
+                'test@example.com': {
+                    'passwords-list': ['Site1', 'Site2'],
+                    'passwords': {
+                        name: {'name': name, 'password': 'Pässwort1!', 'oldpasswordlist': ['a', 'b'], 'dateoffirstaccess': '01.01.2024 00:00'}
+                        for name in ('Site1', 'Site2')
+                    }
+                }
+            },
+            'numbers': [0, 1, -1, 2 ** 70, -(2 ** 70), 1.5, True, False, None, '']
+        }
+
+    def test_round_trip(self):
+        self.assertEqual(decode(encode(self.data)), self.data)
+
+    def test_keys_are_stored_once(self):
+        encoded = encode(self.data)
+        self.assertEqual(encoded.count(b'dateoffirstaccess'), 1)
+        self.assertLess(len(encoded), len(json.dumps(self.data).encode('utf-8')))
+
+    def test_decode_bytearray(self):
+        self.assertEqual(decode(bytearray(encode(self.data))), self.data)
+
+    def test_non_string_keys(self):
+        with self.assertRaises(TypeError):
+            encode({1: 'a'})
+
+    def test_invalid_document(self):
+        with self.assertRaises(ValueError):
+            decode(b'not binary')
+        with self.assertRaises(ValueError):
+            decode(encode(self.data) + b'\x00')
+
+if __name__ == '__main__':
+    unittest.main()
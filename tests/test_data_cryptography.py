@@ -1,10 +1,16 @@
 # pylint: disable=C
 import unittest
+import io
+import json
 import os
+from unittest.mock import patch
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.backends import default_backend
-from source.data_cryptography import encrypt_data, decrypt_data, save_encrypted_dict_to_file, load_encrypted_dict_from_file
+from source import data_cryptography, key_derivation, authenticated_encryption
+from source.data_cryptography import encrypt_data, decrypt_data, save_encrypted_dict_to_file, load_encrypted_dict_from_file, encrypt_stream, decrypt_stream, open_atomically, load_encrypted_dict_mmap, read_container_header, register_serializer, choose_compression, CIPHERS
+from source.key_derivation import derive_key, wipe_key_cache
+from source.authenticated_encryption import encrypt_segments
 
 class TestEncryptionModule(unittest.TestCase):
 
@@ -51,5 +57,474 @@ class TestEncryptionModule(unittest.TestCase):
         with self.assertRaises(Exception):
             load_encrypted_dict_from_file(self.filename, 'wrong_password')
 
+class TestStreaming(unittest.TestCase):
+
+    def setUp(self):
+        self.key = os.urandom(32)
+        self.iv = os.urandom(16)
+        self.data = os.urandom(300000)
+        self.password = 'strong_password123'
+        self.filename = 'test_streaming_file.json'
+
+    def tearDown(self):
+        for filename in (self.filename, self.filename + '.tmp'):
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def test_encrypt_stream_matches_encrypt_data(self):
+        destination = io.BytesIO()
+        encrypt_stream(io.BytesIO(self.data), destination, self.key, self.iv, chunk_size=4096)
+        self.assertEqual(destination.getvalue(), encrypt_data(self.data, self.key, self.iv))
+
+    def test_decrypt_stream(self):
+        destination = io.BytesIO()
+        decrypt_stream(io.BytesIO(encrypt_data(self.data, self.key, self.iv)), destination, self.key, self.iv, chunk_size=1000)
+        self.assertEqual(destination.getvalue(), self.data)
+
+    def test_incremental_json_round_trip(self):
+        data_dict = {'accounts': {str(number): {'name': 'ä' * number} for number in range(2000)}}
+        save_encrypted_dict_to_file(data_dict, self.filename, self.password, incremental_json=True)
+        self.assertEqual(load_encrypted_dict_from_file(self.filename, self.password), data_dict)
+
+    def test_incremental_json_is_the_default_for_large_vaults(self):
+        data_dict = {'accounts': {str(number): {'name': 'x' * 100} for number in range(100)}}
+        with patch('source.data_cryptography._json_chunks', wraps=data_cryptography._json_chunks) as mock_chunks:
+            save_encrypted_dict_to_file(data_dict, self.filename, self.password)
+            mock_chunks.assert_not_called()
+            with patch.object(data_cryptography, 'INCREMENTAL_JSON_MIN_SIZE', os.path.getsize(self.filename)):
+                save_encrypted_dict_to_file(data_dict, self.filename, self.password)
+            mock_chunks.assert_called_once()
+        self.assertEqual(load_encrypted_dict_from_file(self.filename, self.password), data_dict)
+
+    def test_load_encrypted_dict_mmap(self):
+        data_dict = {'accounts': {str(number): {'name': 'ä' * number} for number in range(500)}}
+        save_encrypted_dict_to_file(data_dict, self.filename, self.password)
+        self.assertEqual(load_encrypted_dict_mmap(self.filename, self.password), data_dict)
+
+    def test_load_encrypted_dict_mmap_invalid_password(self):
+        save_encrypted_dict_to_file({'name': 'John Doe'}, self.filename, self.password)
+        with self.assertRaises(Exception):
+            load_encrypted_dict_mmap(self.filename, 'wrong_password')
+
+    def test_open_atomically_keeps_target_on_error(self):
+        with open(self.filename, 'wb') as file:
+            file.write(b'old')
+        with self.assertRaises(RuntimeError):
+            with open_atomically(self.filename) as file:
+                file.write(b'new')
+                raise RuntimeError('test')
+        with open(self.filename, 'rb') as file:
+            self.assertEqual(file.read(), b'old')
+        self.assertFalse([name for name in os.listdir('.') if name.startswith(self.filename + '.')])
+
+    def test_open_atomically_gives_every_writer_its_own_temporary_file(self):
+        with open_atomically(self.filename) as first, open_atomically(self.filename) as second:
+            self.assertNotEqual(first.name, second.name)
+            first.write(b'first')
+            second.write(b'second')
+        with open(self.filename, 'rb') as file:
+            self.assertEqual(file.read(), b'first')
+        self.assertFalse([name for name in os.listdir('.') if name.startswith(self.filename + '.')])
+
+class TestSerializers(unittest.TestCase):
+
+    def setUp(self):
+        self.password = 'strong_password123'
+        self.data_dict = {'accounts': {'accounts-list': ['a@example.com'], 'a@example.com': {'passwords': {'Site': {'name': 'Site', 'oldpasswordlist': ['x', 'y']}}}}}
+        self.filename = 'test_serializers_file.json'
+
+    def tearDown(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def test_codec_is_recorded_and_picked_automatically(self):
+        save_encrypted_dict_to_file(self.data_dict, self.filename, self.password, codec='binary')
+        with open(self.filename, 'rb') as file:
+            self.assertEqual(read_container_header(file)['codec'], 'binary')
+        self.assertEqual(load_encrypted_dict_from_file(self.filename, self.password), self.data_dict)
+        self.assertEqual(load_encrypted_dict_mmap(self.filename, self.password), self.data_dict)
+
+    def test_load_file_without_header(self):
+        salt = os.urandom(16)
+        iv = os.urandom(16)
+        key = derive_key(self.password, salt)
+        with open(self.filename, 'wb') as file:
+            file.write(salt + iv + encrypt_data(json.dumps(self.data_dict).encode('utf-8'), key, iv))
+        self.assertEqual(load_encrypted_dict_from_file(self.filename, self.password), self.data_dict)
+        self.assertEqual(load_encrypted_dict_mmap(self.filename, self.password), self.data_dict)
+
+    def test_register_serializer(self):
+        register_serializer('test', lambda value: json.dumps(value).encode('utf-8')[::-1], lambda buffer: json.loads(bytes(buffer[::-1])))
+        try:
+            save_encrypted_dict_to_file(self.data_dict, self.filename, self.password, codec='test')
+            self.assertEqual(load_encrypted_dict_from_file(self.filename, self.password), self.data_dict)
+        finally:
+            del data_cryptography.SERIALIZERS['test']
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            save_encrypted_dict_to_file(self.data_dict, self.filename, self.password, codec='unknown')
+
+class TestCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.password = 'strong_password123'
+        self.data_dict = {'entries': [{'name': f'entry{number}', 'url': 'https://example.com'} for number in range(500)]}
+        self.filename = 'test_compression_file.json'
+
+    def tearDown(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def test_round_trip_for_every_compression(self):
+        for compression in ('none', 'zlib', 'bz2', 'lzma'):
+            with self.subTest(compression=compression):
+                save_encrypted_dict_to_file(self.data_dict, self.filename, self.password, compression=compression)
+                with open(self.filename, 'rb') as file:
+                    self.assertEqual(read_container_header(file)['compression'], compression)
+                self.assertEqual(load_encrypted_dict_from_file(self.filename, self.password), self.data_dict)
+                self.assertEqual(load_encrypted_dict_mmap(self.filename, self.password), self.data_dict)
+
+    def test_compression_shrinks_file(self):
+        save_encrypted_dict_to_file(self.data_dict, self.filename, self.password, compression='none')
+        uncompressed_size = os.path.getsize(self.filename)
+        save_encrypted_dict_to_file(self.data_dict, self.filename, self.password, compression='zlib')
+        self.assertLess(os.path.getsize(self.filename), uncompressed_size // 2)
+
+    def test_incremental_json_with_compression(self):
+        save_encrypted_dict_to_file(self.data_dict, self.filename, self.password, incremental_json=True)
+        with open(self.filename, 'rb') as file:
+            self.assertEqual(read_container_header(file)['compression'], 'zlib')
+        self.assertEqual(load_encrypted_dict_from_file(self.filename, self.password), self.data_dict)
+
+    def test_auto_skips_small_payloads(self):
+        self.assertEqual(choose_compression(b'{}'), 'none')
+
+    def test_auto_respects_latency_budget(self):
+        payload = json.dumps(self.data_dict).encode('utf-8') * 10
+        self.assertEqual(choose_compression(payload, latency_budget=0.0), 'zlib')
+        self.assertEqual(choose_compression(payload, latency_budget=60.0), 'lzma')
+
+    def test_unknown_compression(self):
+        with self.assertRaises(ValueError):
+            save_encrypted_dict_to_file(self.data_dict, self.filename, self.password, compression='unknown')
+
+class TestAuthenticatedEncryption(unittest.TestCase):
+
+    def setUp(self):
+        self.password = 'strong_password123'
+        self.data_dict = {'entries': [{'name': f'entry{number}', 'password': os.urandom(8).hex()} for number in range(50)]}
+        self.filename = 'test_aead_file.json'
+        for module, name in ((data_cryptography, 'CHUNK_SIZE'), (authenticated_encryption, 'SEGMENT_SIZE')):
+            patcher = patch.object(module, name, 256)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def save(self, cipher='aes-256-gcm'):
+        save_encrypted_dict_to_file(self.data_dict, self.filename, self.password, compression='none', cipher=cipher)
+        with open(self.filename, 'rb') as file:
+            return bytearray(file.read())
+
+    def assert_rejected(self, content):
+        with open(self.filename, 'wb') as file:
+            file.write(content)
+        with self.assertRaises(ValueError):
+            load_encrypted_dict_from_file(self.filename, self.password)
+        with self.assertRaises(ValueError):
+            load_encrypted_dict_mmap(self.filename, self.password)
+
+    def test_round_trip_for_every_cipher(self):
+        for cipher in CIPHERS:
+            with self.subTest(cipher=cipher):
+                self.save(cipher)
+                with open(self.filename, 'rb') as file:
+                    self.assertEqual(read_container_header(file)['cipher'], cipher)
+                self.assertEqual(load_encrypted_dict_from_file(self.filename, self.password), self.data_dict)
+                self.assertEqual(load_encrypted_dict_mmap(self.filename, self.password), self.data_dict)
+
+    def test_round_trip_of_segment_sized_payload(self):
+        self.data_dict = {'text': 'x' * (256 * 4 - len('{"text": ""}'))}
+        self.save()
+        self.assertEqual(load_encrypted_dict_from_file(self.filename, self.password), self.data_dict)
+        self.assertEqual(load_encrypted_dict_mmap(self.filename, self.password), self.data_dict)
+
+    def test_wrong_password_is_rejected(self):
+        for cipher in ('aes-256-gcm', 'chacha20-poly1305'):
+            with self.subTest(cipher=cipher):
+                self.save(cipher)
+                with self.assertRaises(ValueError):
+                    load_encrypted_dict_from_file(self.filename, 'wrong_password')
+
+    def test_modified_ciphertext_is_rejected(self):
+        content = self.save()
+        content[-300] ^= 1
+        self.assert_rejected(content)
+
+    def test_modified_header_is_rejected(self):
+        content = self.save()
+        self.assert_rejected(content.replace(b'"none"', b'"NONE"', 1))
+
+    def test_truncated_file_is_rejected(self):
+        content = self.save()
+        start = data_cryptography.parse_container_header(content)[1] + 32
+        self.assert_rejected(content[:start + 2 * (256 + 16)])
+
+    def test_segments_use_a_subkey_per_file(self):
+        self.save()
+        with open(self.filename, 'rb') as file:
+            self.assertEqual(read_container_header(file)['segment-key'], 'hkdf-sha256')
+        key = os.urandom(32)
+        header = {'segment-key': 'hkdf-sha256'}
+        first, second = (authenticated_encryption.segment_key(key, os.urandom(16), header) for _ in range(2))
+        self.assertNotEqual(first, second)
+        self.assertNotIn(key, (first, second))
+        self.assertEqual(authenticated_encryption.segment_key(key, os.urandom(16), {}), key)
+        with self.assertRaises(ValueError):
+            authenticated_encryption.segment_key(key, os.urandom(16), {'segment-key': 'unknown'})
+
+    def test_file_without_segment_key_is_loaded(self):
+        write_file_without_key_slots(self.data_dict, self.filename, self.password)
+        self.assertEqual(load_encrypted_dict_from_file(self.filename, self.password), self.data_dict)
+        self.assertEqual(load_encrypted_dict_mmap(self.filename, self.password), self.data_dict)
+
+class TestKeyDerivationFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.password = 'strong_password123'
+        self.data_dict = {'key': 'value'}
+        self.filename = 'test_kdf_file.json'
+        self.addCleanup(key_derivation.set_default_kdf, key_derivation.get_default_kdf())
+        wipe_key_cache()
+
+    def tearDown(self):
+        wipe_key_cache()
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def test_scrypt_round_trip_records_kdf_in_header(self):
+        key_derivation.set_default_kdf({'name': 'scrypt', 'n': 1024})
+        save_encrypted_dict_to_file(self.data_dict, self.filename, self.password)
+        with open(self.filename, 'rb') as file:
+            self.assertEqual(read_container_header(file)['keys'][0]['kdf'], {'name': 'scrypt', 'n': 1024, 'r': 8, 'p': 1})
+        key_derivation.set_default_kdf(key_derivation.LEGACY_KDF)
+        wipe_key_cache()
+        self.assertEqual(load_encrypted_dict_from_file(self.filename, self.password), self.data_dict)
+        self.assertEqual(load_encrypted_dict_mmap(self.filename, self.password), self.data_dict)
+
+    def test_file_without_kdf_uses_legacy_pbkdf2(self):
+        self.assertEqual(key_derivation.header_kdf({}), key_derivation.LEGACY_KDF)
+        self.assertFalse(authenticated_encryption.needs_rehash({}))
+        self.assertTrue(authenticated_encryption.needs_rehash({'kdf': {'name': 'pbkdf2-sha256', 'iterations': 1000}}))
+
+    def test_invalid_kdf(self):
+        for kdf in ({'name': 'md5'}, {'name': 'scrypt', 'n': 1000}, {'name': 'pbkdf2-sha256', 'iterations': 0}):
+            with self.assertRaises(ValueError):
+                key_derivation.set_default_kdf(kdf)
+
+    def test_malformed_kdf_setting_keeps_the_default(self):
+        default_kdf = key_derivation.get_default_kdf()
+        for setting in ('{"name": "pbkdf2', '{"name": "md5"}', '42'):
+            with patch.dict(os.environ, {'PASSWORD_MANAGER_KDF': setting}), self.assertWarns(RuntimeWarning):
+                key_derivation._default_kdf_from_environment()
+            self.assertEqual(key_derivation.get_default_kdf(), default_kdf)
+
+    def test_calibrate(self):
+        with patch('source.key_derivation.time.perf_counter', side_effect=[0.0, 0.02]):
+            self.assertEqual(key_derivation.calibrate_kdf('pbkdf2-sha256', 0.5), {'name': 'pbkdf2-sha256', 'iterations': 500000})
+        with patch('source.key_derivation.time.perf_counter', side_effect=[0.0, 0.05]):
+            self.assertEqual(key_derivation.calibrate_kdf('scrypt', 0.5), {'name': 'scrypt', 'n': 2 ** 17, 'r': 8, 'p': 1})
+        with patch('source.key_derivation.time.perf_counter', side_effect=[0.0, 10.0]):
+            self.assertEqual(key_derivation.calibrate_kdf('pbkdf2-sha256', 0.5)['iterations'], key_derivation.MIN_PBKDF2_ITERATIONS)
+
+def write_file_without_key_slots(data_dict, filename, password):
+    header = data_cryptography.build_container_header({'codec': 'json', 'compression': 'none', 'cipher': 'aes-256-gcm'})
+    salt, iv = os.urandom(16), os.urandom(16)
+    with open(filename, 'wb') as file:
+        file.write(header + salt + iv)
+        encrypt_segments([json.dumps(data_dict).encode('utf-8')], file, derive_key(password, salt), iv, cipher='aes-256-gcm', associated_data=header + salt + iv)
+
+class TestKeySlots(unittest.TestCase):
+
+    def setUp(self):
+        self.password = 'strong_password123'
+        self.data_dict = {'entries': [{'name': f'entry{number}', 'password': os.urandom(8).hex()} for number in range(200)]}
+        self.filename = 'test_key_slots_file.json'
+        save_encrypted_dict_to_file(self.data_dict, self.filename, self.password)
+
+    def tearDown(self):
+        for filename in (self.filename, self.filename + '.tmp'):
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def read(self):
+        with open(self.filename, 'rb') as file:
+            return file.read()
+
+    def assert_opens(self, password):
+        self.assertEqual(load_encrypted_dict_from_file(self.filename, password), self.data_dict)
+        self.assertEqual(load_encrypted_dict_mmap(self.filename, password), self.data_dict)
+
+    def test_change_password_rewrites_only_the_header(self):
+        before = self.read()
+        start = data_cryptography.parse_container_header(before)[1]
+        data_cryptography.change_password(self.filename, self.password, 'new_password')
+        after = self.read()
+        self.assertEqual(len(after), len(before))
+        self.assertEqual(after[start:], before[start:])
+        self.assert_opens('new_password')
+        with self.assertRaises(ValueError):
+            load_encrypted_dict_from_file(self.filename, self.password)
+
+    def test_failed_header_rewrite_leaves_the_file_untouched(self):
+        before = self.read()
+        with patch('source.data_cryptography.shutil.copyfileobj', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                data_cryptography.change_password(self.filename, self.password, 'new_password')
+        self.assertEqual(self.read(), before)
+        self.assert_opens(self.password)
+
+    def test_add_and_remove_password(self):
+        data_cryptography.change_password(self.filename, self.password, 'second_password', keep_old=True)
+        self.assert_opens(self.password)
+        self.assert_opens('second_password')
+        save_encrypted_dict_to_file(self.data_dict, self.filename, 'second_password')
+        self.assert_opens(self.password)
+        data_cryptography.remove_password(self.filename, self.password)
+        self.assert_opens('second_password')
+        with self.assertRaises(ValueError):
+            load_encrypted_dict_from_file(self.filename, self.password)
+        with self.assertRaises(ValueError):
+            data_cryptography.remove_password(self.filename, 'second_password')
+
+    def test_header_with_many_key_slots(self):
+        for number in range(5):
+            data_cryptography.change_password(self.filename, self.password, f'password{number}', keep_old=True)
+        with open(self.filename, 'rb') as file:
+            self.assertEqual(len(read_container_header(file)['keys']), 6)
+        self.assert_opens(self.password)
+        self.assert_opens('password4')
+
+    def test_modified_key_slot_is_rejected(self):
+        content = bytearray(self.read())
+        header, _ = data_cryptography.parse_container_header(content)
+        wrapped_key = header['keys'][0]['wrapped-key'].encode('ascii')
+        position = content.index(wrapped_key)
+        content[position] = ord('A') if content[position] != ord('A') else ord('B')
+        with open(self.filename, 'wb') as file:
+            file.write(content)
+        with self.assertRaises(ValueError):
+            load_encrypted_dict_from_file(self.filename, self.password)
+
+    def test_file_without_key_slots(self):
+        write_file_without_key_slots(self.data_dict, self.filename, self.password)
+        self.assert_opens(self.password)
+        data_cryptography.change_password(self.filename, self.password, 'new_password')
+        with open(self.filename, 'rb') as file:
+            self.assertIn('keys', read_container_header(file))
+        self.assert_opens('new_password')
+
+class TestLoadMany(unittest.TestCase):
+
+    def setUp(self):
+        self.files = {f'test_load_many_{number}.json': (f'password{number}', {'vault': number}) for number in range(4)}
+        for filename, (password, data_dict) in self.files.items():
+            save_encrypted_dict_to_file(data_dict, filename, password)
+        wipe_key_cache()
+
+    def tearDown(self):
+        wipe_key_cache()
+        for filename in self.files:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def test_load_many(self):
+        timings = {}
+        loaded = data_cryptography.load_many({filename: password for filename, (password, _) in self.files.items()}, timings=timings)
+        self.assertEqual(loaded, {filename: data_dict for filename, (_, data_dict) in self.files.items()})
+        self.assertEqual(set(timings), set(self.files))
+        for file_timings in timings.values():
+            self.assertEqual(set(file_timings), {'kdf_seconds', 'cipher_seconds', 'total_seconds'})
+
+    def test_parallelism_is_bounded(self):
+        with patch('source.data_cryptography.ThreadPoolExecutor', wraps=data_cryptography.ThreadPoolExecutor) as mock_executor:
+            data_cryptography.load_many({filename: password for filename, (password, _) in self.files.items()}, max_workers=2)
+            self.assertEqual(mock_executor.call_args.kwargs['max_workers'], 2)
+
+    def test_wrong_password(self):
+        passwords = {filename: password for filename, (password, _) in self.files.items()}
+        passwords['test_load_many_2.json'] = 'wrong_password'
+        with self.assertRaises(ValueError):
+            data_cryptography.load_many(passwords)
+
+class TestKeyCache(unittest.TestCase):
+
+    def setUp(self):
+        self.password = 'strong_password123'
+        self.data_dict = {'name': 'John Doe', 'age': 30, 'city': 'New York'}
+        self.filename = 'test_key_cache_file.json'
+        wipe_key_cache()
+
+    def tearDown(self):
+        wipe_key_cache()
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def test_derive_key_uses_cache(self):
+        salt = os.urandom(16)
+        key = derive_key(self.password, salt)
+        with patch('source.key_derivation.PBKDF2HMAC') as mock_kdf:
+            self.assertEqual(derive_key(self.password, salt), key)
+            mock_kdf.assert_not_called()
+
+    def test_derive_key_matches_pbkdf2(self):
+        salt = os.urandom(16)
+        kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=100000, backend=default_backend())
+        self.assertEqual(derive_key(self.password, salt), kdf.derive(self.password.encode()))
+
+    def test_load_and_saves_cost_one_kdf(self):
+        save_encrypted_dict_to_file(self.data_dict, self.filename, self.password, keep_salt=False)
+        wipe_key_cache()
+        with patch('source.key_derivation.PBKDF2HMAC', wraps=PBKDF2HMAC) as mock_kdf:
+            loaded_dict = load_encrypted_dict_from_file(self.filename, self.password)
+            save_encrypted_dict_to_file(loaded_dict, self.filename, self.password)
+            save_encrypted_dict_to_file(loaded_dict, self.filename, self.password)
+            self.assertEqual(mock_kdf.call_count, 1)
+
+    def test_keep_salt_uses_fresh_iv(self):
+        save_encrypted_dict_to_file(self.data_dict, self.filename, self.password)
+        with open(self.filename, 'rb') as file:
+            read_container_header(file)
+            first = file.read(32)
+        save_encrypted_dict_to_file(self.data_dict, self.filename, self.password)
+        with open(self.filename, 'rb') as file:
+            read_container_header(file)
+            second = file.read(32)
+        self.assertEqual(first[:16], second[:16])
+        self.assertNotEqual(first[16:], second[16:])
+
+    def test_cache_is_bounded(self):
+        for _ in range(key_derivation.KEY_CACHE_SIZE + 2):
+            derive_key(self.password, os.urandom(16), iterations=1000)
+        self.assertEqual(len(key_derivation._key_cache), key_derivation.KEY_CACHE_SIZE)
+
+    def test_idle_keys_are_evicted(self):
+        salt = os.urandom(16)
+        derive_key(self.password, salt, iterations=1000)
+        with patch('source.key_derivation.time.monotonic', return_value=10 ** 9):
+            with patch('source.key_derivation.PBKDF2HMAC', wraps=PBKDF2HMAC) as mock_kdf:
+                derive_key(self.password, salt, iterations=1000)
+                mock_kdf.assert_called_once()
+
+    def test_wipe_key_cache(self):
+        derive_key(self.password, os.urandom(16), iterations=1000)
+        entry = next(iter(key_derivation._key_cache.values()))
+        wipe_key_cache()
+        self.assertEqual(len(key_derivation._key_cache), 0)
+        self.assertEqual(entry[0], bytearray(32))
+
 if __name__ == '__main__':
     unittest.main()
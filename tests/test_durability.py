@@ -0,0 +1,95 @@
+# pylint: disable=C
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+from source import durability
+from source.data_cryptography import write_file_atomically, save_encrypted_dict_to_file, load_encrypted_dict_from_file
+
+class TestDurability(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'data.json')
+        self.fsynced = []
+        real_fsync = os.fsync
+
+        def counting_fsync(descriptor):
+            self.fsynced.append(descriptor)
+            real_fsync(descriptor)
+
+        patcher = patch('source.durability.os.fsync', side_effect=counting_fsync)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        durability.set_policy('always')
+        shutil.rmtree(self.directory)
+
+    def test_always_syncs_file_and_directory(self):
+        durability.set_policy('always')
+        write_file_atomically(self.filename, b'payload')
+        self.assertEqual(len(self.fsynced), 2)
+        with open(self.filename, 'rb') as file:
+            self.assertEqual(file.read(), b'payload')
+        self.assertEqual(os.listdir(self.directory), ['data.json'])
+
+    def test_never_does_not_sync(self):
+        durability.set_policy('never')
+        write_file_atomically(self.filename, b'payload')
+        self.assertEqual(self.fsynced, [])
+
+    def test_interval_groups_the_directory_syncs_of_a_burst(self):
+        durability.set_policy('interval', interval_ms=10000)
+        for number in range(20):
+            save_encrypted_dict_to_file({'number': number}, self.filename, 'password')
+        self.assertEqual(len(self.fsynced), 20)
+        self.assertEqual(load_encrypted_dict_from_file(self.filename, 'password'), {'number': 19})
+        self.assertEqual(durability.flush_pending(), 1)
+        self.assertEqual(len(self.fsynced), 21)
+
+    def test_interval_flushes_in_the_background(self):
+        durability.set_policy('interval', interval_ms=10)
+        write_file_atomically(self.filename, b'payload')
+        deadline = time.monotonic() + 5
+        while len(self.fsynced) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(self.fsynced), 2)
+
+    def test_concurrent_directory_syncs_are_shared(self):
+        durability.set_policy('always')
+        release = threading.Event()
+        calls = []
+
+        def slow_fsync_path(path):
+            calls.append(path)
+            release.wait(5)
+
+        with patch('source.durability._fsync_path', side_effect=slow_fsync_path):
+            threads = [threading.Thread(target=durability.sync_after_rename, args=(self.filename,)) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            time.sleep(0.1)
+            release.set()
+            for thread in threads:
+                thread.join()
+        self.assertLessEqual(len(calls), 2)
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            durability.set_policy('sometimes')
+        with self.assertRaises(ValueError):
+            durability.set_policy('interval', interval_ms=0)
+
+    def test_malformed_policy_setting_keeps_the_policy(self):
+        durability.set_policy('never')
+        for setting in ('sometimes', 'interval:abc', 'interval:0'):
+            with patch.dict(os.environ, {'PASSWORD_MANAGER_DURABILITY': setting}), self.assertWarns(RuntimeWarning):
+                durability._policy_from_environment()
+            self.assertEqual(durability.get_policy(), ('never', durability.DEFAULT_INTERVAL_MS))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+# pylint: disable=C
+import unittest
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+from source.history_archive import HistoryArchive, archive_filename
+from source.vault_storage import invalidate_vault_cache
+
+class TestHistoryArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.password = 'strong_password123'
+        self.filename = archive_filename(os.path.join(self.directory, 'data.json'))
+        invalidate_vault_cache()
+
+    def tearDown(self):
+        invalidate_vault_cache()
+        shutil.rmtree(self.directory)
+
+    def test_archive_filename(self):
+        self.assertEqual(archive_filename('vault/'), os.path.join('vault') + '.archive')
+        self.assertEqual(archive_filename('data.json'), 'data.json.archive')
+
+    def test_in_memory(self):
+        archive = HistoryArchive(None, '')
+        archive.add('a@example.com', ['h1', 'h2'])
+        self.assertTrue(archive.contains('a@example.com', 'h1'))
+        self.assertFalse(archive.contains('b@example.com', 'h1'))
+
+    def test_file_is_created_on_first_add(self):
+        archive = HistoryArchive(self.filename, self.password)
+        self.assertFalse(archive.contains('a@example.com', 'h1'))
+        archive.add('a@example.com', [])
+        self.assertFalse(os.path.exists(self.filename))
+        archive.add('a@example.com', ['h1', 'h2'])
+        archive.add('a@example.com', ['h2', 'h3'])
+        self.assertTrue(os.path.exists(self.filename))
+        other = HistoryArchive(self.filename, self.password)
+        self.assertTrue(all(other.contains('a@example.com', hashed) for hashed in ('h1', 'h2', 'h3')))
+
+    def test_file_is_read_only_when_it_changed(self):
+        archive = HistoryArchive(self.filename, self.password)
+        archive.add('a@example.com', ['h1'])
+        self.assertTrue(archive.contains('a@example.com', 'h1'))
+        with patch('source.history_archive.load_vault_versioned') as mock_load:
+            self.assertFalse(archive.contains('a@example.com', 'h2'))
+            mock_load.assert_not_called()
+        HistoryArchive(self.filename, self.password).add('a@example.com', ['h2'])
+        self.assertTrue(archive.contains('a@example.com', 'h2'))
+
+if __name__ == '__main__':
+    unittest.main()
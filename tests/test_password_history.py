@@ -0,0 +1,49 @@
+# pylint: disable=C
+import unittest
+import os
+from unittest.mock import patch
+from source import password_history
+from source.password_history import DEFAULT_HISTORY_DEPTH, HISTORY_HASH_CHARS, get_history_depth, set_history_depth, new_history_salt, derived_history_salt, account_salt, hash_history_password, push_history
+
+class TestPasswordHistory(unittest.TestCase):
+
+    def tearDown(self):
+        set_history_depth(DEFAULT_HISTORY_DEPTH)
+
+    def test_history_depth(self):
+        self.assertEqual(get_history_depth(), DEFAULT_HISTORY_DEPTH)
+        set_history_depth(3)
+        self.assertEqual(get_history_depth(), 3)
+        with self.assertRaises(ValueError):
+            set_history_depth(0)
+
+    def test_depth_from_environment(self):
+        with patch.dict(os.environ, {'PASSWORD_MANAGER_HISTORY_DEPTH': '4'}):
+            self.assertEqual(password_history._depth_from_environment(), 4)
+        for value in ('0', 'many'):
+            with patch.dict(os.environ, {'PASSWORD_MANAGER_HISTORY_DEPTH': value}):
+                self.assertEqual(password_history._depth_from_environment(), DEFAULT_HISTORY_DEPTH)
+
+    def test_salts(self):
+        self.assertNotEqual(new_history_salt(), new_history_salt())
+        account = {'mail': 'a@example.com', 'master-password': 'hash'}
+        self.assertEqual(derived_history_salt(account), derived_history_salt(dict(account)))
+        self.assertNotEqual(derived_history_salt(account), derived_history_salt({'mail': 'b@example.com', 'master-password': 'hash'}))
+        self.assertEqual(account_salt({'history-salt': 'c2FsdA=='}), b'salt')
+
+    def test_hash_history_password(self):
+        hashed = hash_history_password(b'salt', 'pw1')
+        self.assertEqual(len(hashed), HISTORY_HASH_CHARS)
+        self.assertNotIn('pw1', hashed)
+        self.assertEqual(hashed, hash_history_password(b'salt', 'pw1'))
+        self.assertNotEqual(hashed, hash_history_password(b'other', 'pw1'))
+
+    def test_push_history(self):
+        history = ['a', 'b']
+        self.assertEqual(push_history(history, 'c', 3), (['a', 'b', 'c'], []))
+        self.assertEqual(push_history(history, 'c', 2), (['b', 'c'], ['a']))
+        self.assertEqual(push_history(history, 'a', 2), (['b', 'a'], []))
+        self.assertEqual(history, ['a', 'b'])
+
+if __name__ == '__main__':
+    unittest.main()
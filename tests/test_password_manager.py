@@ -31,8 +31,10 @@ class TestPasswordManager(unittest.TestCase):
         mail = "test@example.com"
         mock_choice_function.return_value = (0, [1, 2], False)
         mock_input_function.return_value = "site1"
-        password_manager(stdscr, height, width, mail)
-        mock_show_password.assert_called_once_with(stdscr, mock_read_data_json.return_value, mail, "site1", height//2, width//2, height, width)
+        with patch('source.password_manager.get_store') as mock_get_store:
+            mock_get_store.return_value.list_names.return_value = list(mock_read_data_json.return_value["accounts"][mail]["passwords"])
+            password_manager(stdscr, height, width, mail)
+        mock_show_password.assert_called_once_with(stdscr, mail, "site1", height//2, width//2, height, width)
         mock_add_new_password.assert_not_called()
     @patch('source.password_manager.read_data_json')
     @patch('source.password_manager.choice_function')
@@ -351,7 +353,9 @@ class TestPasswordManager(unittest.TestCase):
                 }
             }
         }
-        show_password(stdscr, data, "test@example.com", "TestName", 20, 80, 20, 80)
+        with patch('source.password_manager.get_store') as mock_get_store:
+            mock_get_store.return_value.get_entry.return_value = data["accounts"]["test@example.com"]["passwords"]["TestName"]
+            show_password(stdscr, "test@example.com", "TestName", 20, 80, 20, 80)
         mock_password_manager.assert_called_once_with(stdscr, 20, 80, "test@example.com")
     def test_hash_password(self):
         password = "StrongPass1!"
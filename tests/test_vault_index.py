@@ -0,0 +1,117 @@
+# pylint: disable=C
+import unittest
+from source.password_history import hash_history_password
+from source.vault_index import LastChangeIndex, HistoryIndex, PrefixIndex, SECONDS_PER_DAY
+
+class TestLastChangeIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.data = {
+            'schema': 4,
+            'accounts': {
+                'a@example.com': {'passwords': {'A1': {'dateoflastchange': 300}, 'A2': {'dateoflastchange': 100}, 'A3': {'dateoflastchange': 'old'}}},
+                'b@example.com': {'passwords': {'B1': {'dateoflastchange': 200}}}
+            }
+        }
+        self.index = LastChangeIndex.from_vault(self.data)
+
+    def test_from_vault(self):
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(self.index.recently_changed(2), [('a@example.com', 'A1', 300), ('b@example.com', 'B1', 200)])
+        self.assertEqual(self.index.recently_changed(5, mail='b@example.com'), [('b@example.com', 'B1', 200)])
+
+    def test_changed_between_and_older_than(self):
+        self.assertEqual(self.index.changed_between(100, 300), [('a@example.com', 'A2', 100), ('b@example.com', 'B1', 200)])
+        self.assertEqual(self.index.older_than(1, now=250 + SECONDS_PER_DAY), [('a@example.com', 'A2', 100), ('b@example.com', 'B1', 200)])
+        self.assertEqual(self.index.older_than(1, mail='a@example.com', now=250 + SECONDS_PER_DAY), [('a@example.com', 'A2', 100)])
+        self.assertEqual(LastChangeIndex().older_than(1), [])
+
+    def test_apply_record(self):
+        self.index.apply_record({'op': 'change_entry', 'mail': 'a@example.com', 'old_name': 'A2', 'name': 'A4', 'entry': {'dateoflastchange': 400}})
+        self.index.apply_record({'op': 'add_entry', 'mail': 'b@example.com', 'name': 'B2', 'entry': {'dateoflastchange': 50}})
+        self.index.apply_record({'op': 'delete_entry', 'mail': 'a@example.com', 'name': 'A1'})
+        self.assertEqual(self.index.recently_changed(5), [('a@example.com', 'A4', 400), ('b@example.com', 'B1', 200), ('b@example.com', 'B2', 50)])
+        self.index.apply_record({'op': 'register_account', 'mail': 'b@example.com', 'account': {'passwords': {'B3': {'dateoflastchange': 10}}}})
+        self.assertEqual(self.index.recently_changed(5), [('a@example.com', 'A4', 400), ('b@example.com', 'B3', 10)])
+        with self.assertRaises(ValueError):
+            self.index.apply_record({'op': 'unknown', 'mail': 'a@example.com'})
+
+class TestHistoryIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.data = {
+            'schema': 4,
+            'accounts': {
+                'a@example.com': {'history-salt': 'c2FsdA==', 'passwords': {
+                    'A1': {'password': 'pw2', 'history': [hash_history_password(b'salt', 'pw1')]},
+                    'A2': {'password': 'pw2'}
+                }},
+                'b@example.com': {'history-salt': 'b3RoZXI=', 'passwords': {'B1': {'password': 'pw3'}}}
+            }
+        }
+        self.index = HistoryIndex.from_vault(self.data)
+
+    def test_was_used(self):
+        self.assertTrue(self.index.was_used('a@example.com', 'pw1'))
+        self.assertTrue(self.index.was_used('a@example.com', 'pw2'))
+        self.assertFalse(self.index.was_used('a@example.com', 'pw3'))
+        self.assertFalse(self.index.was_used('b@example.com', 'pw1'))
+        self.assertEqual(self.index.history_hash('a@example.com', 'pw1'), hash_history_password(b'salt', 'pw1'))
+        with self.assertRaises(KeyError):
+            self.index.was_used('c@example.com', 'pw1')
+
+    def test_apply_record(self):
+        self.index.apply_record({'op': 'change_entry', 'mail': 'a@example.com', 'old_name': 'A1', 'name': 'A3', 'entry': {'password': 'pw4', 'history': []}})
+        self.assertFalse(self.index.was_used('a@example.com', 'pw1'))
+        self.assertTrue(self.index.was_used('a@example.com', 'pw2'))
+        self.index.apply_record({'op': 'delete_entry', 'mail': 'a@example.com', 'name': 'A2'})
+        self.assertFalse(self.index.was_used('a@example.com', 'pw2'))
+        self.index.apply_record({'op': 'add_entry', 'mail': 'b@example.com', 'name': 'B1', 'entry': {'password': 'pw5'}})
+        self.assertEqual((self.index.was_used('b@example.com', 'pw3'), self.index.was_used('b@example.com', 'pw5')), (False, True))
+        self.index.apply_record({'op': 'register_account', 'mail': 'a@example.com', 'account': {'history-salt': 'c2FsdA==', 'passwords': {}}})
+        self.assertFalse(self.index.was_used('a@example.com', 'pw4'))
+        with self.assertRaises(ValueError):
+            self.index.apply_record({'op': 'unknown', 'mail': 'a@example.com'})
+
+class TestPrefixIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.data = {
+            'schema': 4,
+            'accounts': {
+                'a@example.com': {'passwords': {'Github': {}, 'Gitlab': {}, 'Google': {}, 'github2': {}, 'Amazon': {}}},
+                'b@example.com': {'passwords': {}}
+            }
+        }
+        self.index = PrefixIndex.from_vault(self.data)
+
+    def test_names_with_prefix(self):
+        self.assertEqual(self.index.names_with_prefix('a@example.com', 'git'), ['Github', 'github2', 'Gitlab'])
+        self.assertEqual(self.index.names_with_prefix('a@example.com', 'GITH'), ['Github', 'github2'])
+        self.assertEqual(self.index.names_with_prefix('a@example.com', 'g', limit=2), ['Github', 'github2'])
+        self.assertEqual(self.index.names_with_prefix('a@example.com', 'x'), [])
+        self.assertEqual(len(self.index.names_with_prefix('a@example.com', '')), 5)
+        self.assertEqual(self.index.names_with_prefix('b@example.com', 'g'), [])
+        self.assertEqual(self.index.names_with_prefix('c@example.com', 'g'), [])
+
+    def test_contains(self):
+        self.assertTrue(self.index.contains('a@example.com', 'Github'))
+        self.assertFalse(self.index.contains('a@example.com', 'github'))
+        self.assertFalse(self.index.contains('a@example.com', 'Git'))
+        self.assertFalse(self.index.contains('c@example.com', 'Github'))
+
+    def test_apply_record(self):
+        self.index.apply_record({'op': 'change_entry', 'mail': 'a@example.com', 'old_name': 'Gitlab', 'name': 'Codeberg', 'entry': {}})
+        self.index.apply_record({'op': 'add_entry', 'mail': 'a@example.com', 'name': 'Github', 'entry': {}})
+        self.index.apply_record({'op': 'add_entry', 'mail': 'b@example.com', 'name': 'Gmail', 'entry': {}})
+        self.index.apply_record({'op': 'delete_entry', 'mail': 'a@example.com', 'name': 'github2'})
+        self.index.apply_record({'op': 'delete_entry', 'mail': 'a@example.com', 'name': 'Missing'})
+        self.assertEqual(self.index.names_with_prefix('a@example.com', ''), ['Amazon', 'Codeberg', 'Github', 'Google'])
+        self.assertEqual(self.index.names_with_prefix('b@example.com', 'g'), ['Gmail'])
+        self.index.apply_record({'op': 'register_account', 'mail': 'a@example.com', 'account': {'passwords': {'Zoom': {}}}})
+        self.assertEqual(self.index.names_with_prefix('a@example.com', ''), ['Zoom'])
+        with self.assertRaises(ValueError):
+            self.index.apply_record({'op': 'unknown', 'mail': 'a@example.com'})
+
+if __name__ == '__main__':
+    unittest.main()
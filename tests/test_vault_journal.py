@@ -0,0 +1,126 @@
+# pylint: disable=C
+import unittest
+import json
+import os
+from source.data_cryptography import save_encrypted_dict_to_file, read_container_header, encrypt_data
+from source.authenticated_encryption import unwrap_data_key
+from source.key_derivation import get_session_salt
+from source.password_history import account_salt, derived_history_salt, hash_history_password
+from source.vault_journal import apply_record, copy_for_record, append_record, read_records, journal_filename, snapshot_id, LEGACY_JOURNAL_MAGIC
+
+class TestVaultJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.password = 'strong_password123'
+        self.filename = 'test_vault_journal.json'
+        self.data = {
+            'accounts': {
+                'accounts-list': ['test@example.com'],
+                'test@example.com': {'passwords-list': ['Site'], 'passwords': {'Site': {'name': 'Site'}}}
+            }
+        }
+        save_encrypted_dict_to_file(self.data, self.filename, self.password)
+
+    def tearDown(self):
+        for filename in (self.filename, journal_filename(self.filename)):
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def test_apply_add_change_delete(self):
+        apply_record(self.data, {'op': 'add_entry', 'mail': 'test@example.com', 'name': 'New', 'entry': {'name': 'New'}})
+        apply_record(self.data, {'op': 'change_entry', 'mail': 'test@example.com', 'old_name': 'Site', 'name': 'Renamed', 'entry': {'name': 'Renamed'}})
+        apply_record(self.data, {'op': 'delete_entry', 'mail': 'test@example.com', 'name': 'New'})
+        account = self.data['accounts']['test@example.com']
+        self.assertEqual(account['passwords'], {'Renamed': {'name': 'Renamed'}})
+        self.assertNotIn('passwords-list', account)
+
+    def test_apply_register_account(self):
+        apply_record(self.data, {'op': 'register_account', 'mail': 'new@example.com', 'account': {'mail': 'new@example.com'}})
+        self.assertEqual(list(self.data['accounts']), ['test@example.com', 'new@example.com'])
+        self.assertEqual(self.data['accounts']['new@example.com'], {'mail': 'new@example.com', 'history-salt': derived_history_salt({'mail': 'new@example.com'})})
+
+    def test_apply_hashes_the_history_of_entries(self):
+        apply_record(self.data, {'op': 'add_entry', 'mail': 'test@example.com', 'name': 'Old', 'entry': {'name': 'Old', 'password': 'b', 'oldpasswordlist': ['a', 'b']}})
+        account = self.data['accounts']['test@example.com']
+        self.assertEqual(account['passwords']['Old'], {'name': 'Old', 'password': 'b', 'history': [hash_history_password(account_salt(account), 'a')]})
+
+    def test_copy_for_record_copies_only_the_changed_path(self):
+        apply_record(self.data, {'op': 'register_account', 'mail': 'other@example.com', 'account': {'mail': 'other@example.com'}})
+        copied = copy_for_record(self.data, {'op': 'delete_entry', 'mail': 'test@example.com', 'name': 'Site'})
+        apply_record(copied, {'op': 'delete_entry', 'mail': 'test@example.com', 'name': 'Site'})
+        self.assertEqual(list(self.data['accounts']['test@example.com']['passwords']), ['Site'])
+        self.assertEqual(copied['accounts']['test@example.com']['passwords'], {})
+        self.assertIs(copied['accounts']['other@example.com'], self.data['accounts']['other@example.com'])
+
+    def test_apply_unknown_operation(self):
+        with self.assertRaises(ValueError):
+            apply_record(self.data, {'op': 'unknown', 'mail': 'test@example.com'})
+
+    def test_append_and_read_records(self):
+        records = [{'op': 'delete_entry', 'mail': 'test@example.com', 'name': str(number)} for number in range(3)]
+        for record in records:
+            append_record(self.filename, self.password, record)
+        self.assertEqual(read_records(self.filename, self.password), records)
+
+    def test_journal_of_older_snapshot_is_ignored(self):
+        append_record(self.filename, self.password, {'op': 'delete_entry', 'mail': 'test@example.com', 'name': 'Site'})
+        save_encrypted_dict_to_file(self.data, self.filename, self.password)
+        self.assertEqual(read_records(self.filename, self.password), [])
+
+    def test_torn_record_is_ignored(self):
+        record = {'op': 'delete_entry', 'mail': 'test@example.com', 'name': 'Site'}
+        append_record(self.filename, self.password, record)
+        size = append_record(self.filename, self.password, record)
+        with open(journal_filename(self.filename), 'r+b') as file:
+            file.truncate(size - 5)
+        self.assertEqual(read_records(self.filename, self.password), [record])
+
+    def test_append_after_torn_record(self):
+        records = [{'op': 'delete_entry', 'mail': 'test@example.com', 'name': name} for name in ('a', 'b', 'c')]
+        append_record(self.filename, self.password, records[0])
+        size = append_record(self.filename, self.password, records[1])
+        with open(journal_filename(self.filename), 'r+b') as file:
+            file.truncate(size - 20)
+        append_record(self.filename, self.password, records[2])
+        self.assertEqual(read_records(self.filename, self.password), [records[0], records[2]])
+
+    def read_journal(self):
+        with open(journal_filename(self.filename), 'rb') as file:
+            return bytearray(file.read())
+
+    def write_journal(self, content):
+        with open(journal_filename(self.filename), 'wb') as file:
+            file.write(content)
+
+    def test_modified_record_is_rejected(self):
+        append_record(self.filename, self.password, {'op': 'delete_entry', 'mail': 'test@example.com', 'name': 'Site'})
+        content = self.read_journal()
+        content[-20] ^= 1
+        self.write_journal(content)
+        with self.assertRaises(ValueError):
+            read_records(self.filename, self.password)
+
+    def test_reordered_records_are_rejected(self):
+        sizes = [append_record(self.filename, self.password, {'op': 'delete_entry', 'mail': 'test@example.com', 'name': name}) for name in ('a', 'bb')]
+        content = self.read_journal()
+        first_start = 4 + 16 + 32
+        self.write_journal(content[:first_start] + content[sizes[0]:sizes[1]] + content[first_start:sizes[0]])
+        with self.assertRaises(ValueError):
+            read_records(self.filename, self.password)
+
+    def test_legacy_journal_is_read_and_upgraded_on_append(self):
+        with open(self.filename, 'rb') as file:
+            key = unwrap_data_key(read_container_header(file), self.password)
+        old_record = {'op': 'delete_entry', 'mail': 'test@example.com', 'name': 'Site'}
+        iv = os.urandom(16)
+        encrypted_record = iv + encrypt_data(json.dumps(old_record).encode('utf-8'), key, iv)
+        self.write_journal(LEGACY_JOURNAL_MAGIC + get_session_salt(self.password) + snapshot_id(self.filename)
+                           + len(encrypted_record).to_bytes(4, 'big') + encrypted_record)
+        self.assertEqual(read_records(self.filename, self.password), [old_record])
+        new_record = {'op': 'delete_entry', 'mail': 'test@example.com', 'name': 'Other'}
+        append_record(self.filename, self.password, new_record)
+        self.assertNotEqual(bytes(self.read_journal()[:4]), LEGACY_JOURNAL_MAGIC)
+        self.assertEqual(read_records(self.filename, self.password), [old_record, new_record])
+
+if __name__ == '__main__':
+    unittest.main()
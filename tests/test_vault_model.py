@@ -0,0 +1,69 @@
+# pylint: disable=C
+import unittest
+from source.password_history import hash_history_password
+from source.vault_model import Account, PasswordEntry
+
+class TestVaultModel(unittest.TestCase):
+
+    def setUp(self):
+        self.mail = 'test@example.com'
+        self.entry = {
+            'name': 'Site',
+            'password': 'pw2',
+            'url': 'https://example.com',
+            'text': '',
+            'history': [hash_history_password(b'salt', 'pw1')],
+            'dateoffirstaccess': 1704103200,
+            'dateoflastchange': 1704189600
+        }
+        self.data = {'schema': 4, 'accounts': {self.mail: {'mail': self.mail, 'master-password': 'hash', 'history-salt': 'c2FsdA==', 'passwords': {'Site': self.entry, 'Other': {'name': 'Other', 'tag': 'x'}}}}}
+
+    def test_entry_round_trip(self):
+        entry = PasswordEntry.from_dict(self.entry)
+        self.assertEqual((entry.name, entry.password, entry.url), ('Site', 'pw2', 'https://example.com'))
+        self.assertEqual(entry.to_dict(), self.entry)
+        self.assertIs(entry.to_dict()['history'], self.entry['history'])
+        self.assertFalse(hasattr(entry, '__dict__'))
+
+    def test_entry_keeps_missing_and_extra_keys(self):
+        entry = PasswordEntry.from_dict({'name': 'Other', 'tag': 'x'})
+        self.assertEqual((entry.password, entry.history, entry.dateoffirstaccess), ('', [], 0))
+        self.assertEqual(entry.to_dict(), {'name': 'Other', 'tag': 'x'})
+        entry.password = 'pw1'
+        self.assertEqual(entry.to_dict(), {'name': 'Other', 'password': 'pw1', 'tag': 'x'})
+
+    def test_has_used_password(self):
+        entry = PasswordEntry.from_dict(self.entry)
+        self.assertTrue(entry.has_used_password('pw1', b'salt'))
+        self.assertTrue(entry.has_used_password('pw2', b'salt'))
+        self.assertFalse(entry.has_used_password('pw3', b'salt'))
+        self.assertFalse(entry.has_used_password('pw1', b'other salt'))
+
+    def test_account_builds_entries_lazily(self):
+        account = Account.from_vault(self.data, self.mail)
+        self.assertEqual(list(account.names()), ['Site', 'Other'])
+        self.assertEqual(len(account), 2)
+        self.assertIn('Site', account)
+        self.assertNotIsInstance(account._passwords['Site'], PasswordEntry)
+        entry = account.entry('Site')
+        self.assertIs(account.entry('Site'), entry)
+        self.assertIs(self.data['accounts'][self.mail]['passwords']['Site'], self.entry)
+        with self.assertRaises(KeyError):
+            account.entry('Missing')
+
+    def test_account_round_trip(self):
+        account = Account.from_vault(self.data, self.mail)
+        untouched = account.to_dict()
+        self.assertEqual(untouched, self.data['accounts'][self.mail])
+        self.assertIs(untouched['passwords']['Other'], self.data['accounts'][self.mail]['passwords']['Other'])
+        account.entry('Site').url = 'https://example.org'
+        self.assertEqual(account.to_dict()['passwords']['Site']['url'], 'https://example.org')
+        self.assertEqual(self.entry['url'], 'https://example.com')
+        self.assertEqual([entry.name for entry in account.entries()], ['Site', 'Other'])
+
+    def test_account_from_vault_missing_mail(self):
+        with self.assertRaises(KeyError):
+            Account.from_vault(self.data, 'other@example.com')
+
+if __name__ == '__main__':
+    unittest.main()
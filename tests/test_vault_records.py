@@ -0,0 +1,122 @@
+# pylint: disable=C
+import unittest
+import os
+import json
+import base64
+from unittest.mock import patch
+from source import vault_records
+from source.data_cryptography import encrypt_data
+from source.key_derivation import derive_key, header_kdf
+from source.vault_records import EnvelopeVault, create_envelope_vault, LEGACY_ENVELOPE_FORMAT
+
+class TestEnvelopeVault(unittest.TestCase):
+
+    def setUp(self):
+        self.password = 'strong_password123'
+        self.filename = 'test_vault_records.json'
+        self.data = {
+            'schema': 4,
+            'accounts': {
+                'test@example.com': {
+                    'mail': 'test@example.com',
+                    'master-password': 'hash',
+                    'history-salt': 'c2FsdA==',
+                    'passwords': {
+                        'Site1': {'name': 'Site1', 'password': 'secret1'},
+                        'Site2': {'name': 'Site2', 'password': 'secret2'}
+                    }
+                }
+            }
+        }
+        create_envelope_vault(self.data, self.filename, self.password)
+
+    def tearDown(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def test_round_trip(self):
+        self.assertEqual(EnvelopeVault(self.filename, self.password).to_dict(), self.data)
+
+    def test_list_names_decrypts_only_index(self):
+        with patch('source.vault_records.decrypt_record', wraps=vault_records.decrypt_record) as mock_decrypt:
+            vault = EnvelopeVault(self.filename, self.password)
+            self.assertEqual(vault.list_names('test@example.com'), ['Site1', 'Site2'])
+            self.assertEqual(mock_decrypt.call_count, 1)
+            self.assertEqual(vault.get_entry('test@example.com', 'Site2')['password'], 'secret2')
+            self.assertEqual(mock_decrypt.call_count, 2)
+
+    def test_file_does_not_contain_plaintext(self):
+        with open(self.filename, 'r', encoding='utf-8') as file:
+            content = file.read()
+        self.assertNotIn('secret1', content)
+        self.assertNotIn('Site1', content)
+
+    def test_save_keeps_unchanged_records(self):
+        with open(self.filename, 'r', encoding='utf-8') as file:
+            records_before = json.load(file)['records']
+        vault = EnvelopeVault(self.filename, self.password)
+        vault.set_entry('test@example.com', 'Site3', {'name': 'Site3', 'password': 'Renamed'}, old_name='Site1')
+        vault.save()
+        with open(self.filename, 'r', encoding='utf-8') as file:
+            records_after = json.load(file)['records']
+        self.assertEqual(len(records_after), 2)
+        self.assertEqual(len(set(records_before.items()) & set(records_after.items())), 1)
+        vault = EnvelopeVault(self.filename, self.password)
+        self.assertEqual(vault.list_names('test@example.com'), ['Site2', 'Site3'])
+
+    def test_register_and_delete(self):
+        vault = EnvelopeVault(self.filename, self.password)
+        vault.register_account('new@example.com', 'hash2')
+        vault.delete_entry('test@example.com', 'Site1')
+        vault.save()
+        data = EnvelopeVault(self.filename, self.password).to_dict()
+        self.assertEqual(list(data['accounts']), ['test@example.com', 'new@example.com'])
+        self.assertEqual(list(data['accounts']['test@example.com']['passwords']), ['Site2'])
+
+    def test_missing_entry(self):
+        with self.assertRaises(KeyError):
+            EnvelopeVault(self.filename, self.password).get_entry('test@example.com', 'Missing')
+
+    def read_document(self):
+        with open(self.filename, 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+    def write_document(self, document):
+        with open(self.filename, 'w', encoding='utf-8') as file:
+            json.dump(document, file)
+
+    def test_swapped_records_are_rejected(self):
+        document = self.read_document()
+        first, second = document['records']
+        document['records'][first], document['records'][second] = document['records'][second], document['records'][first]
+        self.write_document(document)
+        vault = EnvelopeVault(self.filename, self.password)
+        with self.assertRaises(ValueError):
+            vault.get_entry('test@example.com', 'Site1')
+
+    def test_legacy_vault_is_opened_and_upgraded(self):
+        document = self.read_document()
+        kdf = header_kdf(document)
+        data_key = vault_records.keywrap.aes_key_unwrap(derive_key(self.password, base64.b64decode(document['salt']), kdf=kdf),
+                                                        base64.b64decode(document['wrapped-key']), vault_records.default_backend())
+        vault = EnvelopeVault(self.filename, self.password)
+
+        def legacy(value):
+            iv = os.urandom(16)
+            return base64.b64encode(iv + encrypt_data(json.dumps(value).encode('utf-8'), data_key, iv)).decode('ascii')
+        entries = vault.index['test@example.com']['entries']
+        document.update({'format': LEGACY_ENVELOPE_FORMAT, 'index': legacy(vault.index),
+                         'records': {entries[name]: legacy(vault.get_entry('test@example.com', name)) for name in entries}})
+        self.write_document(document)
+        vault = EnvelopeVault(self.filename, self.password)
+        self.assertEqual(vault.to_dict(), self.data)
+        vault.save()
+        self.assertEqual(self.read_document()['format'], vault_records.ENVELOPE_FORMAT)
+        self.assertEqual(EnvelopeVault(self.filename, self.password).to_dict(), self.data)
+
+    def test_wrong_password(self):
+        with self.assertRaises(Exception):
+            EnvelopeVault(self.filename, 'wrong_password')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+# pylint: disable=C
+import copy
+import datetime
+import unittest
+from source.password_history import account_salt, derived_history_salt, hash_history_password
+from source.vault_schema import SCHEMA_VERSION, empty_vault, migrate_account, migrate_entry, migrate_vault, format_timestamp
+
+class TestVaultSchema(unittest.TestCase):
+
+    def setUp(self):
+        self.schema_1_data = {
+            'accounts': {
+                'accounts-list': ['b@example.com', 'a@example.com'],
+                'a@example.com': {'mail': 'a@example.com', 'passwords-list': [], 'passwords': {}},
+                'b@example.com': {
+                    'mail': 'b@example.com',
+                    'passwords-list': ['Site2', 'Site1'],
+                    'passwords': {'Site1': {'name': 'Site1', 'dateoflastchange': '02.01.2024 10:30'}, 'Site2': {'name': 'Site2'}}
+                }
+            }
+        }
+
+    def test_empty_vault(self):
+        self.assertEqual(empty_vault(), {'schema': SCHEMA_VERSION, 'accounts': {}})
+        self.assertIsNot(empty_vault()['accounts'], empty_vault()['accounts'])
+
+    def test_migrate_vault_keeps_the_order_of_the_lists(self):
+        data = migrate_vault(self.schema_1_data)
+        self.assertIs(data, self.schema_1_data)
+        self.assertEqual(data['schema'], SCHEMA_VERSION)
+        self.assertEqual(list(data['accounts']), ['b@example.com', 'a@example.com'])
+        account = data['accounts']['b@example.com']
+        self.assertNotIn('passwords-list', account)
+        self.assertEqual(list(account['passwords']), ['Site2', 'Site1'])
+        self.assertEqual(account['passwords']['Site1']['dateoflastchange'], int(datetime.datetime(2024, 1, 2, 10, 30).timestamp()))
+
+    def test_migrate_schema_2_dates(self):
+        data = migrate_vault({'schema': 2, 'accounts': {'a@example.com': {'passwords': {'Site': {'dateoffirstaccess': '01.01.2024 10:00', 'dateoflastchange': 'soon'}}}}})
+        entry = data['accounts']['a@example.com']['passwords']['Site']
+        self.assertEqual(data['schema'], SCHEMA_VERSION)
+        self.assertEqual(entry, {'dateoffirstaccess': int(datetime.datetime(2024, 1, 1, 10, 0).timestamp()), 'dateoflastchange': 'soon'})
+
+    def test_migrate_entry_and_format_timestamp(self):
+        entry = migrate_entry({'dateoffirstaccess': '31.12.2023 23:59', 'dateoflastchange': 1704103200})
+        self.assertEqual(format_timestamp(entry['dateoffirstaccess']), '31.12.2023 23:59')
+        self.assertEqual(entry['dateoflastchange'], 1704103200)
+        self.assertEqual(format_timestamp('soon'), 'soon')
+        self.assertEqual(format_timestamp(None), '')
+
+    def test_migrate_vault_is_idempotent(self):
+        data = migrate_vault(self.schema_1_data)
+        self.assertEqual(migrate_vault({'schema': SCHEMA_VERSION, 'accounts': dict(data['accounts'])}), data)
+
+    def test_migrate_vault_keeps_other_fields(self):
+        self.schema_1_data['settings'] = {'theme': 'dark'}
+        self.assertEqual(migrate_vault(self.schema_1_data)['settings'], {'theme': 'dark'})
+
+    def test_migrate_account_keeps_entries_missing_from_the_list(self):
+        account = migrate_account({'passwords-list': ['Site2'], 'passwords': {'Site1': {}, 'Site2': {}}})
+        self.assertEqual(list(account['passwords']), ['Site2', 'Site1'])
+        self.assertEqual(migrate_account({'passwords': {'Site': {}}, 'history-salt': 'c2FsdA=='}), {'passwords': {'Site': {}}, 'history-salt': 'c2FsdA=='})
+
+    def test_migrate_schema_3_history(self):
+        account = {'mail': 'a@example.com', 'master-password': 'hash', 'passwords': {'Site': {'password': 'pw3', 'oldpasswordlist': ['pw1', 'pw2', 'pw1', 'pw3']}}}
+        migrate_account(account)
+        salt = account_salt(account)
+        self.assertEqual(account['history-salt'], derived_history_salt(account))
+        self.assertEqual(account['passwords']['Site'], {'password': 'pw3', 'history': [hash_history_password(salt, 'pw2'), hash_history_password(salt, 'pw1')]})
+        self.assertEqual(migrate_account(copy.deepcopy(account)), account)
+
+if __name__ == '__main__':
+    unittest.main()
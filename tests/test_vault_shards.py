@@ -0,0 +1,70 @@
+# pylint: disable=C
+import unittest
+import os
+import shutil
+from unittest.mock import patch
+from source.data_cryptography import save_encrypted_dict_to_file, load_encrypted_dict_from_file
+from source.password_history import derived_history_salt
+from source.vault_storage import invalidate_vault_cache, load_vault
+from source.vault_shards import create_sharded_vault, load_shard_index, load_account, account_transaction, register_account, load_sharded_vault, migrate_to_shards
+
+class TestVaultShards(unittest.TestCase):
+
+    def setUp(self):
+        self.password = 'strong_password123'
+        self.directory = 'test_vault_shards'
+        self.filename = 'test_vault_shards.json'
+        self.data = {
+            'schema': 4,
+            'accounts': {
+                'a@example.com': {'mail': 'a@example.com', 'passwords': {'Site': {'name': 'Site'}}, 'history-salt': derived_history_salt({'mail': 'a@example.com'})},
+                'b@example.com': {'mail': 'b@example.com', 'passwords': {}, 'history-salt': derived_history_salt({'mail': 'b@example.com'})}
+            }
+        }
+        self.schema_1_data = {
+            'accounts': {
+                'accounts-list': ['a@example.com', 'b@example.com'],
+                'a@example.com': {'mail': 'a@example.com', 'passwords-list': ['Site'], 'passwords': {'Site': {'name': 'Site'}}},
+                'b@example.com': {'mail': 'b@example.com', 'passwords-list': [], 'passwords': {}}
+            }
+        }
+        invalidate_vault_cache()
+
+    def tearDown(self):
+        invalidate_vault_cache()
+        shutil.rmtree(self.directory, ignore_errors=True)
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def test_migrate_to_shards(self):
+        save_encrypted_dict_to_file(self.schema_1_data, self.filename, self.password)
+        self.assertEqual(migrate_to_shards(self.filename, self.directory, self.password), 2)
+        self.assertEqual(load_vault(self.filename, self.password), self.schema_1_data)
+        self.assertEqual(len([name for name in os.listdir(self.directory) if name.endswith('.json')]), 3)
+        invalidate_vault_cache()
+        self.assertEqual(load_sharded_vault(self.directory, self.password), self.data)
+
+    def test_register_and_load_account(self):
+        create_sharded_vault(self.directory, self.password)
+        register_account(self.directory, self.password, 'a@example.com', self.data['accounts']['a@example.com'])
+        self.assertEqual(list(load_shard_index(self.directory, self.password)['shards']), ['a@example.com'])
+        self.assertEqual(load_account(self.directory, self.password, 'a@example.com'), self.data['accounts']['a@example.com'])
+
+    def test_shard_names_do_not_contain_mail(self):
+        create_sharded_vault(self.directory, self.password)
+        register_account(self.directory, self.password, 'a@example.com', self.data['accounts']['a@example.com'])
+        self.assertFalse(any('example' in filename for filename in os.listdir(self.directory)))
+
+    def test_account_transaction_touches_only_its_shard(self):
+        save_encrypted_dict_to_file(self.data, self.filename, self.password)
+        migrate_to_shards(self.filename, self.directory, self.password)
+        with patch('source.vault_storage.save_encrypted_dict_to_file', wraps=save_encrypted_dict_to_file) as mock_save:
+            with account_transaction(self.directory, self.password, 'b@example.com') as account:
+                account['passwords']['New'] = {'name': 'New'}
+            mock_save.assert_called_once()
+        shard_id = load_shard_index(self.directory, self.password)['shards']['b@example.com']
+        shard = load_encrypted_dict_from_file(os.path.join(self.directory, f'account-{shard_id}.json'), self.password)
+        self.assertEqual(list(shard['passwords']), ['New'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+# pylint: disable=C
+import unittest
+import copy
+import json
+import os
+import sqlite3
+from source.data_cryptography import save_encrypted_dict_to_file, encrypt_data
+from source.vault_journal import apply_record
+from source.vault_storage import invalidate_vault_cache, load_vault
+from source.vault_sqlite import SqliteVault, import_vault
+
+class TestSqliteVault(unittest.TestCase):
+
+    def setUp(self):
+        self.password = 'strong_password123'
+        self.filename = 'test_vault_sqlite.json'
+        self.database = 'test_vault_sqlite.db'
+        self.data = {
+            'schema': 4,
+            'accounts': {
+                'a@example.com': {
+                    'mail': 'a@example.com',
+                    'master-password': 'hash',
+                    'history-salt': 'c2FsdA==',
+                    'passwords': {
+                        'Site1': {'name': 'Site1', 'password': 'secret1', 'history': ['5eb1c0d1']},
+                        'Site2': {'name': 'Site2', 'password': 'secret2', 'history': []}
+                    }
+                },
+                'b@example.com': {'mail': 'b@example.com', 'master-password': 'hash', 'history-salt': 'c2FsdA==', 'passwords': {}}
+            }
+        }
+        save_encrypted_dict_to_file(self.data, self.filename, self.password)
+        invalidate_vault_cache()
+
+    def tearDown(self):
+        invalidate_vault_cache()
+        for filename in (self.filename, self.database):
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def test_import_round_trip(self):
+        self.assertEqual(import_vault(self.filename, self.database, self.password), 2)
+        vault = SqliteVault(self.database, self.password)
+        try:
+            self.assertEqual(vault.to_dict(), self.data)
+            self.assertEqual(vault.load_account('a@example.com'), self.data['accounts']['a@example.com'])
+        finally:
+            vault.close()
+
+    def test_import_leaves_the_cached_vault_unchanged(self):
+        old_data = {'accounts': {'accounts-list': ['a@example.com'], 'a@example.com': {'mail': 'a@example.com', 'passwords-list': ['Site'], 'passwords': {'Site': {'name': 'Site', 'oldpasswordlist': ['pw0']}}}}}
+        save_encrypted_dict_to_file(old_data, self.filename, self.password)
+        expected = copy.deepcopy(old_data)
+        self.assertEqual(import_vault(self.filename, self.database, self.password), 1)
+        self.assertEqual(load_vault(self.filename, self.password), expected)
+
+    def test_records_match_journal_semantics(self):
+        import_vault(self.filename, self.database, self.password)
+        records = [
+            {'op': 'add_entry', 'mail': 'a@example.com', 'name': 'Site3', 'entry': {'name': 'Site3', 'password': 'secret3', 'history': []}},
+            {'op': 'change_entry', 'mail': 'a@example.com', 'old_name': 'Site1', 'name': 'Renamed', 'entry': {'name': 'Renamed', 'password': 'new', 'history': ['5eb1c0d1', '0a1b2c3d']}},
+            {'op': 'change_entry', 'mail': 'a@example.com', 'old_name': 'Site2', 'name': 'Site2', 'entry': {'name': 'Site2', 'password': 'other', 'oldpasswordlist': ['secret2', 'other']}},
+            {'op': 'delete_entry', 'mail': 'a@example.com', 'name': 'Site3'},
+            {'op': 'register_account', 'mail': 'c@example.com', 'account': {'mail': 'c@example.com', 'master-password': 'hash', 'passwords': {}}},
+            {'op': 'add_entry', 'mail': 'c@example.com', 'name': 'Site', 'entry': {'name': 'Site'}}
+        ]
+        expected = copy.deepcopy(self.data)
+        vault = SqliteVault(self.database, self.password)
+        try:
+            for record in records:
+                vault.apply_record(record)
+                apply_record(expected, record)
+            self.assertEqual(vault.to_dict(), expected)
+        finally:
+            vault.close()
+
+    def test_rows_are_encrypted(self):
+        import_vault(self.filename, self.database, self.password)
+        with open(self.database, 'rb') as file:
+            content = file.read()
+        for plaintext in (b'a@example.com', b'Site1', b'secret1', b'5eb1c0d1'):
+            self.assertNotIn(plaintext, content)
+
+    def test_indexes_exist(self):
+        SqliteVault(self.database, self.password).close()
+        connection = sqlite3.connect(self.database)
+        try:
+            indexes = {name for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        finally:
+            connection.close()
+        self.assertTrue({'accounts_mail', 'entries_account_name', 'history_entry'} <= indexes)
+
+    def test_wrong_password(self):
+        SqliteVault(self.database, self.password).close()
+        with self.assertRaises(ValueError):
+            SqliteVault(self.database, 'wrong_password')
+
+    def test_swapped_rows_are_rejected(self):
+        import_vault(self.filename, self.database, self.password)
+        connection = sqlite3.connect(self.database)
+        try:
+            with connection:
+                (first, second) = [payload for (payload,) in connection.execute("SELECT payload FROM entries ORDER BY id")]
+                connection.execute("UPDATE entries SET payload = ? WHERE position = 0", (second,))
+                connection.execute("UPDATE entries SET payload = ? WHERE position = 1", (first,))
+        finally:
+            connection.close()
+        vault = SqliteVault(self.database, self.password)
+        try:
+            with self.assertRaises(ValueError):
+                vault.load_account('a@example.com')
+        finally:
+            vault.close()
+
+    def test_database_with_unauthenticated_rows_is_upgraded(self):
+        import_vault(self.filename, self.database, self.password)
+        vault = SqliteVault(self.database, self.password)
+        key = vault._key  # pylint: disable=protected-access
+
+        def legacy(value):
+            iv = os.urandom(16)
+            return iv + encrypt_data(json.dumps(value).encode('utf-8'), key, iv)
+        try:
+            with vault.connection:
+                for mail_index, payload in vault.connection.execute("SELECT mail_index, payload FROM accounts").fetchall():
+                    value = vault._decrypt(payload, vault._account_row(mail_index))  # pylint: disable=protected-access
+                    vault.connection.execute("UPDATE accounts SET payload = ? WHERE mail_index = ?", (legacy(value), mail_index))
+                for row_id, account_id, name_index, payload in vault.connection.execute("SELECT id, account_id, name_index, payload FROM entries").fetchall():
+                    value = vault._decrypt(payload, vault._entry_row(account_id, name_index))  # pylint: disable=protected-access
+                    vault.connection.execute("UPDATE entries SET payload = ? WHERE id = ?", (legacy(value), row_id))
+                for row_id, entry_id, position, payload in vault.connection.execute("SELECT id, entry_id, position, payload FROM history").fetchall():
+                    value = vault._decrypt(payload, vault._history_row(entry_id, position))  # pylint: disable=protected-access
+                    vault.connection.execute("UPDATE history SET payload = ? WHERE id = ?", (legacy(value), row_id))
+                vault.connection.execute("DELETE FROM meta WHERE key = 'row-cipher'")
+        finally:
+            vault.close()
+        for _ in range(2):
+            vault = SqliteVault(self.database, self.password)
+            try:
+                self.assertEqual(vault.to_dict(), self.data)
+            finally:
+                vault.close()
+
+    def test_unknown_account(self):
+        vault = SqliteVault(self.database, self.password)
+        try:
+            with self.assertRaises(KeyError):
+                vault.load_account('missing@example.com')
+            with self.assertRaises(KeyError):
+                vault.apply_record({'op': 'delete_entry', 'mail': 'missing@example.com', 'name': 'Site'})
+        finally:
+            vault.close()
+
+if __name__ == '__main__':
+    unittest.main()
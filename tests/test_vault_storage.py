@@ -0,0 +1,352 @@
+# pylint: disable=C
+import unittest
+import os
+import itertools
+import multiprocessing
+import threading
+import traceback
+from unittest.mock import patch
+from source.data_cryptography import save_encrypted_dict_to_file, load_encrypted_dict_from_file, read_container_header
+from source import key_derivation, vault_storage
+from source.vault_journal import journal_filename
+from tests.test_data_cryptography import write_file_without_key_slots
+from source.vault_storage import load_vault, save_vault, invalidate_vault_cache, vault_transaction, append_vault_record, compact_vault, wait_for_compaction, lock_filename, vault_version, load_vault_versioned, update_vault, update_vault_record, change_vault_password, vault_lock, StaleVaultError, VaultBusyError
+
+class TestVaultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.password = 'strong_password123'
+        self.data_dict = {'accounts': {'accounts-list': ['test@example.com']}}
+        self.filename = 'test_vault_storage.json'
+        invalidate_vault_cache()
+        save_encrypted_dict_to_file(self.data_dict, self.filename, self.password)
+
+    def tearDown(self):
+        invalidate_vault_cache()
+        for filename in (self.filename, journal_filename(self.filename), lock_filename(self.filename)):
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def test_load_vault(self):
+        self.assertEqual(load_vault(self.filename, self.password), self.data_dict)
+
+    def test_load_vault_uses_cache(self):
+        load_vault(self.filename, self.password)
+        with patch('source.vault_storage.load_encrypted_dict_from_file') as mock_load:
+            self.assertEqual(load_vault(self.filename, self.password), self.data_dict)
+            mock_load.assert_not_called()
+
+    def test_large_vault_is_loaded_through_a_memory_map(self):
+        with patch.object(vault_storage, 'MMAP_LOAD_MIN_SIZE', os.path.getsize(self.filename)):
+            with patch('source.vault_storage.load_encrypted_dict_mmap', wraps=vault_storage.load_encrypted_dict_mmap) as mock_mmap:
+                self.assertEqual(load_vault(self.filename, self.password), self.data_dict)
+        mock_mmap.assert_called_once()
+
+    def test_cache_hit_returns_the_cached_vault_without_copying(self):
+        data = load_vault(self.filename, self.password)
+        with patch('source.vault_storage.copy.deepcopy') as mock_deepcopy:
+            self.assertIs(load_vault(self.filename, self.password), data)
+            mock_deepcopy.assert_not_called()
+
+    def test_transaction_does_not_touch_the_cached_vault(self):
+        data = load_vault(self.filename, self.password)
+        with vault_transaction(self.filename, self.password) as mutable:
+            mutable['accounts']['accounts-list'].append('other@example.com')
+        self.assertEqual(data, self.data_dict)
+        self.assertEqual(load_vault(self.filename, self.password)['accounts']['accounts-list'], ['test@example.com', 'other@example.com'])
+
+    def test_load_vault_reloads_changed_file(self):
+        load_vault(self.filename, self.password)
+        new_dict = {'accounts': {'accounts-list': []}}
+        save_encrypted_dict_to_file(new_dict, self.filename, self.password)
+        os.utime(self.filename, ns=(1, 1))
+        self.assertEqual(load_vault(self.filename, self.password), new_dict)
+
+    def test_save_vault_refreshes_cache(self):
+        new_dict = {'accounts': {'accounts-list': []}}
+        save_vault(new_dict, self.filename, self.password)
+        self.assertEqual(load_encrypted_dict_from_file(self.filename, self.password), new_dict)
+        with patch('source.vault_storage.load_encrypted_dict_from_file') as mock_load:
+            self.assertEqual(load_vault(self.filename, self.password), new_dict)
+            mock_load.assert_not_called()
+
+    def test_load_vault_wrong_password(self):
+        load_vault(self.filename, self.password)
+        with self.assertRaises(Exception):
+            load_vault(self.filename, 'wrong_password')
+
+    def test_load_vault_rehashes_to_default_kdf(self):
+        self.addCleanup(key_derivation.set_default_kdf, key_derivation.get_default_kdf())
+        key_derivation.set_default_kdf({'name': 'scrypt', 'n': 1024})
+        append_vault_record(self.filename, self.password, {'op': 'register_account', 'mail': 'new@example.com', 'account': {'mail': 'new@example.com'}})
+        invalidate_vault_cache()
+        data, version = load_vault_versioned(self.filename, self.password)
+        self.assertEqual(list(data['accounts']), ['new@example.com'])
+        self.assertEqual(version, 1)
+        with open(self.filename, 'rb') as file:
+            self.assertEqual(read_container_header(file)['keys'][0]['kdf']['name'], 'scrypt')
+        self.assertTrue(os.path.exists(journal_filename(self.filename)))
+        invalidate_vault_cache()
+        self.assertEqual(load_vault(self.filename, self.password), data)
+
+    def test_load_vault_upgrades_file_without_key_slots(self):
+        write_file_without_key_slots(self.data_dict, self.filename, self.password)
+        self.assertEqual(load_vault_versioned(self.filename, self.password), (self.data_dict, 0))
+        self.addCleanup(key_derivation.set_default_kdf, key_derivation.get_default_kdf())
+        key_derivation.set_default_kdf({'name': 'scrypt', 'n': 1024})
+        invalidate_vault_cache()
+        self.assertEqual(load_vault_versioned(self.filename, self.password), (self.data_dict, 1))
+        with open(self.filename, 'rb') as file:
+            self.assertEqual(read_container_header(file)['keys'][0]['kdf']['name'], 'scrypt')
+
+    def test_change_vault_password_keeps_journal(self):
+        append_vault_record(self.filename, self.password, {'op': 'register_account', 'mail': 'new@example.com', 'account': {'mail': 'new@example.com'}})
+        data = load_vault(self.filename, self.password)
+        change_vault_password(self.filename, self.password, 'new_password')
+        self.assertEqual(load_vault_versioned(self.filename, 'new_password'), (data, 1))
+        with self.assertRaises(ValueError):
+            load_vault(self.filename, self.password)
+
+class TestVaultTransaction(unittest.TestCase):
+
+    def setUp(self):
+        self.password = 'strong_password123'
+        self.filename = 'test_vault_transaction.json'
+        invalidate_vault_cache()
+        save_encrypted_dict_to_file({'accounts': {'accounts-list': []}}, self.filename, self.password)
+
+    def tearDown(self):
+        invalidate_vault_cache()
+        for filename in (self.filename, lock_filename(self.filename)):
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def test_transaction_commits_once(self):
+        stats = {}
+        with patch('source.vault_storage.save_encrypted_dict_to_file', wraps=save_encrypted_dict_to_file) as mock_save:
+            with vault_transaction(self.filename, self.password, stats=stats) as data:
+                for number in range(5):
+                    data['accounts']['accounts-list'].append(f'user{number}@example.com')
+            mock_save.assert_called_once()
+        self.assertEqual(len(load_encrypted_dict_from_file(self.filename, self.password)['accounts']['accounts-list']), 5)
+        self.assertEqual(stats['bytes_written'], os.path.getsize(self.filename))
+        self.assertIn('kdf_seconds', stats)
+        self.assertIn('cipher_seconds', stats)
+
+    def test_nested_transactions_join_the_outer_one(self):
+        with patch('source.vault_storage.save_encrypted_dict_to_file', wraps=save_encrypted_dict_to_file) as mock_save:
+            with vault_transaction(self.filename, self.password) as outer:
+                with vault_transaction(self.filename, self.password) as inner:
+                    inner['accounts']['accounts-list'].append('test@example.com')
+                self.assertIs(outer, inner)
+            mock_save.assert_called_once()
+        self.assertEqual(load_vault(self.filename, self.password)['accounts']['accounts-list'], ['test@example.com'])
+
+    def test_transaction_rolls_back_on_error(self):
+        with self.assertRaises(KeyError):
+            with vault_transaction(self.filename, self.password) as data:
+                data['accounts']['accounts-list'].append('test@example.com')
+                raise KeyError('test')
+        self.assertEqual(load_vault(self.filename, self.password)['accounts']['accounts-list'], [])
+
+class TestVaultJournalStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.password = 'strong_password123'
+        self.filename = 'test_vault_journal_storage.json'
+        self.mail = 'test@example.com'
+        invalidate_vault_cache()
+        save_vault({'schema': 2, 'accounts': {self.mail: {'passwords': {}}}}, self.filename, self.password)
+
+    def tearDown(self):
+        wait_for_compaction()
+        invalidate_vault_cache()
+        for filename in (self.filename, journal_filename(self.filename), lock_filename(self.filename)):
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def add_entry(self, name):
+        append_vault_record(self.filename, self.password, {'op': 'add_entry', 'mail': self.mail, 'name': name, 'entry': {'name': name}})
+
+    def test_append_does_not_rewrite_snapshot(self):
+        with open(self.filename, 'rb') as file:
+            snapshot = file.read()
+        self.add_entry('Site')
+        with open(self.filename, 'rb') as file:
+            self.assertEqual(file.read(), snapshot)
+        self.assertTrue(os.path.exists(journal_filename(self.filename)))
+
+    def test_load_replays_journal(self):
+        self.add_entry('Site1')
+        self.add_entry('Site2')
+        invalidate_vault_cache()
+        self.assertEqual(list(load_vault(self.filename, self.password)['accounts'][self.mail]['passwords']), ['Site1', 'Site2'])
+
+    def test_append_updates_cache(self):
+        load_vault(self.filename, self.password)
+        self.add_entry('Site')
+        with patch('source.vault_storage.load_encrypted_dict_from_file') as mock_load:
+            self.assertIn('Site', load_vault(self.filename, self.password)['accounts'][self.mail]['passwords'])
+            mock_load.assert_not_called()
+
+    def test_compact_vault(self):
+        self.add_entry('Site')
+        compact_vault(self.filename, self.password)
+        self.assertFalse(os.path.exists(journal_filename(self.filename)))
+        self.assertIn('Site', load_encrypted_dict_from_file(self.filename, self.password)['accounts'][self.mail]['passwords'])
+
+    def test_background_compaction_after_threshold(self):
+        with patch.object(vault_storage, 'COMPACT_JOURNAL_RECORDS', 3):
+            load_vault(self.filename, self.password)
+            for number in range(3):
+                self.add_entry(f'Site{number}')
+            wait_for_compaction(self.filename)
+        self.assertFalse(os.path.exists(journal_filename(self.filename)))
+        self.assertEqual(len(load_encrypted_dict_from_file(self.filename, self.password)['accounts'][self.mail]['passwords']), 3)
+
+    def test_record_inside_transaction_is_committed_with_it(self):
+        with vault_transaction(self.filename, self.password):
+            self.add_entry('Site')
+            self.assertFalse(os.path.exists(journal_filename(self.filename)))
+        self.assertIn('Site', load_encrypted_dict_from_file(self.filename, self.password)['accounts'][self.mail]['passwords'])
+
+def _add_entries(filename, password, mail, worker, count):
+    vault_storage.COMPACT_JOURNAL_RECORDS = 7
+    for number in range(count):
+        name = f'Site{worker}-{number}'
+        append_vault_record(filename, password, {'op': 'add_entry', 'mail': mail, 'name': name, 'entry': {'name': name}})
+    wait_for_compaction()
+
+def _increment_counter(filename, password, count):
+    def increment(data):
+        data['counter'] += 1
+    for _ in range(count):
+        update_vault(filename, password, increment, attempts=1000)
+
+def _report_errors(errors, target, *args):
+    try:
+        target(*args)
+    except BaseException:
+        errors.put(traceback.format_exc())
+        raise
+
+class TestVaultConcurrency(unittest.TestCase):
+
+    def setUp(self):
+        self.password = 'strong_password123'
+        self.filename = 'test_vault_concurrency.json'
+        self.mail = 'test@example.com'
+        invalidate_vault_cache()
+        save_vault({'counter': 0, 'schema': 2, 'accounts': {self.mail: {'passwords': {}}}}, self.filename, self.password)
+
+    def tearDown(self):
+        wait_for_compaction()
+        invalidate_vault_cache()
+        for filename in (self.filename, journal_filename(self.filename), lock_filename(self.filename)):
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def test_version_grows_with_every_commit(self):
+        version = vault_version(self.filename)
+        append_vault_record(self.filename, self.password, {'op': 'add_entry', 'mail': self.mail, 'name': 'Site', 'entry': {'name': 'Site'}})
+        self.assertEqual(vault_version(self.filename), version + 1)
+        compact_vault(self.filename, self.password)
+        self.assertEqual(vault_version(self.filename), version + 2)
+        invalidate_vault_cache()
+        self.assertEqual(load_vault_versioned(self.filename, self.password)[1], version + 2)
+
+    def test_stale_base_version_is_refused(self):
+        data, version = load_vault_versioned(self.filename, self.password)
+        append_vault_record(self.filename, self.password, {'op': 'add_entry', 'mail': self.mail, 'name': 'Site', 'entry': {'name': 'Site'}})
+        with self.assertRaises(StaleVaultError):
+            save_vault(data, self.filename, self.password, base_version=version)
+        with self.assertRaises(StaleVaultError):
+            append_vault_record(self.filename, self.password, {'op': 'delete_entry', 'mail': self.mail, 'name': 'Site'}, base_version=version)
+        self.assertIn('Site', load_vault(self.filename, self.password)['accounts'][self.mail]['passwords'])
+
+    def test_transaction_with_stale_base_fails(self):
+        with self.assertRaises(StaleVaultError):
+            with vault_transaction(self.filename, self.password) as data:
+                save_vault(dict(data, counter=5), self.filename, self.password)
+                data['counter'] = 10
+        self.assertEqual(load_vault(self.filename, self.password)['counter'], 5)
+
+    def test_update_vault_record_rebuilds_stale_record(self):
+        calls = []
+
+        def build_record(data):
+            calls.append(data['counter'])
+            if len(calls) == 1:
+                save_vault(dict(data, counter=1), self.filename, self.password)
+            return {'op': 'add_entry', 'mail': self.mail, 'name': 'Site', 'entry': {'counter': data['counter']}}
+
+        data = update_vault_record(self.filename, self.password, build_record)
+        self.assertEqual(calls, [0, 1])
+        self.assertEqual(data['accounts'][self.mail]['passwords']['Site'], {'counter': 1})
+
+    def test_load_that_overlaps_a_commit_every_time_fails(self):
+        invalidate_vault_cache()
+        with patch('source.vault_storage._vault_signature', side_effect=itertools.count()):
+            with self.assertRaises(VaultBusyError):
+                load_vault_versioned(self.filename, self.password)
+
+    def test_load_that_overlaps_a_commit_on_every_unlocked_attempt_takes_the_lock(self):
+        invalidate_vault_cache()
+        signature = vault_storage._vault_signature
+        calls = itertools.count()
+        overlapping = lambda path: next(calls) if vault_storage._file_locks.get(path) is None else signature(path)
+        with patch('source.vault_storage._vault_signature', side_effect=overlapping):
+            data, _ = load_vault_versioned(self.filename, self.password)
+        self.assertEqual(data['counter'], 0)
+
+    def test_locks_of_different_vaults_do_not_block_each_other(self):
+        other_filename = 'test_vault_concurrency_other.json'
+        self.addCleanup(os.remove, lock_filename(other_filename))
+        locked = threading.Event()
+        release = threading.Event()
+
+        def hold_lock():
+            with vault_lock(self.filename):
+                locked.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        try:
+            self.assertTrue(locked.wait(5))
+            acquired = threading.Event()
+
+            def lock_other_vault():
+                with vault_lock(other_filename):
+                    acquired.set()
+
+            other = threading.Thread(target=lock_other_vault)
+            other.start()
+            other.join(5)
+            self.assertTrue(acquired.is_set())
+        finally:
+            release.set()
+            thread.join()
+
+    @unittest.skipIf(vault_storage.fcntl is None, "fcntl is not available")
+    def test_concurrent_processes_do_not_lose_changes(self):
+        context = multiprocessing.get_context('fork')
+        errors = context.SimpleQueue()
+        processes = [context.Process(target=_report_errors, args=(errors, _add_entries, self.filename, self.password, self.mail, worker, 15)) for worker in range(6)]
+        processes += [context.Process(target=_report_errors, args=(errors, _increment_counter, self.filename, self.password, 10)) for _ in range(3)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(120)
+        failures = []
+        while not errors.empty():
+            failures.append(errors.get())
+        self.assertEqual(failures, [])
+        self.assertEqual([process.exitcode for process in processes], [0] * len(processes))
+        invalidate_vault_cache()
+        data = load_vault(self.filename, self.password)
+        self.assertEqual(len(data['accounts'][self.mail]['passwords']), 6 * 15)
+        self.assertEqual(data['counter'], 3 * 10)
+
+if __name__ == '__main__':
+    unittest.main()
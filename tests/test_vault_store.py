@@ -0,0 +1,340 @@
+# pylint: disable=C
+import unittest
+import os
+import shutil
+import tempfile
+import time
+from unittest.mock import patch
+from source import password_manager, vault_records
+from source.password_history import DEFAULT_HISTORY_DEPTH, account_salt, hash_history_password, set_history_depth
+from source.vault_storage import invalidate_vault_cache, save_vault
+from source.vault_schema import migrated_vault
+from source.vault_model import PasswordEntry
+from source.key_derivation import wipe_key_cache
+from source.vault_store import FileVaultStore, MemoryVaultStore, ShardedVaultStore, SqliteVaultStore, EnvelopeVaultStore, create_store, store_from_environment, configure_store, get_store, warm_up_store, wait_for_warm_up
+
+class VaultStoreContract:
+    """
+    Checks that a backend behaves like the file vault; the subclasses provide make_store.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.password = 'strong_password123'
+        self.mail = 'test@example.com'
+        self.store = self.make_store()
+        invalidate_vault_cache()
+
+    def tearDown(self):
+        invalidate_vault_cache()
+        shutil.rmtree(self.directory)
+
+    def register(self):
+        self.store.create()
+        self.store.apply({'op': 'register_account', 'mail': self.mail, 'account': {'mail': self.mail, 'master-password': 'hash', 'history-salt': 'c2FsdA==', 'passwords': {}}})
+
+    def test_create(self):
+        self.assertFalse(self.store.exists())
+        self.store.create()
+        self.assertTrue(self.store.exists())
+        self.assertEqual(self.store.load(), {'schema': 4, 'accounts': {}})
+
+    def test_apply_records(self):
+        self.register()
+        self.store.apply({'op': 'add_entry', 'mail': self.mail, 'name': 'Site', 'entry': {'name': 'Site', 'history': ['a']}})
+        self.store.apply({'op': 'change_entry', 'mail': self.mail, 'old_name': 'Site', 'name': 'Renamed', 'entry': {'name': 'Renamed', 'history': ['a', 'b']}})
+        self.store.apply({'op': 'add_entry', 'mail': self.mail, 'name': 'Other', 'entry': {'name': 'Other'}})
+        self.store.apply({'op': 'delete_entry', 'mail': self.mail, 'name': 'Other'})
+        account = self.store.load()['accounts'][self.mail]
+        self.assertEqual(list(account['passwords']), ['Renamed'])
+        self.assertEqual(account['passwords'], {'Renamed': {'name': 'Renamed', 'history': ['a', 'b']}})
+
+    def test_list_names_and_get_entry(self):
+        self.register()
+        self.store.apply({'op': 'add_entry', 'mail': self.mail, 'name': 'B', 'entry': {'name': 'B', 'password': 'pw'}})
+        self.store.apply({'op': 'add_entry', 'mail': self.mail, 'name': 'A', 'entry': {'name': 'A'}})
+        self.assertEqual(self.store.list_names(self.mail), ['B', 'A'])
+        self.assertEqual(self.store.get_entry(self.mail, 'B'), {'name': 'B', 'password': 'pw'})
+        with self.assertRaises(KeyError):
+            self.store.get_entry(self.mail, 'C')
+        with self.assertRaises(KeyError):
+            self.store.list_names('other@example.com')
+
+    def test_history_salt(self):
+        self.register()
+        self.assertEqual(self.store.history_salt(self.mail), b'salt')
+        with self.assertRaises(KeyError):
+            self.store.history_salt('other@example.com')
+
+    def test_save_replaces_the_whole_vault(self):
+        self.register()
+        self.store.apply({'op': 'add_entry', 'mail': self.mail, 'name': 'Site', 'entry': {'name': 'Site'}})
+        self.store.apply({'op': 'register_account', 'mail': 'other@example.com', 'account': {'mail': 'other@example.com', 'history-salt': 'c2FsdA==', 'passwords': {}}})
+        data = self.store.load()
+        self.store.save({'schema': 4, 'accounts': {'other@example.com': data['accounts']['other@example.com']}})
+        self.assertEqual(list(self.store.load()['accounts']), ['other@example.com'])
+        self.assertEqual(self.store.last_change_index().recently_changed(5), [])
+
+    def test_update_builds_record_from_current_vault(self):
+        self.register()
+        data = self.store.update(lambda data: {'op': 'add_entry', 'mail': self.mail, 'name': 'Count', 'entry': {'accounts': len(data['accounts'])}})
+        self.assertEqual(data['accounts'][self.mail]['passwords']['Count'], {'accounts': 1})
+        self.assertEqual(self.store.load(), data)
+
+    def test_changes_do_not_touch_a_loaded_vault(self):
+        self.register()
+        data = self.store.load()
+        self.store.apply({'op': 'add_entry', 'mail': self.mail, 'name': 'Site', 'entry': {'name': 'Site'}})
+        self.store.update(lambda data: {'op': 'register_account', 'mail': 'other@example.com', 'account': {'mail': 'other@example.com', 'history-salt': 'c2FsdA==', 'passwords': {}}})
+        self.assertEqual(data['accounts'], {self.mail: {'mail': self.mail, 'master-password': 'hash', 'history-salt': 'c2FsdA==', 'passwords': {}}})
+        self.assertEqual(list(self.store.load()['accounts'][self.mail]['passwords']), ['Site'])
+
+    def test_last_change_index(self):
+        self.register()
+        self.store.apply({'op': 'add_entry', 'mail': self.mail, 'name': 'Old', 'entry': {'name': 'Old', 'dateoflastchange': 100}})
+        index = self.store.last_change_index()
+        self.assertEqual(index.recently_changed(5), [(self.mail, 'Old', 100)])
+        self.store.apply({'op': 'add_entry', 'mail': self.mail, 'name': 'New', 'entry': {'name': 'New', 'dateoflastchange': 200}})
+        self.store.update(lambda data: {'op': 'change_entry', 'mail': self.mail, 'old_name': 'Old', 'name': 'Renamed', 'entry': {'name': 'Renamed', 'dateoflastchange': 300}})
+        self.assertEqual(self.store.last_change_index().recently_changed(5), [(self.mail, 'Renamed', 300), (self.mail, 'New', 200)])
+        self.assertEqual(self.store.prefix_index().names_with_prefix(self.mail, 're'), ['Renamed'])
+
+    def test_password_was_used(self):
+        self.register()
+        self.store.apply({'op': 'add_entry', 'mail': self.mail, 'name': 'Site', 'entry': {'name': 'Site', 'password': 'pw2', 'history': [hash_history_password(b'salt', 'pw1')]}})
+        self.assertTrue(self.store.password_was_used(self.mail, 'pw1'))
+        self.assertTrue(self.store.password_was_used(self.mail, 'pw2'))
+        self.assertFalse(self.store.password_was_used(self.mail, 'pw0'))
+        self.store.archive_history(self.mail, [hash_history_password(b'salt', 'pw0')])
+        self.assertTrue(self.store.password_was_used(self.mail, 'pw0'))
+        self.store.apply({'op': 'delete_entry', 'mail': self.mail, 'name': 'Site'})
+        self.assertFalse(self.store.password_was_used(self.mail, 'pw1'))
+        with self.assertRaises(KeyError):
+            self.store.password_was_used('other@example.com', 'pw1')
+
+    def test_warm_up(self):
+        self.store.warm_up()
+        self.register()
+        invalidate_vault_cache()
+        wipe_key_cache()
+        self.store.warm_up()
+        self.assertEqual(list(self.store.load()['accounts']), [self.mail])
+
+class TestFileVaultStore(VaultStoreContract, unittest.TestCase):
+
+    def make_store(self):
+        return FileVaultStore(os.path.join(self.directory, 'data.json'), self.password)
+
+    def test_last_change_index_sees_other_writers(self):
+        self.register()
+        index = self.store.last_change_index()
+        FileVaultStore(self.store.filename, self.password).apply({'op': 'add_entry', 'mail': self.mail, 'name': 'Site', 'entry': {'dateoflastchange': 100}})
+        self.assertIsNot(self.store.last_change_index(), index)
+        self.assertEqual(self.store.last_change_index().recently_changed(5), [(self.mail, 'Site', 100)])
+        self.store.apply({'op': 'delete_entry', 'mail': self.mail, 'name': 'Site'})
+        with patch('source.vault_store.load_vault_versioned') as mock_load:
+            self.assertEqual(len(self.store.last_change_index()), 0)
+            mock_load.assert_not_called()
+
+    def test_older_schema_is_migrated_once_per_load(self):
+        save_vault({'schema': 2, 'accounts': {self.mail: {'mail': self.mail, 'passwords': {'Site': {'name': 'Site', 'oldpasswordlist': ['pw0']}}}}}, self.store.filename, self.password)
+        with patch('source.vault_store.migrated_vault', wraps=migrated_vault) as mock_migrated:
+            data = self.store.load()
+            self.assertIs(self.store.load(), data)
+            self.store.history_index()
+            self.assertEqual(mock_migrated.call_count, 1)
+        self.assertEqual(data['schema'], 4)
+        self.store.apply({'op': 'delete_entry', 'mail': self.mail, 'name': 'Site'})
+        self.assertEqual(self.store.load()['accounts'][self.mail]['passwords'], {})
+
+    def test_archive_is_shared_with_other_writers(self):
+        self.register()
+        FileVaultStore(self.store.filename, self.password).archive_history(self.mail, [hash_history_password(b'salt', 'pw0')])
+        self.assertTrue(self.store.password_was_used(self.mail, 'pw0'))
+        self.assertTrue(os.path.exists(self.store.filename + '.archive'))
+
+class TestMemoryVaultStore(VaultStoreContract, unittest.TestCase):
+
+    def make_store(self):
+        return MemoryVaultStore()
+
+    def test_does_not_derive_keys(self):
+        with patch('source.key_derivation.PBKDF2HMAC') as mock_kdf:
+            self.register()
+            self.store.load()
+            mock_kdf.assert_not_called()
+
+class TestShardedVaultStore(VaultStoreContract, unittest.TestCase):
+
+    def make_store(self):
+        return ShardedVaultStore(os.path.join(self.directory, 'vault'), self.password)
+
+class TestSqliteVaultStore(VaultStoreContract, unittest.TestCase):
+
+    def make_store(self):
+        return SqliteVaultStore(os.path.join(self.directory, 'data.db'), self.password)
+
+    def tearDown(self):
+        if self.store._vault is not None:
+            self.store._vault.close()
+        super().tearDown()
+
+class TestEnvelopeVaultStore(VaultStoreContract, unittest.TestCase):
+
+    def make_store(self):
+        return EnvelopeVaultStore(os.path.join(self.directory, 'data.envelope.json'), self.password)
+
+    def test_get_entry_decrypts_only_its_record(self):
+        self.register()
+        for name in ('A', 'B', 'C'):
+            self.store.apply({'op': 'add_entry', 'mail': self.mail, 'name': name, 'entry': {'name': name}})
+        store = self.make_store()
+        with patch('source.vault_records.decrypt_record', wraps=vault_records.decrypt_record) as mock_decrypt:
+            self.assertEqual(store.list_names(self.mail), ['A', 'B', 'C'])
+            self.assertEqual(store.get_entry(self.mail, 'B'), {'name': 'B'})
+        self.assertEqual(mock_decrypt.call_count, 2)
+        store = self.make_store()
+        with patch('source.vault_records.decrypt_record', wraps=vault_records.decrypt_record) as mock_decrypt:
+            self.assertEqual(store.history_salt(self.mail), b'salt')
+        self.assertEqual(mock_decrypt.call_count, 1)
+
+class TestStoreConfiguration(unittest.TestCase):
+
+    def tearDown(self):
+        configure_store(None)
+
+    def test_create_store(self):
+        self.assertIsInstance(create_store('file'), FileVaultStore)
+        self.assertEqual(create_store('file').filename, './data.json')
+        self.assertIsInstance(create_store('memory'), MemoryVaultStore)
+        self.assertEqual(create_store('envelope').filename, './data.envelope.json')
+        with self.assertRaises(ValueError):
+            create_store('unknown')
+
+    def test_store_from_environment(self):
+        with patch.dict(os.environ, {'PASSWORD_MANAGER_BACKEND': 'sqlite', 'PASSWORD_MANAGER_VAULT': 'vault.db', 'PASSWORD_MANAGER_PASSWORD': 'secret'}):
+            store = store_from_environment()
+        self.assertIsInstance(store, SqliteVaultStore)
+        self.assertEqual((store.filename, store.password), ('vault.db', 'secret'))
+
+    def test_configure_store(self):
+        store = MemoryVaultStore()
+        configure_store(store)
+        self.assertIs(get_store(), store)
+
+class TestStoreWarmUp(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = FileVaultStore(os.path.join(self.directory, 'data.json'), 'strong_password123')
+        self.store.create()
+        invalidate_vault_cache()
+        wipe_key_cache()
+
+    def tearDown(self):
+        configure_store(None)
+        invalidate_vault_cache()
+        shutil.rmtree(self.directory)
+
+    def test_first_load_uses_background_unlock(self):
+        configure_store(self.store)
+        warm_up_store()
+        wait_for_warm_up()
+        with patch('source.vault_storage.load_encrypted_dict_from_file') as mock_load:
+            self.assertEqual(password_manager.read_data_json(), {'schema': 4, 'accounts': {}})
+            mock_load.assert_not_called()
+
+    def test_get_store_waits_for_warm_up(self):
+        configure_store(self.store)
+        with patch.object(FileVaultStore, 'warm_up', side_effect=lambda: time.sleep(0.2)) as mock_warm_up:
+            warm_up_store()
+            start = time.perf_counter()
+            self.assertIs(get_store(), self.store)
+            self.assertGreater(time.perf_counter() - start, 0.1)
+            mock_warm_up.assert_called_once()
+
+    def test_warm_up_errors_are_left_to_the_foreground(self):
+        configure_store(FileVaultStore(self.store.filename, 'wrong_password'))
+        warm_up_store()
+        with self.assertRaises(ValueError):
+            password_manager.read_data_json()
+
+class TestPasswordManagerWithMemoryStore(unittest.TestCase):
+
+    def setUp(self):
+        self.mail = 'test@example.com'
+        self.store = MemoryVaultStore()
+        configure_store(self.store)
+        password_manager.create_accounts_file()
+
+    def tearDown(self):
+        configure_store(None)
+        set_history_depth(DEFAULT_HISTORY_DEPTH)
+
+    def test_register_add_change_delete(self):
+        self.assertTrue(password_manager.is_mail_uniq(self.mail))
+        password_manager.safe_register_data(self.mail, 'MasterPassword1!')
+        self.assertFalse(password_manager.is_mail_uniq(self.mail))
+        password_manager.safe_new_password_data({'Site': {'name': 'Site', 'password': 'pw1', 'url': '', 'text': '', 'history': []}}, self.mail, 'Site')
+        data = password_manager.safe_changed_data(self.mail, 'Renamed', 'https://example.com', 'notes', 'pw2', 'Site', True)
+        salt = account_salt(data['accounts'][self.mail])
+        entry = data['accounts'][self.mail]['passwords']['Renamed']
+        self.assertEqual((entry['password'], entry['history']), ('pw2', [hash_history_password(salt, 'pw1')]))
+        self.assertTrue(self.store.password_was_used(self.mail, 'pw1'))
+        self.assertEqual(password_manager.read_data_json(), data)
+        password_manager.delete_password(self.mail, 'Renamed')
+        self.assertEqual(password_manager.read_data_json()['accounts'][self.mail]['passwords'], {})
+
+    def test_find_entries(self):
+        password_manager.safe_register_data(self.mail, 'MasterPassword1!')
+        for name in ('Github', 'Gitlab', 'Git'):
+            password_manager.safe_new_password_data({name: {'name': name, 'password': 'pw1', 'history': []}}, self.mail, name)
+        self.assertEqual(password_manager.find_entries(self.mail, 'gitl'), ['Gitlab'])
+        self.assertEqual(password_manager.find_entries(self.mail, 'git'), ['Git', 'Github', 'Gitlab'])
+        self.assertEqual(password_manager.find_entries(self.mail, 'Git'), ['Git'])
+        self.assertEqual(password_manager.find_entries(self.mail, 'Gitx'), [])
+        password_manager.safe_new_password_data({'GIT': {'name': 'GIT', 'password': 'pw1', 'history': []}}, self.mail, 'GIT')
+        self.assertEqual(password_manager.find_entries(self.mail, 'Git', 1), ['Git'])
+        password_manager.delete_password(self.mail, 'GIT')
+        password_manager.safe_changed_data(self.mail, 'Codeberg', '', '', 'pw1', 'Gitlab', True)
+        password_manager.delete_password(self.mail, 'Git')
+        self.assertEqual(password_manager.find_entries(self.mail, 'git'), ['Github'])
+        self.assertEqual(password_manager.find_entries(self.mail, 'code'), ['Codeberg'])
+
+    def test_history_beyond_the_depth_is_archived(self):
+        set_history_depth(1)
+        password_manager.safe_register_data(self.mail, 'MasterPassword1!')
+        password_manager.safe_new_password_data({'Site': {'name': 'Site', 'password': 'pw1', 'history': []}}, self.mail, 'Site')
+        for password in ('pw2', 'pw3'):
+            data = password_manager.safe_changed_data(self.mail, 'Site', '', '', password, 'Site', False)
+        salt = account_salt(data['accounts'][self.mail])
+        self.assertEqual(data['accounts'][self.mail]['passwords']['Site']['history'], [hash_history_password(salt, 'pw2')])
+        self.assertTrue(self.store.archive.contains(self.mail, hash_history_password(salt, 'pw1')))
+        for password in ('pw1', 'pw2', 'pw3'):
+            self.assertTrue(self.store.password_was_used(self.mail, password))
+
+    def test_password_reuse_includes_the_archive(self):
+        set_history_depth(1)
+        password_manager.safe_register_data(self.mail, 'MasterPassword1!')
+        password_manager.safe_new_password_data({'Site': {'name': 'Site', 'password': 'pw1', 'history': []}}, self.mail, 'Site')
+        for password in ('pw2', 'pw3'):
+            password_manager.safe_changed_data(self.mail, 'Site', '', '', password, 'Site', False)
+        entry = PasswordEntry.from_dict(self.store.get_entry(self.mail, 'Site'))
+        for password in ('pw1', 'pw2', 'pw3'):
+            self.assertTrue(password_manager.is_password_reused(self.mail, entry, password))
+        self.assertFalse(password_manager.is_password_reused(self.mail, entry, 'pw4'))
+
+    def test_history_is_archived_before_the_change_is_committed(self):
+        set_history_depth(1)
+        password_manager.safe_register_data(self.mail, 'MasterPassword1!')
+        password_manager.safe_new_password_data({'Site': {'name': 'Site', 'password': 'pw1', 'history': []}}, self.mail, 'Site')
+        password_manager.safe_changed_data(self.mail, 'Site', '', '', 'pw2', 'Site', False)
+        with patch.object(self.store, 'apply', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                password_manager.safe_changed_data(self.mail, 'Site', '', '', 'pw3', 'Site', False)
+        salt = self.store.history_salt(self.mail)
+        self.assertTrue(self.store.archive.contains(self.mail, hash_history_password(salt, 'pw1')))
+        self.assertEqual(self.store.get_entry(self.mail, 'Site')['history'], [hash_history_password(salt, 'pw1')])
+
+if __name__ == '__main__':
+    unittest.main()